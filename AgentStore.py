@@ -0,0 +1,103 @@
+from functools import partial
+from operator import is_not
+
+from mesa.time import RandomActivation
+
+# Define a dense store of agents with O(1) removal
+#
+# Agents sit in a list of slots and each agent's slot is kept in a dict by
+# unique id. discard() only empties the slot, so the remaining agents keep
+# their order, which the scheduler's shuffle depends on; the empty slots are
+# squeezed out in one pass by compact(), which runs by itself once they make up
+# compact_fraction of the slots. A batch of removals thus costs O(1) per agent
+# plus an amortised share of the linear compaction.
+class AgentStore:
+    # Define the store's initial state
+    def __init__(self, compact_fraction=0.25):
+        self.slots = []
+        self.index = {}
+        self.holes = 0
+        self.compact_fraction = compact_fraction
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, agent):
+        return agent.unique_id in self.index
+
+    def __iter__(self):
+        if not self.holes:
+            return iter(self.slots)
+        return filter(partial(is_not, None), self.slots)
+
+    # Add an agent after the last one
+    def add(self, agent):
+        if agent.unique_id in self.index:
+            raise Exception("Agent with unique id %r already added to the store" % (agent.unique_id,))
+        self.index[agent.unique_id] = len(self.slots)
+        self.slots.append(agent)
+
+    # Remove an agent, keeping the order of the others; compact=False leaves the compaction to the caller
+    def discard(self, agent, compact=True):
+        self.slots[self.index.pop(agent.unique_id)] = None
+        self.holes += 1
+        if compact:
+            self.maybe_compact()
+
+    # Compact the slots if enough of them are empty
+    def maybe_compact(self):
+        if self.holes > self.compact_fraction * len(self.slots):
+            self.compact()
+
+    # Squeeze out the empty slots
+    def compact(self):
+        self.slots = [agent for agent in self.slots if agent is not None]
+        self.index = {agent.unique_id: slot for slot, agent in enumerate(self.slots)}
+        self.holes = 0
+
+    # Get the agents in order as a new list
+    def agents(self):
+        return list(self)
+
+# Define a RandomActivation that keeps its agents in an AgentStore
+#
+# Agents are activated in exactly the order RandomActivation would use: the
+# store keeps them in the order they were added, and the shuffle draws the
+# same permutation for a list of agents as for a list of their ids.
+class StoreActivation(RandomActivation):
+    # Define the scheduler's initial state
+    def __init__(self, model, compact_fraction=0.25):
+        super().__init__(model)
+        del self._agents
+        self.store = AgentStore(compact_fraction)
+
+    def add(self, agent):
+        self.store.add(agent)
+
+    def remove(self, agent):
+        self.store.discard(agent)
+
+    # Remove many agents in one batch, compacting at most once, and take them off the grid too if one is given
+    def remove_many(self, agents, grid=None):
+        store = self.store
+        for agent in agents:
+            if grid is not None:
+                grid.remove_agent(agent)
+            store.discard(agent, compact=False)
+        store.maybe_compact()
+
+    def get_agent_count(self):
+        return len(self.store)
+
+    @property
+    def agents(self):
+        return self.store.agents()
+
+    def agent_buffer(self, shuffled=False):
+        agents = self.store.agents()
+        if shuffled:
+            self.model.random.shuffle(agents)
+        index = self.store.index
+        for agent in agents:
+            if agent.unique_id in index:
+                yield agent
@@ -0,0 +1,142 @@
+import os
+import sys
+from operator import attrgetter
+
+import numpy as np
+
+# Define a columnar replacement for mesa's DataCollector
+#
+# Model reporters work as in mesa and are kept in model_vars, so ChartModule
+# keeps working. Each agent reporter is stored as a (steps x agents) float64
+# array with one row per collect() and one column per agent, the column being
+# the agent's unique_id; unique ids must be non-negative integers. Agents
+# missing from a step read NaN. Attribute-name reporters are read for all
+# agents in one pass with attrgetter; functions are called per agent.
+#
+# Both axes grow geometrically. With spill_dir set, every spill_steps rows are
+# written out as one .npy file per variable and dropped from memory.
+class ArrayCollector:
+    # Define the collector's initial state
+    def __init__(self, model_reporters=None, agent_reporters=None, capacity=64, spill_dir=None, spill_steps=1024):
+        self.model_reporters = {}
+        self.model_vars = {}
+        self.agent_reporters = {}
+        self.agent_vars = {}
+        self.steps = []
+        self.rows = 0
+        self.num_agents = 0
+        self.capacity = capacity
+        self.spill_dir = spill_dir
+        self.spill_steps = spill_steps
+        self.spilled = []
+
+        for name, reporter in (model_reporters or {}).items():
+            if isinstance(reporter, str):
+                reporter = attrgetter(reporter)
+            self.model_reporters[name] = reporter
+            self.model_vars[name] = []
+
+        for name, reporter in (agent_reporters or {}).items():
+            if isinstance(reporter, str):
+                reporter = attrgetter(reporter)
+            self.agent_reporters[name] = reporter
+            self.agent_vars[name] = np.full((capacity, 0), np.nan)
+
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    # Pickle only the rows and columns in use, not the spare capacity
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["agent_vars"] = {name: data[:self.rows, :self.num_agents] for name, data in self.agent_vars.items()}
+        return state
+
+    # Get the bytes held in memory by the collected data, spare capacity included
+    def nbytes(self):
+        total = sum(data.nbytes for data in self.agent_vars.values())
+        total += sys.getsizeof(self.steps) + sum(sys.getsizeof(values) for values in self.model_vars.values())
+        for values in self.model_vars.values():
+            total += sum(map(sys.getsizeof, values))
+        return total
+
+    # Grow the agent arrays so that they hold the given rows and columns
+    def reserve(self, rows, columns):
+        old_rows, old_columns = next(iter(self.agent_vars.values())).shape
+        if rows <= old_rows and columns <= old_columns:
+            return
+        new_rows = max(rows, old_rows * 2 if rows > old_rows else old_rows)
+        new_columns = max(columns, old_columns * 2 if columns > old_columns else old_columns)
+        for name, data in self.agent_vars.items():
+            grown = np.full((new_rows, new_columns), np.nan)
+            grown[:self.rows, :old_columns] = data[:self.rows]
+            self.agent_vars[name] = grown
+
+    # Collect all the data for the given model
+    def collect(self, model):
+        for name, reporter in self.model_reporters.items():
+            self.model_vars[name].append(reporter(model))
+        self.steps.append(model.schedule.steps)
+
+        if self.agent_reporters:
+            agents = model.schedule.agents
+            ids = np.fromiter(map(attrgetter("unique_id"), agents), dtype=np.int64, count=len(agents))
+            if len(ids):
+                self.num_agents = max(self.num_agents, int(ids.max()) + 1)
+            self.reserve(self.rows + 1, self.num_agents)
+
+            row = self.rows
+            for name, reporter in self.agent_reporters.items():
+                values = np.fromiter(map(reporter, agents), dtype=np.float64, count=len(agents))
+                self.agent_vars[name][row, ids] = values
+        self.rows += 1
+
+        if self.spill_dir is not None and self.rows >= self.spill_steps:
+            self.spill()
+
+    # Write the rows held in memory to disk and drop them
+    def spill(self):
+        if self.rows == 0 or not self.agent_vars:
+            return
+        chunk = len(self.spilled)
+        for name, data in self.agent_vars.items():
+            np.save(os.path.join(self.spill_dir, "%s-%05d.npy" % (name, chunk)), data[:self.rows, :self.num_agents])
+            data[:self.rows] = np.nan
+        self.spilled.append(self.rows)
+        self.rows = 0
+
+    # Get one agent variable as a (steps x agents) array, memory-mapping spilled chunks
+    def get_agent_var(self, name):
+        data = self.agent_vars[name][:self.rows, :self.num_agents]
+        if not self.spilled:
+            return data
+        chunks = [np.load(os.path.join(self.spill_dir, "%s-%05d.npy" % (name, i)), mmap_mode="r")
+                  for i in range(len(self.spilled))]
+        chunks.append(data)
+        columns = max(chunk.shape[1] for chunk in chunks)
+        merged = np.full((sum(len(chunk) for chunk in chunks), columns), np.nan)
+        start = 0
+        for chunk in chunks:
+            merged[start:start + len(chunk), :chunk.shape[1]] = chunk
+            start += len(chunk)
+        return merged
+
+    # Create a (steps x agents) DataFrame of one agent variable; in-memory rows are not copied
+    def get_agent_var_frame(self, name):
+        import pandas as pd
+        return pd.DataFrame(self.get_agent_var(name), index=self.steps, copy=False)
+
+    # Create a DataFrame of the model variables
+    def get_model_vars_dataframe(self):
+        import pandas as pd
+        return pd.DataFrame(self.model_vars)
+
+    # Create a DataFrame of all agent variables indexed by (Step, AgentID), like mesa's
+    def get_agent_vars_dataframe(self):
+        import pandas as pd
+        frames = {name: self.get_agent_var(name) for name in self.agent_vars}
+        if not frames:
+            return pd.DataFrame()
+        present = ~np.isnan(np.stack(list(frames.values()))).all(axis=0)
+        step_index, agent_index = np.nonzero(present)
+        index = pd.MultiIndex.from_arrays([np.asarray(self.steps)[step_index], agent_index], names=["Step", "AgentID"])
+        return pd.DataFrame({name: data[present] for name, data in frames.items()}, index=index)
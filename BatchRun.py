@@ -0,0 +1,122 @@
+# Run parameter sweeps of any model headlessly, spread over a process pool
+#
+#   python BatchRun.py AgentModel.TraderModel --steps 100 --replicates 10 --workers 4 \
+#       --param num_traders=10,20,50 --param width=10 --param height=10 \
+#       --param initial_price=100 --param cash_per_trader=1000 \
+#       --param inventory_per_trader=10 --param strategy="'Random'"
+#
+# Every (parameter set, seed) pair is one job. Each worker appends one JSON line
+# per finished job to its own worker-<pid>.jsonl file in the output directory,
+# so results stream to disk as they finish and workers never share a file. The
+# seed of a job only depends on its replicate number, so a job gives the same
+# results whichever worker runs it and however many workers there are.
+import argparse
+import ast
+import importlib
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from mesa import Model
+
+# Import a model class from a "Module.Class" path
+def load_model_class(model_path):
+    module_name, class_name = model_path.rsplit(".", 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+# Create a model with every random source seeded
+def create_model(model_class, params, seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    if issubclass(model_class, Model):
+        # Mesa models take their seed in __new__, before __init__ draws anything
+        model = model_class.__new__(model_class, seed=seed)
+        model.__init__(**params)
+    else:
+        model = model_class(seed=seed, **params)
+    return model
+
+# Get the latest value of every model reporter
+def model_results(model):
+    datacollector = getattr(model, "datacollector", None)
+    model_vars = getattr(datacollector, "model_vars", None) or getattr(model, "model_vars", {})
+    return {name: values[-1] for name, values in model_vars.items() if values}
+
+# Run one job and append its results to this worker's file
+def run_job(job):
+    model_path, params, seed, steps, out_dir = job
+    model = create_model(load_model_class(model_path), params, seed)
+
+    start = time.perf_counter()
+    for i in range(steps):
+        model.step()
+    seconds = time.perf_counter() - start
+
+    record = {"model": model_path, "params": params, "seed": seed, "steps": steps,
+              "seconds": seconds, "results": model_results(model)}
+    with open(os.path.join(out_dir, "worker-%d.jsonl" % os.getpid()), "a") as f:
+        f.write(json.dumps(record, default=float) + "\n")
+    return seconds
+
+# Expand a dict of parameter values and lists into every combination
+def parameter_sets(parameters):
+    names = list(parameters)
+    values = [v if isinstance(v, (list, tuple)) else [v] for v in parameters.values()]
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+# Build the job list of a sweep
+def make_jobs(model_path, parameters, steps, replicates, seed, out_dir):
+    return [(model_path, params, seed + replicate, steps, out_dir)
+            for params in parameter_sets(parameters) for replicate in range(replicates)]
+
+# Run a sweep and return the number of jobs run
+def batch_run(model_path, parameters, steps, replicates=1, seed=0, workers=None, out_dir="results"):
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = make_jobs(model_path, parameters, steps, replicates, seed, out_dir)
+    if workers == 1:
+        for job in jobs:
+            run_job(job)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(run_job, jobs))
+    return len(jobs)
+
+# Read every record written to an output directory
+def load_results(out_dir):
+    records = []
+    for name in sorted(os.listdir(out_dir)):
+        if name.startswith("worker-") and name.endswith(".jsonl"):
+            with open(os.path.join(out_dir, name)) as f:
+                records.extend(json.loads(line) for line in f)
+    return records
+
+# Parse a name=value,value,... argument into a name and a list of values
+def parse_param(argument):
+    name, values = argument.split("=", 1)
+    parsed = ast.literal_eval("[" + values + "]")
+    return name, parsed if len(parsed) > 1 else parsed[0]
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a headless parameter sweep of a model")
+    parser.add_argument("model", help="model class as Module.Class, e.g. AgentModel.TraderModel")
+    parser.add_argument("--param", action="append", default=[], type=parse_param,
+                        help="name=value or name=value1,value2,... (Python literals)")
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--replicates", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first replicate")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--out", default="results", help="directory for the worker result files")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    jobs = batch_run(args.model, dict(args.param), args.steps, args.replicates, args.seed, args.workers, args.out)
+    seconds = time.perf_counter() - start
+    print("%d runs in %.1f s (%.2f runs/s), results in %s" % (jobs, seconds, jobs / seconds, args.out))
+
+if __name__ == "__main__":
+    main()
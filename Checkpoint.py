@@ -0,0 +1,273 @@
+import copyreg
+import gc
+import os
+import pickle
+import random
+import shutil
+import time
+
+import numpy as np
+
+# Arrays with fewer elements than this stay inside the pickle
+MIN_ARRAY_SIZE = 1024
+
+# Attribute types that are stored as agent columns
+COLUMN_TYPES = (int, float, bool)
+
+# Define how to write and read a model checkpoint
+#
+# A checkpoint is a directory. Every numeric agent attribute (int, float or
+# bool for all agents of a class) is written as one .npy column, and so is
+# every large NumPy array the model holds (collector buffers, trade log
+# buffers, vectorized agent state), so all bulk data is plain binary that can
+# be memory-mapped. Everything else, from the grid and the schedule order to
+# the agents' other attributes, goes into one pickle in which agents and
+# arrays are stubs. The model's RNG and the global random and np.random states
+# are saved too, so a resumed run continues bit for bit.
+#
+# Arrays are loaded copy-on-write memory-mapped by default: pages are only read
+# when touched and writes never reach the checkpoint files.
+
+# Stand-in for an array stored next to the pickle; the loader resolves it
+def _saved_array(index):
+    raise pickle.UnpicklingError("saved arrays can only be read through load_checkpoint")
+
+# Get the names of the __slots__ of a class and its bases
+def _slot_names(cls):
+    names = []
+    for base in cls.__mro__:
+        slots = base.__dict__.get("__slots__", ())
+        for name in (slots,) if isinstance(slots, str) else slots:
+            if name not in ("__dict__", "__weakref__"):
+                names.append(name)
+    return names
+
+# Get every attribute of an object, whether it lives in __dict__ or in __slots__
+def _attributes(obj, slots):
+    state = dict(getattr(obj, "__dict__", ()))
+    for name in slots:
+        if hasattr(obj, name):
+            state[name] = getattr(obj, name)
+    return state
+
+# Set attributes on an object, which works for __dict__ and __slots__ alike
+def _set_attributes(obj, state):
+    for name, value in state.items():
+        setattr(obj, name, value)
+
+# Get every attribute of an agent, whether its class uses __dict__ or __slots__
+def agent_attributes(agent):
+    return _attributes(agent, _slot_names(type(agent)))
+
+# Get the agents of a model: the scheduled ones, or a plain agent list
+def model_agents(model):
+    schedule = getattr(model, "schedule", None)
+    if schedule is not None:
+        return schedule.agents
+    return list(getattr(model, "agents", []))
+
+# Get the number of steps a model has run
+def model_steps(model):
+    schedule = getattr(model, "schedule", None)
+    if schedule is not None:
+        return schedule.steps
+    return model.steps
+
+# Split agents by class and find the attributes every agent of a class holds as the same numeric type
+def _agent_columns(agents):
+    groups = {}
+    for agent in agents:
+        groups.setdefault(type(agent), []).append(agent)
+
+    columns = []
+    for cls, members in groups.items():
+        slots = _slot_names(cls)
+        states = [_attributes(agent, slots) for agent in members]
+        arrays = {}
+        for name, value in states[0].items():
+            kind = type(value)
+            if kind not in COLUMN_TYPES:
+                continue
+            values = [state.get(name) for state in states]
+            if not all(type(v) is kind for v in values):
+                continue
+            try:
+                arrays[name] = np.array(values, dtype=np.int64 if kind is int else kind)
+            except OverflowError:
+                continue
+        columns.append((members, states, arrays, bool(slots)))
+    return columns
+
+# Define a pickler that leaves agent columns and large arrays out of the pickle
+class _CheckpointPickler(pickle.Pickler):
+    def __init__(self, file, path, agent_states):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.path = path
+        self.agent_states = agent_states
+        self.num_arrays = 0
+
+    def reducer_override(self, obj):
+        if isinstance(obj, np.ndarray) and obj.dtype != object and obj.size >= MIN_ARRAY_SIZE:
+            np.save(os.path.join(self.path, "array-%05d.npy" % self.num_arrays), np.asarray(obj))
+            self.num_arrays += 1
+            return _saved_array, (self.num_arrays - 1,)
+
+        saved = self.agent_states.get(id(obj))
+        if saved is not None:
+            state, names, slotted = saved
+            for name in names:
+                del state[name]
+            if slotted:
+                return copyreg.__newobj__, (type(obj),), state, None, None, _set_attributes
+            return copyreg.__newobj__, (type(obj),), state
+        return NotImplemented
+
+# Define an unpickler that reads the arrays left out of the pickle
+class _CheckpointUnpickler(pickle.Unpickler):
+    def __init__(self, file, path, mmap):
+        super().__init__(file)
+        self.path = path
+        self.mmap = mmap
+
+    def find_class(self, module, name):
+        if module == __name__ and name == "_saved_array":
+            return self.load_array
+        return super().find_class(module, name)
+
+    def load_array(self, index):
+        return np.load(os.path.join(self.path, "array-%05d.npy" % index), mmap_mode="c" if self.mmap else None)
+
+# Run a function with the cyclic garbage collector paused; building millions
+# of objects otherwise triggers full collections over and over
+def _without_gc(function, *args, **kwargs):
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        if enabled:
+            gc.enable()
+
+# Write a checkpoint of a model into a new directory
+def save_checkpoint(model, path):
+    return _without_gc(_save_checkpoint, model, path)
+
+def _save_checkpoint(model, path):
+    os.makedirs(path)
+    columns = _agent_columns(model_agents(model))
+
+    agent_states = {}
+    groups = []
+    for group, (members, states, arrays, slotted) in enumerate(columns):
+        names = list(arrays)
+        for agent, state in zip(members, states):
+            agent_states[id(agent)] = (state, names, slotted)
+        for name, values in arrays.items():
+            np.save(os.path.join(path, "column-%03d-%s.npy" % (group, name)), values)
+        groups.append((members, names, slotted))
+
+    payload = {
+        "model": model,
+        "random": getattr(model, "random", None),
+        "global_random": random.getstate(),
+        "global_numpy": np.random.get_state(),
+        "groups": groups,
+        "steps": model_steps(model),
+    }
+    with open(os.path.join(path, "state.pkl"), "wb") as f:
+        _CheckpointPickler(f, path, agent_states).dump(payload)
+    return path
+
+# Read a model back from a checkpoint directory
+def load_checkpoint(path, mmap=True, restore_globals=True):
+    return _without_gc(_load_checkpoint, path, mmap, restore_globals)
+
+def _load_checkpoint(path, mmap, restore_globals):
+    with open(os.path.join(path, "state.pkl"), "rb") as f:
+        payload = _CheckpointUnpickler(f, path, mmap).load()
+
+    for group, (members, names, slotted) in enumerate(payload["groups"]):
+        columns = [np.load(os.path.join(path, "column-%03d-%s.npy" % (group, name)), mmap_mode="r").tolist()
+                   for name in names]
+        for agent, *values in zip(members, *columns):
+            if slotted:
+                _set_attributes(agent, dict(zip(names, values)))
+            else:
+                agent.__dict__.update(zip(names, values))
+
+    model = payload["model"]
+    # Mesa keeps the model's RNG on the class; give the resumed model its own
+    if payload["random"] is not None:
+        model.random = payload["random"]
+    if restore_globals:
+        random.setstate(payload["global_random"])
+        np.random.set_state(payload["global_numpy"])
+    return model
+
+# Define a checkpointer that saves a running model every K steps and/or T seconds
+#
+# Checkpoints go to step-<steps> directories under path. Each one is written
+# to a temporary directory first and renamed into place, so a crash mid-write
+# never leaves a broken checkpoint behind, and only the newest keep are kept;
+# keep must be at least 1, the checkpoint just written.
+class Checkpointer:
+    # Define the checkpointer's initial state
+    def __init__(self, path, every_steps=None, every_seconds=None, keep=2):
+        if keep < 1:
+            raise ValueError("keep must be at least 1, got %r" % (keep,))
+        self.path = path
+        self.every_steps = every_steps
+        self.every_seconds = every_seconds
+        self.keep = keep
+        self.last_time = time.monotonic()
+        os.makedirs(path, exist_ok=True)
+
+    # Get the checkpoint directories, oldest first
+    def checkpoints(self):
+        names = sorted(name for name in os.listdir(self.path) if name.startswith("step-"))
+        return [os.path.join(self.path, name) for name in names]
+
+    # Get the newest checkpoint directory, or None
+    def latest(self):
+        checkpoints = self.checkpoints()
+        return checkpoints[-1] if checkpoints else None
+
+    # Load the newest checkpoint, or None if there is none
+    def resume(self, mmap=True):
+        latest = self.latest()
+        if latest is None:
+            return None
+        self.last_time = time.monotonic()
+        return load_checkpoint(latest, mmap)
+
+    # Write a checkpoint of the model now
+    def save(self, model):
+        final = os.path.join(self.path, "step-%012d" % model_steps(model))
+        temporary = os.path.join(self.path, "tmp-%d" % os.getpid())
+        if os.path.exists(temporary):
+            shutil.rmtree(temporary)
+        save_checkpoint(model, temporary)
+        if os.path.exists(final):
+            shutil.rmtree(final)
+        os.replace(temporary, final)
+        self.last_time = time.monotonic()
+
+        for old in self.checkpoints()[:-self.keep]:
+            shutil.rmtree(old)
+        return final
+
+    # Write a checkpoint if one is due; call after every step
+    def maybe_save(self, model):
+        steps = model_steps(model)
+        if self.every_steps and steps % self.every_steps == 0:
+            return self.save(model)
+        if self.every_seconds is not None and time.monotonic() - self.last_time >= self.every_seconds:
+            return self.save(model)
+        return None
+
+    # Step a model up to the given number of steps, checkpointing as it goes
+    def run(self, model, steps):
+        while model_steps(model) < steps:
+            model.step()
+            self.maybe_save(model)
+        return model
@@ -1,14 +1,14 @@
 from mesa import Model
-from mesa.agent import Agent
 from mesa.time import RandomActivation
 from mesa.space import MultiGrid
-from mesa.datacollection import DataCollector
-from mesa.visualization.ModularVisualization import ModularServer
-from mesa.visualization.modules import CanvasGrid
-from mesa.visualization.modules import ChartModule
-from mesa.visualization.UserParam import UserSettableParameter
+from ArrayCollector import ArrayCollector
+from PriceIndex import PriceIndex
+from RandomStreams import MOVE
+from SlotAgent import SlotAgent
+
+class Trader(SlotAgent):
+    __slots__ = ("wealth", "price")
 
-class Trader(Agent):
     def __init__(self, unique_id, model, wealth, price):
         super().__init__(unique_id, model)
         self.wealth = wealth
@@ -25,45 +25,40 @@ class Trader(Agent):
 
         # Movement behaviour
         x, y = self.pos
-        dx, dy = self.random.choice([(-1, 0), (1, 0), (0, -1), (0, 1)])
+        dx, dy = self.model.move_random.choice([(-1, 0), (1, 0), (0, -1), (0, 1)])
         new_pos_x = (x + dx) % self.model.grid.width
         new_pos_y = (y + dy) % self.model.grid.height
         self.model.grid.move_agent(self, (new_pos_x, new_pos_y))
 
     def buy(self):
-        #Find a seller with a lower price
-        sellers = [agent for agent in self.model.schedule.agents if agent.price < self.price]
-        if not sellers:
+        # Choose a seller with a lower price at random
+        seller = self.model.price_index.sample_below(self.price, self.random)
+        if seller is None:
             return
 
-        # Choose a seller at random
-        seller = self.random.choice(sellers)
-
         # Transfer money between buyer and seller
         transfer_amount = min(self.wealth - self.price, seller.price - seller.wealth)
         seller.wealth += transfer_amount
     
     def sell(self):
-        # Find a buyer with a higher price
-        buyers = [agent for agent in self.model.schedule.agents if agent.price > self.price]
-        if not buyers:
+        # Choose a buyer with a higher price at random
+        buyer = self.model.price_index.sample_above(self.price, self.random)
+        if buyer is None:
             return
 
-        # Choose a buyer at random
-        buyer = self.random.choice(buyers)
-
         # Transfer money between buyer and seller
         transfer_amount = min(buyer.wealth - buyer.price, self.price - self.wealth)
         buyer.wealth -= transfer_amount
 
 class FinanceModel(Model):
-    def __init__(self, N, width, height):
+    def __init__(self, N, width, height, streams=None):
         self.num_agents = N
         self.grid = MultiGrid(width, height, True)
         self.schedule = RandomActivation(self)
-        self.datacollector = DataCollector(
+        self.move_random = self.random if streams is None else streams.stream(MOVE)
+        self.datacollector = ArrayCollector(
             model_reporters={"Total_Wealth": total_wealth},
-            agent_reporters={"Wealth": lambda a: a.wealth})
+            agent_reporters={"Wealth": "wealth"})
 
         # Create agents
         for i in range(self.num_agents):
@@ -74,6 +69,9 @@ class FinanceModel(Model):
             x = self.random.randrange(self.grid.width)
             y = self.random.randrange(self.grid.height)
             self.grid.place_agent(a, (x, y))
+
+        # Index the agents by price for finding counterparties
+        self.price_index = PriceIndex(self.schedule.agents)
     
     def step(self):
         self.datacollector.collect(self)
@@ -85,10 +83,6 @@ def total_wealth(model):
         total += agent.wealth
     return total
 
-model = FinanceModel(N=100, width=10, height=10)
-for i in range(100):
-    model.step()
-
 def agent_portrayal(agent):
     portrayal = {"Shape": "circle",
                  "Filled": "true",
@@ -97,22 +91,11 @@ def agent_portrayal(agent):
                  "Color": "red"}
     return portrayal
 
-grid = CanvasGrid(agent_portrayal, 10, 10, 500, 500)
-
-chart = ChartModule([{"Label": "Total_Wealth",
-                        "Color": "Black"}],
-                    data_collector_name='datacollector')
-
-model_params = {
-    "N": UserSettableParameter('slider', "Number of traders", 100, 1, 200),
-    "width": 10,
-    "height": 10
-}
-
-server = ModularServer(FinanceModel,
-                          [grid, chart],
-                            "Finance Model",
-                            model_params)
-server.port = 8521 # The default
+if __name__ == "__main__":
+    # Run a short demo, then serve the model
+    model = FinanceModel(N=100, width=10, height=10)
+    for i in range(100):
+        model.step()
 
-server.launch()
\ No newline at end of file
+    from Server import launch
+    launch("FinanceModel")
@@ -1,29 +1,43 @@
-from mesa import Model, Agent
+from mesa import Model
 from mesa.time import RandomActivation
-from mesa.datacollection import DataCollector
+import math
 import random
-
-from mesa.visualization.modules import ChartModule
-from mesa.visualization.modules import TextElement
-from mesa.visualization.ModularVisualization import ModularServer
-from mesa.visualization.UserParam import UserSettableParameter
-from mesa.visualization.modules import CanvasGrid
-from mesa.visualization.modules import ChartModule
+from ArrayCollector import ArrayCollector
+from SlotAgent import SlotAgent
 
 class FinanceTraderModel(Model):
-    def __init__(self, num_traders, initial_market_price, initial_market_volume):
+    # Model methods and agent methods timed by a Profiler
+    profile_phases = ("schedule.step", "calculate_market_price", "check_totals")
+    profile_agent_methods = ("step", "buy_assets", "sell_assets")
+
+    def __init__(self, num_traders, initial_market_price, initial_market_volume, debug=False, profiler=None):
         self.schedule = RandomActivation(self)
+        self.num_traders = num_traders
         self.market_price = initial_market_price
         self.market_volume = initial_market_volume
-        self.datacollector = DataCollector(
-            model_reporters={"MarketPrice": lambda m: m.market_price,
-                             "MarketVolume": lambda m: m.market_volume},
-            agent_reporters={"Wealth": lambda a: a.wealth})
+        self.debug = debug
+
+        # Running totals of the traders' demand, supply and wealth, kept up to date by the traders
+        self.total_demand = 0
+        self.total_supply = 0
+        self.total_wealth = 0
+        self.datacollector = ArrayCollector(
+            model_reporters={"MarketPrice": "market_price",
+                             "MarketVolume": "market_volume"},
+            agent_reporters={"Wealth": "wealth"})
 
         # Create trader agents and add them to the schedule
         for i in range(num_traders):
             trader = Trader(i, self)
             self.schedule.add(trader)
+            self.total_demand += trader.demand
+            self.total_supply += trader.supply
+            self.total_wealth += trader.wealth
+
+        # Time the step phases with a Profiler if one is given
+        self.profiler = profiler
+        if profiler is not None:
+            profiler.attach(self)
 
     def step(self):
         self.schedule.step()
@@ -32,17 +46,31 @@ class FinanceTraderModel(Model):
         self.market_price = self.calculate_market_price()
         self.market_volume = max(self.market_volume, 0)
 
+        # Compare the running totals with a full recount
+        if self.debug:
+            self.check_totals()
+
     def calculate_market_price(self):
         # Calculate the market price based on supply and demand
         if self.market_volume == 0:
             return self.market_price
         else:
-            excess_demand = sum([a.demand for a in self.schedule.agents if isinstance(a, Trader)])
-            excess_supply = sum([a.supply for a in self.schedule.agents if isinstance(a, Trader)])
-            equilibrium_price = self.market_price + (excess_demand - excess_supply) / self.market_volume
+            equilibrium_price = self.market_price + (self.total_demand - self.total_supply) / self.market_volume
             return equilibrium_price
 
-class Trader(Agent):
+    def check_totals(self):
+        traders = [a for a in self.schedule.agents if isinstance(a, Trader)]
+        demand = sum([a.demand for a in traders])
+        supply = sum([a.supply for a in traders])
+        wealth = sum([a.wealth for a in traders])
+        assert self.total_demand == demand, "total demand %r != %r" % (self.total_demand, demand)
+        assert self.total_supply == supply, "total supply %r != %r" % (self.total_supply, supply)
+        assert math.isclose(self.total_wealth, wealth, rel_tol=1e-9, abs_tol=1e-6), \
+            "total wealth %r != %r" % (self.total_wealth, wealth)
+
+class Trader(SlotAgent):
+    __slots__ = ("wealth", "bid_price", "ask_price", "demand", "supply")
+
     def __init__(self, unique_id, model):
         super().__init__(unique_id, model)
         self.wealth = 1000
@@ -55,11 +83,15 @@ class Trader(Agent):
         # Decide on a trading strategy based on market conditions
         if self.model.market_price < self.bid_price:
             # Buy assets if the price is below the trader's bid price
-            self.demand = random.randint(1, 5)
+            demand = random.randint(1, 5)
+            self.model.total_demand += demand - self.demand
+            self.demand = demand
             self.buy_assets(self.demand)
         elif self.model.market_price > self.ask_price:
             # Sell assets if the price is above the trader's ask price
-            self.supply = random.randint(1, 5)
+            supply = random.randint(1, 5)
+            self.model.total_supply += supply - self.supply
+            self.supply = supply
             self.sell_assets(self.supply)
 
     def buy_assets(self, quantity):
@@ -68,6 +100,7 @@ class Trader(Agent):
             cost = self.model.market_price * quantity
             if self.wealth >= cost:
                 self.wealth -= cost
+                self.model.total_wealth -= cost
                 self.model.market_volume += quantity
 
     def sell_assets(self, quantity):
@@ -76,21 +109,9 @@ class Trader(Agent):
             revenue = self.model.market_price * quantity
             if self.model.market_volume >= quantity:
                 self.wealth += revenue
+                self.model.total_wealth += revenue
                 self.model.market_volume -= quantity
 
-# Create a visualization of the model
-
-class MarketPriceChart(ChartModule):
-    series = [{"Label": "MarketPrice", "Color": "Black"}]
-
-class MarketVolumeChart(ChartModule):
-    series = [{"Label": "MarketVolume", "Color": "Red"}]
-
-class WealthDistributionText(TextElement):
-    def render(self, model):
-        wealths = [agent.wealth for agent in model.schedule.agents if isinstance(agent, Trader)]
-        return "Average Wealth: {:.2f}".format(sum(wealths) / len(wealths))
-
 def trader_portrayal(agent):
     portrayal = {"Shape": "circle",
                  "Color": "blue",
@@ -105,18 +126,7 @@ def trader_portrayal(agent):
         portrayal["r"] = 0.25
     return portrayal
 
-trader_canvas = CanvasGrid(trader_portrayal, 10, 10, 500, 500)
-
-model_params = {"num_traders": UserSettableParameter("slider", "Number of Traders", 20, 1, 100, 1),
-                "initial_market_price": UserSettableParameter("slider", "Initial Market Price", 10, 1, 100, 1),
-                "initial_market_volume": UserSettableParameter("slider", "Initial Market Volume", 100, 1, 1000, 1)}
-
 #Create the server
-server = ModularServer(FinanceTraderModel,
-                          [trader_canvas, MarketPriceChart, MarketVolumeChart, WealthDistributionText],
-                            "Finance Trader Model",
-                            model_params)
-                            
-
-server.port = 8521
-server.launch()
\ No newline at end of file
+if __name__ == "__main__":
+    from Server import launch
+    launch("FinanceTraderModel")
@@ -1,23 +1,26 @@
+from operator import attrgetter
+
+import numpy as np
 from mesa import Model
-from mesa.agent import Agent
-from mesa.time import RandomActivation
-from mesa.space import MultiGrid
-from mesa.datacollection import DataCollector
-from mesa.visualization.ModularVisualization import ModularServer
-from mesa.visualization.modules import CanvasGrid
-from mesa.visualization.modules import ChartModule
-from mesa.visualization.UserParam import UserSettableParameter
-import random
-
-class Trader(Agent):
+from AgentStore import StoreActivation
+from ArrayCollector import ArrayCollector
+from Neighborhood import TableMultiGrid
+from RandomStreams import MOVE
+from SlotAgent import SlotAgent
+from TradeLog import REMOVE
+
+class Trader(SlotAgent):
+    __slots__ = ("wealth", "price")
+
     def __init__(self, unique_id, model, wealth, price):
         super().__init__(unique_id, model)
         self.wealth = wealth
         self.price = price
 
     def step(self):
-
-        self.trade()
+        # Bucketed models settle every trade of the step before the agents move
+        if not self.model.bucketed:
+            self.trade()
         self.move()
 
     def trade(self):
@@ -25,10 +28,7 @@ class Trader(Agent):
         cellmates = self.model.grid.get_cell_list_contents([self.pos])
         cellmates.remove(self)
 
-        # Sort cellmates by price
-        cellmates = sorted(cellmates, key=lambda x: x.price)
-
-        # Trae with celmates in order of price
+        # Trade with every cellmate; each trade is at the agent's own price, so the order does not matter
         for other in cellmates:
             if self.price < other.price:
                 self.buy(other)
@@ -53,17 +53,30 @@ class Trader(Agent):
             moore=True,
             include_center=False
         )
-        new_position = self.random.choice(possible_steps)
+        new_position = self.model.move_random.choice(possible_steps)
         self.model.grid.move_agent(self, new_position)
 
+# With bucketed=True every agent trades with the cellmates it has at the start
+# of the step, all at once, and only then do the agents move, in random order as
+# before. The default keeps the sequential rule, where each agent trades with
+# whoever shares its cell when it is activated and then moves.
 class FinanceModel(Model):
-    def __init__(self, N, width, height, starting_wealth, starting_price):
+    # Model methods and agent methods timed by a Profiler
+    profile_phases = ("datacollector.collect", "trade_cells", "schedule.step", "remove_broke_agents")
+    profile_agent_methods = ("step", "trade", "move")
+
+    def __init__(self, N, width, height, starting_wealth, starting_price, trade_log=None, profiler=None,
+                 bucketed=False, streams=None):
         self.num_agents = N
-        self.grid = MultiGrid(width, height, True)
-        self.schedule = RandomActivation(self)
-        self.datacollector = DataCollector(
+        self.total_transactions = 0
+        self.trade_log = trade_log
+        self.bucketed = bucketed
+        self.move_random = self.random if streams is None else streams.stream(MOVE)
+        self.grid = TableMultiGrid(width, height, True)
+        self.schedule = StoreActivation(self)
+        self.datacollector = ArrayCollector(
             model_reporters={"Total_Wealth": total_wealth},
-            agent_reporters={"Wealth": lambda a: a.wealth})
+            agent_reporters={"Wealth": "wealth"})
 
         # Create agents
         for i in range(self.num_agents):
@@ -75,16 +88,66 @@ class FinanceModel(Model):
             y = self.random.randrange(self.grid.height)
             self.grid.place_agent(a, (x, y))
 
+        # Time the step phases with a Profiler if one is given
+        self.profiler = profiler
+        if profiler is not None:
+            profiler.attach(self)
+
     def step(self):
         self.datacollector.collect(self)
+        if self.bucketed:
+            self.trade_cells()
         self.schedule.step()
-
+        self.remove_broke_agents()
+
+    # Settle the trades of every agent with its cellmates at once
+    #
+    # An agent with price p sells at p to each of its n_lower cheaper cellmates
+    # and buys at p from each of its n_higher dearer ones, and each of them does
+    # the same with it at their own price, so its wealth changes by
+    # p * (n_lower - n_higher) + (sum_lower - sum_higher), the sums being the
+    # prices of those cellmates. One sort of the agents by cell and price gives
+    # every count and sum by binary search, instead of one sort per agent.
+    def trade_cells(self):
+        agents = self.schedule.agents
+        if not agents:
+            return
+        height = self.grid.height
+        cells = np.array([x * height + y for x, y in map(attrgetter("pos"), agents)], dtype=np.int64)
+        prices = np.array([agent.price for agent in agents])
+
+        # Key each agent by its cell and the rank of its price, and sort once
+        levels = np.unique(prices, return_inverse=True)[1]
+        num_levels = int(levels.max()) + 1
+        keys = cells * num_levels + levels
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        cumulative = np.concatenate(([0], np.cumsum(prices[order])))
+
+        # Bounds of each agent's cell, and of its cheaper and dearer cellmates
+        start = np.searchsorted(sorted_keys, cells * num_levels, "left")
+        end = np.searchsorted(sorted_keys, (cells + 1) * num_levels, "left")
+        lower_end = np.searchsorted(sorted_keys, keys, "left")
+        higher_start = np.searchsorted(sorted_keys, keys, "right")
+
+        n_lower = lower_end - start
+        n_higher = end - higher_start
+        sum_lower = cumulative[lower_end] - cumulative[start]
+        sum_higher = cumulative[end] - cumulative[higher_start]
+        changes = prices * (n_lower - n_higher) + (sum_lower - sum_higher)
+        self.total_transactions += int(n_lower.sum() + n_higher.sum())
+        for agent, change in zip(agents, changes.tolist()):
+            agent.wealth += change
+
+    def remove_broke_agents(self):
         # Remove agent if they have no wealth
-        agents_to_remove = [agent for agent in self.schedule.agents if agent.wealth <= 0]
-        for agent in agents_to_remove:
-            self.schedule.remove(agent)
-            self.grid._remove_agent(agent.pos, agent)
-            print("Removed agent " + str(agent.unique_id))
+        agents_to_remove = [agent for agent in self.schedule.store if agent.wealth <= 0]
+        if not agents_to_remove:
+            return
+        if self.trade_log is not None:
+            ids = [agent.unique_id for agent in agents_to_remove]
+            self.trade_log.record_many(self.schedule.steps, REMOVE, ids, -1, 0, 0)
+        self.schedule.remove_many(agents_to_remove, self.grid)
 
 def total_wealth(model):
     return sum([a.wealth for a in model.schedule.agents])
@@ -100,26 +163,6 @@ def agent_portrayal(agent):
                  "Color": "red"}
     return portrayal
 
-grid = CanvasGrid(agent_portrayal, 10, 10, 500, 500)
-
-chart = ChartModule([{"Label": "Total_Wealth",
-                        "Color": "Black"},
-                        {"Label": "Total_Transactions",
-                        "Color": "Blue"}],
-                    data_collector_name='datacollector')
-
-model_params = {
-    "N": UserSettableParameter('slider', "Number of traders", 100, 1, 200),
-    "width": 10,
-    "height": 10,
-    "starting_wealth": UserSettableParameter('slider', "Starting wealth", 100, 1, 1000),
-    "starting_price": UserSettableParameter('slider', "Starting price", 1, 1, 10)
-}
-
-server = ModularServer(FinanceModel,
-                          [grid, chart],
-                            "Finance Model",
-                            model_params)
-                            
-server.port = 8521 # The default
-server.launch()
\ No newline at end of file
+if __name__ == "__main__":
+    from Server import launch
+    launch("FreshModel")
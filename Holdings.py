@@ -0,0 +1,187 @@
+import numpy as np
+
+# Elements of the dense matrix converted to floats at a time when marking to market
+CHUNK = 1 << 20
+
+# Define a dense store of holdings: an investors x firms matrix of shares
+#
+# Every (investor, firm) pair has an entry, held or not, so lookups and updates
+# are plain indexing but the memory grows with investors times firms.
+class DenseHoldings:
+    # Define the store's initial state
+    def __init__(self, num_investors, num_firms, dtype=np.int32):
+        self.num_investors = num_investors
+        self.num_firms = num_firms
+        self.shares = np.zeros((num_investors, num_firms), dtype=dtype)
+
+    # Set the shares of (investor, firm) pairs, which must be distinct
+    def load(self, investor, firm, shares):
+        self.shares[investor, firm] = shares
+
+    # Get the shares of (investor, firm) pairs
+    def get(self, investor, firm):
+        return self.shares[investor, firm]
+
+    # Add to the shares of (investor, firm) pairs, which must be distinct
+    def add(self, investor, firm, delta):
+        self.shares[investor, firm] += delta.astype(self.shares.dtype)
+
+    # Get one investor's shares of every firm
+    def row(self, investor):
+        return self.shares[investor]
+
+    # Get the investors holding a firm and their shares
+    def holders(self, firm):
+        column = self.shares[:, firm]
+        investor = np.flatnonzero(column)
+        return investor, column[investor]
+
+    # Get the value of every investor's shares at the given prices
+    def mark_to_market(self, prices):
+        values = np.empty(self.num_investors, dtype=np.float64)
+        rows = max(1, CHUNK // max(self.num_firms, 1))
+        for start in range(0, self.num_investors, rows):
+            values[start:start + rows] = self.shares[start:start + rows] @ prices
+        return values
+
+    # Get the investors x firms matrix
+    def toarray(self):
+        return self.shares.copy()
+
+    def nbytes(self):
+        return self.shares.nbytes
+
+# Define a sparse store of holdings: only the positions investors hold
+#
+# Positions are three parallel arrays sorted by firm and then investor: the
+# key firm * num_investors + investor, the investor and the shares. Each firm's
+# holders are thus one contiguous run, found through indptr, the start of each
+# firm's run. Lookups and updates of existing positions are a binary search of
+# the keys; a batch of new positions is merged in with one insert, so the copy
+# costs O(positions) once per batch rather than once per position.
+#
+# A position sold down to zero stays in place with zero shares, which changes
+# no value or lookup. Like AgentStore's empty slots, such positions are
+# squeezed out in one pass by compact(), which runs by itself once they make up
+# compact_fraction of the positions.
+class SparseHoldings:
+    # Define the store's initial state
+    def __init__(self, num_investors, num_firms, dtype=np.int32, compact_fraction=0.25):
+        self.num_investors = num_investors
+        self.num_firms = num_firms
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.investor = np.zeros(0, dtype=np.int32)
+        self.shares = np.zeros(0, dtype=dtype)
+        self.indptr = np.zeros(num_firms + 1, dtype=np.int64)
+        self.zeros = 0
+        self.compact_fraction = compact_fraction
+
+    def __len__(self):
+        return len(self.keys) - self.zeros
+
+    # Get the keys of (investor, firm) pairs
+    def key(self, investor, firm):
+        return np.asarray(firm, dtype=np.int64) * self.num_investors + investor
+
+    # Get the firm of positions
+    def firm(self, positions):
+        return self.keys[positions] // self.num_investors
+
+    # Replace the positions with the given (investor, firm) pairs, which must be distinct
+    def load(self, investor, firm, shares):
+        keys = self.key(investor, firm)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.investor = np.asarray(investor, dtype=np.int32)[order]
+        self.shares = np.asarray(shares, dtype=self.shares.dtype)[order]
+        self.update_indptr()
+        self.zeros = 0
+        self.compact()
+
+    # Find the start of each firm's run of positions
+    def update_indptr(self):
+        firms = np.arange(self.num_firms + 1, dtype=np.int64) * self.num_investors
+        self.indptr = np.searchsorted(self.keys, firms)
+
+    # Find the positions of (investor, firm) pairs and whether they are held
+    def find(self, keys):
+        positions = np.searchsorted(self.keys, keys)
+        found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == keys[found]
+        return positions, found
+
+    # Get the shares of (investor, firm) pairs
+    def get(self, investor, firm):
+        positions, found = self.find(self.key(investor, firm))
+        shares = np.zeros(len(positions), dtype=self.shares.dtype)
+        shares[found] = self.shares[positions[found]]
+        return shares
+
+    # Add to the shares of (investor, firm) pairs, which must be distinct
+    def add(self, investor, firm, delta):
+        keys = self.key(investor, firm)
+        positions, found = self.find(keys)
+
+        # Update the positions already there in place
+        held = positions[found]
+        before = self.shares[held]
+        after = before + delta[found].astype(self.shares.dtype)
+        self.shares[held] = after
+        self.zeros += int(np.count_nonzero(after == 0)) - int(np.count_nonzero(before == 0))
+
+        # Merge the new positions in with one insert
+        new = ~found & (delta != 0)
+        if new.any():
+            if (delta[new] < 0).any():
+                raise ValueError("Cannot sell shares of a firm the investor does not hold")
+            order = np.argsort(keys[new], kind="stable")
+            at = positions[new][order]
+            new_keys = keys[new][order]
+            self.keys = np.insert(self.keys, at, new_keys)
+            self.investor = np.insert(self.investor, at, np.asarray(investor)[new][order].astype(np.int32))
+            self.shares = np.insert(self.shares, at, delta[new][order].astype(self.shares.dtype))
+            counts = np.bincount(new_keys // self.num_investors, minlength=self.num_firms)
+            self.indptr[1:] += np.cumsum(counts)
+        self.maybe_compact()
+
+    # Get one investor's shares of every firm; this scans every position
+    def row(self, investor):
+        positions = np.flatnonzero(self.investor == investor)
+        row = np.zeros(self.num_firms, dtype=self.shares.dtype)
+        row[self.firm(positions)] = self.shares[positions]
+        return row
+
+    # Get the investors holding a firm and their shares
+    def holders(self, firm):
+        start, end = self.indptr[firm], self.indptr[firm + 1]
+        shares = self.shares[start:end]
+        held = np.flatnonzero(shares)
+        return self.investor[start:end][held], shares[held]
+
+    # Get the value of every investor's shares at the given prices
+    def mark_to_market(self, prices):
+        weights = self.shares * np.repeat(prices, np.diff(self.indptr))
+        return np.bincount(self.investor, weights=weights, minlength=self.num_investors)
+
+    # Get the investors x firms matrix
+    def toarray(self):
+        matrix = np.zeros((self.num_investors, self.num_firms), dtype=self.shares.dtype)
+        matrix[self.investor, self.firm(slice(None))] = self.shares
+        return matrix
+
+    def nbytes(self):
+        return self.keys.nbytes + self.investor.nbytes + self.shares.nbytes + self.indptr.nbytes
+
+    # Compact the positions if enough of them are empty
+    def maybe_compact(self):
+        if self.zeros > self.compact_fraction * len(self.keys):
+            self.compact()
+
+    # Squeeze out the positions with no shares
+    def compact(self):
+        held = self.shares != 0
+        self.keys = self.keys[held]
+        self.investor = self.investor[held]
+        self.shares = self.shares[held]
+        self.update_indptr()
+        self.zeros = 0
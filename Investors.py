@@ -1,18 +1,51 @@
+import numpy as np
 from mesa import Agent, Model
 from mesa.time import RandomActivation
-from mesa.visualization.modules import CanvasGrid
-from mesa.visualization.ModularVisualization import ModularServer
-from mesa.visualization.modules import ChartModule
 
+from ArrayCollector import ArrayCollector
+from Holdings import DenseHoldings, SparseHoldings
+
+# Investment strategies, in the order of their codes in StockMarket.strategy
+STRATEGIES = ("random", "fundamental")
+RANDOM, FUNDAMENTAL = range(len(STRATEGIES))
+
+# Price tick: limit prices and clearing prices are whole numbers of ticks
+TICK = 0.01
+
+# Define an investor, a view of its row of the market's arrays
 class Investor(Agent):
     def __init__(self, unique_id, model, strategy):
         super().__init__(unique_id, model)
+        self.index = unique_id
         self.strategy = strategy
-        self.cash = 1000
-        self.stocks = 0
+
+    @property
+    def strategy(self):
+        return STRATEGIES[self.model.strategy[self.index]]
+
+    @strategy.setter
+    def strategy(self, strategy):
+        self.model.strategy[self.index] = STRATEGIES.index(strategy)
+
+    @property
+    def cash(self):
+        return self.model.cash[self.index]
+
+    @cash.setter
+    def cash(self, cash):
+        self.model.cash[self.index] = cash
+
+    # Get the investor's shares of every firm
+    @property
+    def holdings(self):
+        return self.model.holdings.row(self.index)
+
+    @property
+    def stocks(self):
+        return int(self.holdings.sum())
 
     def step(self):
-        # Implement the investor's trading strategy
+        # The market submits and settles the orders of all investors at once
         ...
 
 def investor_portrayal(agent):
@@ -20,15 +53,37 @@ def investor_portrayal(agent):
             "r": 0.5,
             "Color": "blue"}
 
+# Define a firm, a view of its entries in the market's arrays
 class Firm(Agent):
     def __init__(self, unique_id, model, initial_stock_price, initial_shares):
         super().__init__(unique_id, model)
+        self.index = unique_id - model.num_investors
         self.stock_price = initial_stock_price
         self.shares = initial_shares
         self.cash = 0
 
+    @property
+    def stock_price(self):
+        return self.model.prices[self.index]
+
+    @stock_price.setter
+    def stock_price(self, price):
+        self.model.prices[self.index] = price
+
+    @property
+    def value(self):
+        return self.model.values[self.index]
+
+    @property
+    def shares(self):
+        return self.model.shares[self.index]
+
+    @shares.setter
+    def shares(self, shares):
+        self.model.shares[self.index] = shares
+
     def step(self):
-        # Implement the firm's financial performance
+        # The market moves the fundamental values of all firms at once
         ...
 
 def firm_portrayal(agent):
@@ -37,34 +92,194 @@ def firm_portrayal(agent):
             "h": 1,
             "Color": "green"}
 
+# Define a multi-asset stock market cleared by one batched call auction per step
+#
+# The market holds every investor's cash and holdings, and every firm's price,
+# fundamental value and shares outstanding; Investor and Firm agents are views
+# of their entries. The holdings are a DenseHoldings matrix, or with sparse a
+# SparseHoldings store of only the positions held, for markets with many firms
+# where each investor holds a few. Each step the firms'
+# fundamental values follow a geometric random walk, and a random fraction of
+# the investors each submit one limit order for one random firm: random
+# investors buy or sell at random around the last price, fundamental investors
+# buy below and sell above the firm's value. Buyers never bid more than their
+# cash and sellers never offer more shares than they hold.
+#
+# All firms are then cleared together. The orders are sorted once by firm and
+# limit, which gives every firm's supply and demand at each limit price as
+# differences of cumulative sums. Each firm trades at the limit price with the
+# largest matched volume, ties going to the smaller imbalance and then to the
+# price closest to the last one; orders at better prices fill first, and
+# orders at the same price in the random order they were drawn in. No step of
+# this loops over firms or investors.
 class StockMarket(Model):
-    def __init__(self, num_investors, num_firms):
+    def __init__(self, num_investors, num_firms, initial_cash=1000, initial_stock_price=10, initial_shares=None,
+                 initial_holders=None, fundamental_fraction=0.5, activity=0.1, max_order=10, spread=0.02,
+                 volatility=0.01, sparse=False):
         self.schedule = RandomActivation(self)
         self.num_investors = num_investors
         self.num_firms = num_firms
-        self.grid = CanvasGrid(investor_portrayal, 10, 10, 500, 500)
+        self.activity = activity
+        self.max_order = max_order
+        self.spread = spread
+        self.volatility = volatility
+        self.rng = np.random.default_rng(self.random.getrandbits(64))
+
+        # Define the market arrays
+        self.cash = np.full(num_investors, initial_cash, dtype=np.float64)
+        self.strategy = np.zeros(num_investors, dtype=np.int8)
+        self.holdings = (SparseHoldings if sparse else DenseHoldings)(num_investors, num_firms)
+        self.prices = np.zeros(num_firms, dtype=np.float64)
+        self.values = np.full(num_firms, initial_stock_price, dtype=np.float64)
+        self.shares = np.zeros(num_firms, dtype=np.int64)
+        self.volume = 0
+        self.num_orders = 0
+        self.average_price = float(initial_stock_price)
+
+        # By default, issue as many shares as make the market worth the investors' cash
+        if initial_shares is None:
+            initial_shares = int(num_investors * initial_cash / (max(num_firms, 1) * initial_stock_price))
 
         # Create investors
+        codes = (self.rng.random(num_investors) < fundamental_fraction).tolist()
         for i in range(self.num_investors):
-            investor = Investor(i, self, strategy="random")
+            investor = Investor(i, self, strategy=STRATEGIES[codes[i]])
             self.schedule.add(investor)
 
         # Create firms
         for i in range(self.num_firms):
-            firm = Firm(i + self.num_investors, self, initial_stock_price=10, initial_shares=1000)
+            firm = Firm(i + self.num_investors, self, initial_stock_price=initial_stock_price,
+                        initial_shares=initial_shares)
             self.schedule.add(firm)
 
-    def step(self):
-        self.schedule.step()
+        # Hand every share of every firm to a random investor, or to one of initial_holders random investors
+        if num_investors:
+            investors, firms, shares = [], [], []
+            for j in range(num_firms):
+                if initial_holders is None:
+                    owners = self.rng.integers(num_investors, size=initial_shares)
+                else:
+                    holders = self.rng.integers(num_investors, size=initial_holders)
+                    owners = holders[self.rng.integers(initial_holders, size=initial_shares)]
+                owners, counts = np.unique(owners, return_counts=True)
+                investors.append(owners)
+                firms.append(np.full(len(owners), j))
+                shares.append(counts)
+            if num_firms:
+                self.holdings.load(np.concatenate(investors), np.concatenate(firms), np.concatenate(shares))
 
-grid = CanvasGrid(investor_portrayal, 10, 10, 500, 500, grid_width=10)
-chart = ChartModule([{"Label": "Stock Price",
-                      "Color": "black"}],
-                    data_collector_name="datacollector")
+        self.datacollector = ArrayCollector(
+            model_reporters={"Stock Price": "average_price", "Volume": "volume", "Orders": "num_orders"})
+
+    # Move the fundamental values of all firms
+    def update_values(self):
+        self.values *= np.exp(self.rng.normal(0, self.volatility, self.num_firms))
+
+    # Draw this step's orders as arrays (investor, firm, side, limit in ticks, quantity); side is 1 to buy, -1 to sell
+    def submit_orders(self):
+        # Without firms there is nothing to trade
+        if self.num_firms == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty, empty, empty
+
+        rng = self.rng
+        investor = rng.permutation(np.flatnonzero(rng.random(self.num_investors) < self.activity))
+        n = len(investor)
+        firm = rng.integers(self.num_firms, size=n)
+        price = self.prices[firm]
+        value = self.values[firm]
+
+        # Random investors pick a side at random; fundamental ones buy below value and sell above
+        fundamental = self.strategy[investor] == FUNDAMENTAL
+        side = np.where(rng.random(n) < 0.5, 1, -1)
+        side = np.where(fundamental, np.where(value > price, 1, -1), side)
+        limit = np.where(fundamental, value, price) * np.exp(rng.normal(0, self.spread, n))
+        ticks = np.maximum(np.rint(limit / TICK), 1).astype(np.int64)
+
+        # Never bid more than the cash or offer more than the shares held
+        size = rng.integers(1, self.max_order + 1, size=n)
+        affordable = np.floor(self.cash[investor] / (ticks * TICK)).astype(np.int64)
+        held = self.holdings.get(investor, firm)
+        quantity = np.where(side > 0, np.minimum(size, affordable), np.minimum(size, held))
+
+        keep = quantity > 0
+        return investor[keep], firm[keep], side[keep], ticks[keep], quantity[keep]
+
+    # Clear the orders of every firm at once and settle the trades
+    def clear(self, investor, firm, side, ticks, quantity):
+        self.num_orders = len(investor)
+        self.volume = 0
+        if not len(investor):
+            return
+
+        # Sort the orders by firm and limit
+        num_ticks = int(ticks.max()) + 1
+        keys = firm * num_ticks + ticks
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        sorted_firm = firm[order]
+        buy = side[order] > 0
+        buys = np.concatenate(([0], np.cumsum(np.where(buy, quantity[order], 0))))
+        sells = np.concatenate(([0], np.cumsum(np.where(buy, 0, quantity[order]))))
+
+        # Supply (sells at or below) and demand (buys at or above) at each order's limit price
+        start = np.searchsorted(sorted_keys, sorted_firm * num_ticks, "left")
+        end = np.searchsorted(sorted_keys, (sorted_firm + 1) * num_ticks, "left")
+        supply = sells[np.searchsorted(sorted_keys, sorted_keys, "right")] - sells[start]
+        demand = buys[end] - buys[np.searchsorted(sorted_keys, sorted_keys, "left")]
+        matched = np.minimum(supply, demand)
+
+        # Pick each firm's clearing price: most volume, then least imbalance, then closest to the last price
+        limit = sorted_keys - sorted_firm * num_ticks
+        distance = np.abs(limit - np.rint(self.prices[sorted_firm] / TICK))
+        best = np.lexsort((distance, np.abs(demand - supply), -matched, sorted_firm))
+        first = best[np.r_[True, sorted_firm[best][1:] != sorted_firm[best][:-1]]]
+        traded = first[matched[first] > 0]
+        if not len(traded):
+            return
+        firms = sorted_firm[traded]
+        volume = np.zeros(self.num_firms, dtype=np.int64)
+        volume[firms] = matched[traded]
+        clearing = np.full(self.num_firms, -1, dtype=np.int64)
+        clearing[firms] = limit[traded]
+
+        # Fill buys from the highest limit down and sells from the lowest up
+        self.settle(investor, firm, ticks, quantity, (side > 0) & (ticks >= clearing[firm]) & (clearing[firm] >= 0),
+                    volume, clearing, 1)
+        self.settle(investor, firm, ticks, quantity, (side < 0) & (ticks <= clearing[firm]), volume, clearing, -1)
+
+        self.prices[firms] = clearing[firms] * TICK
+        self.volume = int(volume.sum())
+
+    # Fill the eligible orders of one side up to each firm's volume, best prices first
+    def settle(self, investor, firm, ticks, quantity, eligible, volume, clearing, side):
+        idx = np.flatnonzero(eligible)
+        idx = idx[np.lexsort((-side * ticks[idx], firm[idx]))]
+        f = firm[idx]
+        q = quantity[idx]
+        filled_before = np.cumsum(q) - q
+        filled_before -= filled_before[np.searchsorted(f, f, "left")]
+        fill = np.clip(volume[f] - filled_before, 0, q)
+
+        # Each investor has at most one order, so the (investor, firm) pairs are distinct
+        i = investor[idx]
+        self.holdings.add(i, f, side * fill)
+        self.cash[i] -= side * fill * (clearing[f] * TICK)
+
+    # Get the value of every investor's cash and shares at the last prices
+    def wealth(self):
+        return self.cash + self.holdings.mark_to_market(self.prices)
+
+    def step(self):
+        self.update_values()
+        self.clear(*self.submit_orders())
+        self.average_price = float(self.prices.mean()) if self.num_firms else 0.0
+        self.datacollector.collect(self)
 
-server = ModularServer(StockMarket,
-                          [grid, chart],
-                            "Stock Market Model",
-                            {"num_investors": 10, "num_firms": 5})
+        # The agents' behaviour is all in the batched market; only the schedule's clock moves
+        self.schedule.steps += 1
+        self.schedule.time += 1
 
-server.launch()
\ No newline at end of file
+if __name__ == "__main__":
+    from Server import launch
+    launch("Investors")
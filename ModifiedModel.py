@@ -1,14 +1,13 @@
 from mesa import Model
-from mesa.agent import Agent
 from mesa.time import RandomActivation
-from mesa.space import MultiGrid
-from mesa.datacollection import DataCollector
-from mesa.visualization.ModularVisualization import ModularServer
-from mesa.visualization.modules import CanvasGrid
-from mesa.visualization.modules import ChartModule
-from mesa.visualization.UserParam import UserSettableParameter
-
-class Trader(Agent):
+from ArrayCollector import ArrayCollector
+from Neighborhood import TableMultiGrid
+from RandomStreams import MOVE
+from SlotAgent import SlotAgent
+
+class Trader(SlotAgent):
+    __slots__ = ("wealth", "price")
+
     def __init__(self, unique_id, model, wealth, price):
         super().__init__(unique_id, model)
         self.wealth = wealth
@@ -36,7 +35,7 @@ class Trader(Agent):
             self.pos,
             moore=True,
             include_center=False)
-        new_position = self.random.choice(possible_steps)
+        new_position = self.model.move_random.choice(possible_steps)
         self.model.grid.move_agent(self, new_position)
 
     def trade(self):
@@ -75,14 +74,13 @@ class Trader(Agent):
 
     def sell(self):
 
-        # Look for a neighboring cell with a buyer
-
-        neighbors = self.model.grid.get_neighbors(self.pos, include_center=False, moore=True)
-        buyers = [agent for agent in self.model.grid.get_cell_list_contents(neighbors) if isinstance(agent, Trader) and agent.price >= self.price]
+        # Look for buyers in the neighboring cells, gathered into the model's reused buffer
+        buyers = self.model.buyers
+        count = self.model.grid.neighbors_at_least(self.pos, True, "price", self.price, buyers)
 
-        if buyers:
-            # Choose a random buyer from the neighboring cells and sell to them
-            buyer = self.random.choice(buyers)
+        if count:
+            # Choose a random buyer from the neighboring cells and sell to them; the same draw as random.choice
+            buyer = buyers[self.random.randrange(count)]
             buyer.wealth -= self.price
             self.wealth += self.price
             self.model.total_transactions += 1
@@ -116,17 +114,19 @@ def total_wealth(model):
     return sum([a.wealth for a in model.schedule.agents])
 
 def total_transactions(model):
-    return model.stions
+    return model.total_transactions
 
 class FinanceModel(Model):
-    def __init__(self, N, width, height):
+    def __init__(self, N, width, height, streams=None):
         self.num_agents = N
-        self.grid = MultiGrid(width, height, True)
+        self.grid = TableMultiGrid(width, height, True)
         self.schedule = RandomActivation(self)
         self.total_transactions = 0
-        self.datacollector = DataCollector(
+        self.buyers = []
+        self.move_random = self.random if streams is None else streams.stream(MOVE)
+        self.datacollector = ArrayCollector(
             model_reporters={"Total_Wealth": total_wealth, "Total_Transactions": total_transactions},
-            agent_reporters={"Wealth": lambda a: a.wealth, "Price": lambda a: a.price})
+            agent_reporters={"Wealth": "wealth", "Price": "price"})
         
         # Create agents
         for i in range(self.num_agents):
@@ -149,25 +149,7 @@ def agent_portrayal(agent):
                  "Layer": 0,
                  "Color": "red" if agent.price > 5 else "green"}
     return portrayal
-    
-grid = CanvasGrid(agent_portrayal, 10, 10, 500, 500)
-
-chart = ChartModule([{"Label": "Total_Wealth",
-                        "Color": "Black"},
-                        {"Label": "Total_Transactions",
-                        "Color": "Blue"}], 
-                    data_collector_name='datacollector')
-                
-model_params = {
-    "N": UserSettableParameter('slider', "Number of traders", 100, 1, 200),
-    "width": 10,
-    "height": 10
-}
-
-server = ModularServer(FinanceModel,
-                            [grid, chart],
-                            "Finance Model",
-                            model_params)
-
-server.port = 8521 # The default
-server.launch()
\ No newline at end of file
+
+if __name__ == "__main__":
+    from Server import launch
+    launch("ModifiedModel")
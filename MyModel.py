@@ -1,5 +1,8 @@
 from mesa import Agent
 from mesa.space import ContinuousSpace
+from SpatialHash import SpatialHash
+from TradeLog import INTERACT
+from RandomStreams import MOVE
 import numpy as np
 import random
 
@@ -10,39 +13,105 @@ class MyAgent(Agent):
 
     def move(self):
         # move randomşy in the space
-        x = self.pos + self.random.uniform(-1, 1)
-        y = self.pos + self.random.uniform(-1, 1)
-        self.model.space.move_agent(self, (x, y))
+        x = self.pos[0] + self.model.move_random.uniform(-1, 1)
+        y = self.pos[1] + self.model.move_random.uniform(-1, 1)
+        self.model.move_agent(self, (x, y))
 
-    def interact(self):
-        # find neigboring agents within a certain distance
-        neighbors = self.model.space.get_neighbors(self.pos, 1, include_center=False)
-        for neighbor in neighbors:
-            # calculate the distance between the two agents
-            distance = self.model.space.get_distance(self.pos, neighbor.pos)
-            if dist <= 1:
-                # do something
-                print ("Agent {} is interacting with agent {}".format(self.unique_id, neighbor.unique_id))
+    def interact(self, neighbor, distance):
+        # do something with a neighbor within the interaction radius
+        pass
 
-# create a model with a continuos space
+# Define an agent whose position is a row of the model's position array
+class BatchedAgent(MyAgent):
+    @property
+    def pos(self):
+        return tuple(self.model.positions[self.unique_id])
 
+    @pos.setter
+    def pos(self, pos):
+        if pos is not None:
+            self.model.positions[self.unique_id] = pos
+
+# create a model with a continuos space
+#
+# The positions of all agents live in one (N x 2) array of the model, row i
+# holding agent i, and the interacting pairs are found from that array. The
+# per-agent mode also places the agents in the space and moves them through
+# it. In batched mode the agents are not placed in the space: a step moves
+# every agent with one RNG call and one wraparound, and interactions are
+# handled as arrays of pairs, so the agents' own move and interact methods are
+# not called. In per-agent mode interact is only called on every pair when
+# agent_class overrides it.
 class MyModel:
-    def __init__(self):
-        self.space = ContinuousSpace(10, 10, torus=True)
-        self.agents = [MyAgent(i, self.get_random_pos(), self) for i in range(10)]
+    # Class of the agents of the per-agent mode
+    agent_class = MyAgent
+
+    def __init__(self, num_agents=10, width=10, height=10, radius=1, seed=None, batched=False, streams=None, trade_log=None):
+        self.space = ContinuousSpace(width, height, torus=True)
+        self.random = random.Random(seed)
+        self.rng = np.random.default_rng(seed)
+        self.move_random = self.random if streams is None else streams.stream(MOVE)
+        self.trade_log = trade_log
+        self.radius = radius
+        self.batched = batched
+        self.steps = 0
+        self.size = np.array([width, height], dtype=np.float64)
+        self.positions = self.rng.uniform(0, self.size, size=(num_agents, 2))
+        if batched:
+            self.agents = [BatchedAgent(i, None, self) for i in range(num_agents)]
+        else:
+            self.agents = [self.agent_class(i, tuple(pos), self) for i, pos in enumerate(self.positions.tolist())]
+            for agent in self.agents:
+                self.space.place_agent(agent, agent.pos)
+
+        # Spatial hash of the agents' positions, rebuilt once per step
+        self.index = SpatialHash(width, height, True, radius)
         self.running = True
 
+        # Pairs found in the last step, as arrays (i, j, distance) of agent indices
+        self.neighbor_pairs = None
+
     def step(self):
-        for agent in self.agents:
-            agent.move()
-            agent.interact()
-    
-    def get_random_pos(self):
-        x = np.random.uniform(0, self.space.width)
-        y = np.random.uniform(0, self.space.height)
-        return (x, y)
+        if self.batched:
+            self.move_all()
+        else:
+            for agent in self.agents:
+                agent.move()
+        self.interact()
+        self.steps += 1
+
+    # Move one agent in the space and in the position array
+    def move_agent(self, agent, pos):
+        self.space.move_agent(agent, pos)
+        self.positions[agent.unique_id] = agent.pos
+
+    # Move every agent by a uniform random offset in both directions, wrapping around the torus
+    def move_all(self):
+        positions = self.positions
+        positions += self.rng.uniform(-1, 1, size=positions.shape)
+        np.mod(positions, self.size, out=positions)
+        # A tiny negative coordinate can round up to the edge itself
+        positions[positions == self.size] = 0
+
+    # Let every pair of agents within the interaction radius interact, both ways
+    def interact(self):
+        # find neigboring agents within a certain distance, all at once
+        self.index.rebuild(self.positions)
+        i, j, distance = self.neighbor_pairs = self.index.pairs()
+
+        agents = self.agents
+        if not self.batched and self.agent_class.interact is not MyAgent.interact:
+            for a, b, d in zip(i.tolist(), j.tolist(), distance.tolist()):
+                agents[a].interact(agents[b], d)
+                agents[b].interact(agents[a], d)
+
+        if self.trade_log is not None:
+            ids = np.array([agent.unique_id for agent in agents], dtype=np.int64)
+            self.trade_log.record_many(self.steps, INTERACT, np.concatenate([ids[i], ids[j]]),
+                                       np.concatenate([ids[j], ids[i]]), 0, np.concatenate([distance, distance]))
 
 # create and run the model
-model = MyModel()
-while model.running:
-    model.step() 
\ No newline at end of file
+if __name__ == "__main__":
+    model = MyModel()
+    while model.running:
+        model.step()
@@ -0,0 +1,117 @@
+import numpy as np
+
+from mesa.space import MultiGrid
+
+# Tables already built, shared by every grid of the same shape
+_tables = {}
+
+# Define a precomputed neighborhood table in CSR layout
+#
+# The neighbors of cell x * height + y are indices[indptr[cell]:indptr[cell + 1]],
+# as flat cell ids sorted the way mesa's get_neighborhood sorts coordinates.
+# Lists of coordinate tuples for the Python hot paths are built from the table
+# the first time a cell is asked for, reusing one tuple per cell.
+class NeighborhoodTable:
+    # Build the table for every cell of the grid at once
+    def __init__(self, width, height, torus, moore, include_center=False, radius=1):
+        self.width = width
+        self.height = height
+
+        # Offsets within the radius, Moore or von Neumann
+        offsets = [(dx, dy) for dx in range(-radius, radius + 1) for dy in range(-radius, radius + 1)
+                   if (moore or abs(dx) + abs(dy) <= radius) and (include_center or dx or dy)]
+        offsets = np.array(offsets, dtype=np.int64).reshape(-1, 2)
+
+        # Neighbor ids of every cell, -1 where a neighbor falls off a bounded grid
+        x = np.repeat(np.arange(width), height)[:, None] + offsets[:, 0]
+        y = np.tile(np.arange(height), width)[:, None] + offsets[:, 1]
+        if torus:
+            x %= width
+            y %= height
+            neighbors = x * height + y
+        else:
+            neighbors = np.where((x >= 0) & (x < width) & (y >= 0) & (y < height), x * height + y, -1)
+
+        # Sort each row and drop repeats, which a small torus wraps onto the same cell
+        neighbors.sort(axis=1)
+        keep = neighbors >= 0
+        keep[:, 1:] &= neighbors[:, 1:] != neighbors[:, :-1]
+        self.indices = neighbors[keep].astype(np.int32)
+        self.indptr = np.zeros(width * height + 1, dtype=np.int32)
+        np.cumsum(keep.sum(axis=1), out=self.indptr[1:])
+
+        self.coordinates = [None] * (width * height)
+        self.cells = None
+
+    # Get the neighbors of a cell as a list of coordinate tuples
+    def neighborhood(self, cell):
+        coordinates = self.coordinates[cell]
+        if coordinates is None:
+            if self.cells is None:
+                self.cells = [divmod(i, self.height) for i in range(self.width * self.height)]
+            cells = self.cells
+            coordinates = [cells[i] for i in self.indices[self.indptr[cell]:self.indptr[cell + 1]].tolist()]
+            self.coordinates[cell] = coordinates
+        return coordinates
+
+# Get the shared table for a grid shape, building it the first time
+def neighborhood_table(width, height, torus, moore, include_center=False, radius=1):
+    key = (width, height, torus, moore, include_center, radius)
+    table = _tables.get(key)
+    if table is None:
+        table = NeighborhoodTable(width, height, torus, moore, include_center, radius)
+        _tables[key] = table
+    return table
+
+# Define a MultiGrid that answers neighborhood queries from precomputed tables
+class TableMultiGrid(MultiGrid):
+    # Define the grid's initial state
+    def __init__(self, width, height, torus):
+        super().__init__(width, height, torus)
+        self.tables = {}
+
+    def get_neighborhood(self, pos, moore, include_center=False, radius=1):
+        key = (moore, include_center, radius)
+        table = self.tables.get(key)
+        if table is None:
+            table = neighborhood_table(self.width, self.height, self.torus, moore, include_center, radius)
+            self.tables[key] = table
+        x, y = pos
+        return table.neighborhood(x * self.height + y)
+
+    def iter_neighbors(self, pos, moore, include_center=False, radius=1):
+        grid = self.grid
+        for x, y in self.get_neighborhood(pos, moore, include_center, radius):
+            yield from grid[x][y]
+
+    def get_neighbors(self, pos, moore, include_center=False, radius=1):
+        grid = self.grid
+        return [agent for x, y in self.get_neighborhood(pos, moore, include_center, radius) for agent in grid[x][y]]
+
+    # Remove an agent from its cell without building the empty list is_cell_empty compares against
+    def _remove_agent(self, pos, agent):
+        x, y = pos
+        cell = self.grid[x][y]
+        cell.remove(agent)
+        if not cell:
+            self.empties.add(pos)
+
+    # Gather the agents around pos whose attribute is at least minimum into a reused buffer and get their count
+    #
+    # The buffer only grows, so after the first few calls no list is allocated;
+    # entries past the count are left over from earlier calls. The agents come
+    # in the order get_neighbors gives them.
+    def neighbors_at_least(self, pos, moore, name, minimum, buffer, include_center=False, radius=1):
+        grid = self.grid
+        count = 0
+        size = len(buffer)
+        for x, y in self.get_neighborhood(pos, moore, include_center, radius):
+            for agent in grid[x][y]:
+                if getattr(agent, name) >= minimum:
+                    if count < size:
+                        buffer[count] = agent
+                    else:
+                        buffer.append(agent)
+                        size += 1
+                    count += 1
+        return count
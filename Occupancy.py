@@ -0,0 +1,65 @@
+import itertools
+
+from Neighborhood import TableMultiGrid
+
+# Define a grid that keeps an index of its empty cells
+#
+# The empty cells are kept in a list, so a random empty cell is a single
+# rng.choice, together with each cell's position in that list, so that a cell
+# that fills up is swap-removed in O(1). The index is updated from
+# _place_agent and _remove_agent, which every place, move and remove on the
+# grid goes through.
+class IndexedMultiGrid(TableMultiGrid):
+    # Define the grid's initial state
+    def __init__(self, width, height, torus):
+        super().__init__(width, height, torus)
+        self.free_cells = list(itertools.product(range(width), range(height)))
+        self.free_index = list(range(width * height))
+
+    def _place_agent(self, pos, agent):
+        super()._place_agent(pos, agent)
+
+        # Swap the cell out of the free list if it was empty
+        x, y = pos
+        cell = x * self.height + y
+        i = self.free_index[cell]
+        if i >= 0:
+            last = self.free_cells.pop()
+            if i < len(self.free_cells):
+                self.free_cells[i] = last
+                self.free_index[last[0] * self.height + last[1]] = i
+            self.free_index[cell] = -1
+
+    def _remove_agent(self, pos, agent):
+        super()._remove_agent(pos, agent)
+
+        # Put the cell back in the free list once it is empty
+        x, y = pos
+        if not self.grid[x][y]:
+            self.free_index[x * self.height + y] = len(self.free_cells)
+            self.free_cells.append((x, y))
+
+    # Get the number of empty cells
+    def count_empty_cells(self):
+        return len(self.free_cells)
+
+    # Pick a random empty cell, or None if the grid is full
+    def random_empty_cell(self, rng):
+        if not self.free_cells:
+            return None
+        return rng.choice(self.free_cells)
+
+    # Pick k distinct empty cells, in linear time however full the grid is
+    def sample_empty_cells(self, k, rng):
+        if k > len(self.free_cells):
+            raise ValueError("cannot pick %d empty cells: the %d x %d grid holds %d cells and %d of them are empty"
+                             % (k, self.width, self.height, self.width * self.height, len(self.free_cells)))
+        return rng.sample(self.free_cells, k)
+
+    # Pick a random empty cell in the neighborhood of pos, or None if there is none
+    def random_empty_neighbor(self, pos, moore, rng, radius=1):
+        grid = self.grid
+        cells = [cell for cell in self.get_neighborhood(pos, moore, False, radius) if not grid[cell[0]][cell[1]]]
+        if not cells:
+            return None
+        return rng.choice(cells)
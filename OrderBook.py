@@ -0,0 +1,96 @@
+import heapq
+import itertools
+
+# Order sides
+BUY = 0
+SELL = 1
+
+# Define a limit order book with price-time priority
+#
+# Orders are collected during a step and matched in one call to clear(). Bids
+# and asks are kept in binary heaps keyed on (price, arrival), so adding an
+# order and taking the best order off the book are both O(log n). A trade is
+# done at the price of whichever of the two orders arrived first. A trader
+# never trades with itself: when its own bid and ask cross, the one that
+# arrived later is cancelled.
+class OrderBook:
+    # Define the book's initial state
+    def __init__(self):
+        self.bids = []
+        self.asks = []
+        self.sequence = itertools.count()
+        self.clearing_price = None
+        self.volume = 0
+        self.cancelled = 0
+
+    # Add a limit order to the book
+    def submit(self, trader_id, side, quantity, price):
+        if quantity <= 0:
+            return
+        seq = next(self.sequence)
+        if side == BUY:
+            heapq.heappush(self.bids, [-price, seq, trader_id, quantity])
+        else:
+            heapq.heappush(self.asks, [price, seq, trader_id, quantity])
+
+    # Add many limit orders at once, heapifying the book in linear time
+    def submit_many(self, trader_ids, sides, quantities, prices):
+        for trader_id, side, quantity, price in zip(trader_ids, sides, quantities, prices):
+            if quantity <= 0:
+                continue
+            seq = next(self.sequence)
+            if side == BUY:
+                self.bids.append([-price, seq, trader_id, quantity])
+            else:
+                self.asks.append([price, seq, trader_id, quantity])
+        heapq.heapify(self.bids)
+        heapq.heapify(self.asks)
+
+    # Get the number of orders waiting in the book
+    def __len__(self):
+        return len(self.bids) + len(self.asks)
+
+    # Match crossing orders and return the fills as (buyer, seller, quantity, price)
+    def clear(self, keep_unmatched=False):
+        fills = []
+        volume = 0
+        turnover = 0.0
+        cancelled = 0
+        bids = self.bids
+        asks = self.asks
+
+        while bids and asks and -bids[0][0] >= asks[0][0]:
+            bid = bids[0]
+            ask = asks[0]
+
+            # Cancel the newer of two crossing orders of the same trader instead of filling it
+            if bid[2] == ask[2]:
+                heapq.heappop(bids if bid[1] > ask[1] else asks)
+                cancelled += 1
+                continue
+
+            # Trade at the price of the order that arrived first
+            price = -bid[0] if bid[1] < ask[1] else ask[0]
+            quantity = min(bid[3], ask[3])
+            fills.append((bid[2], ask[2], quantity, price))
+            volume += quantity
+            turnover += quantity * price
+
+            # Partially filled orders keep their place in the book
+            bid[3] -= quantity
+            ask[3] -= quantity
+            if bid[3] == 0:
+                heapq.heappop(bids)
+            if ask[3] == 0:
+                heapq.heappop(asks)
+
+        # Report the volume weighted clearing price of this batch and the self-trades cancelled
+        self.volume = volume
+        self.cancelled = cancelled
+        self.clearing_price = turnover / volume if volume else None
+
+        # Orders are only good for one batch unless asked otherwise
+        if not keep_unmatched:
+            self.bids = []
+            self.asks = []
+        return fills
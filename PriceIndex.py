@@ -0,0 +1,64 @@
+import bisect
+
+# Define an index of agents sorted by price
+#
+# Agents are kept in a list sorted by (price, unique_id), next to a plain list
+# of their prices, so counting the agents priced below or above a level is a
+# bisect and drawing one of them uniformly is a single randrange: both are
+# O(log N). Adding, removing and repricing an agent shifts the lists, which is
+# a memmove rather than a Python loop.
+class PriceIndex:
+    # Define the index's initial state
+    def __init__(self, agents=()):
+        agents = sorted(agents, key=lambda a: (a.price, a.unique_id))
+        self.agents = agents
+        self.prices = [a.price for a in agents]
+        self.keys = [(a.price, a.unique_id) for a in agents]
+
+    # Get the number of indexed agents
+    def __len__(self):
+        return len(self.agents)
+
+    # Add an agent at its current price
+    def add(self, agent):
+        key = (agent.price, agent.unique_id)
+        i = bisect.bisect_left(self.keys, key)
+        self.keys.insert(i, key)
+        self.prices.insert(i, agent.price)
+        self.agents.insert(i, agent)
+
+    # Remove an agent; it must still have the price it was indexed at
+    def remove(self, agent):
+        i = bisect.bisect_left(self.keys, (agent.price, agent.unique_id))
+        del self.keys[i]
+        del self.prices[i]
+        del self.agents[i]
+
+    # Change an agent's price and move it to its new place in the index
+    def update(self, agent, price):
+        self.remove(agent)
+        agent.price = price
+        self.add(agent)
+
+    # Count the agents priced strictly below the given price
+    def count_below(self, price):
+        return bisect.bisect_left(self.prices, price)
+
+    # Count the agents priced strictly above the given price
+    def count_above(self, price):
+        return len(self.prices) - bisect.bisect_right(self.prices, price)
+
+    # Pick a random agent priced strictly below the given price, or None
+    def sample_below(self, price, rng):
+        n = bisect.bisect_left(self.prices, price)
+        if n == 0:
+            return None
+        return self.agents[rng.randrange(n)]
+
+    # Pick a random agent priced strictly above the given price, or None
+    def sample_above(self, price, rng):
+        start = bisect.bisect_right(self.prices, price)
+        n = len(self.prices) - start
+        if n == 0:
+            return None
+        return self.agents[start + rng.randrange(n)]
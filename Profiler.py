@@ -0,0 +1,162 @@
+import json
+import time
+
+# Number of histogram buckets; bucket k counts calls that took [2^(k-1), 2^k) ns
+NUM_BUCKETS = 64
+
+# Define an opt-in profiler of model steps
+#
+# attach() replaces the model's step, each phase the model lists in
+# profile_phases and each agent method it lists in profile_agent_methods with
+# a timed wrapper, and detach() puts the originals back, so a model that is
+# not profiled runs exactly the code it always did. Phases are methods of the
+# model, or of one of its attributes with a dotted name ("schedule.step").
+# Agents keep their fields in slots, so agent methods are wrapped on the agent
+# classes instead, once however many models are attached; the wrappers only
+# time the agents of attached models and call the plain method for any other.
+# Use the profiler in a with block, or call detach() once the run is over, so
+# that the classes get their methods back.
+#
+# Every call is recorded under its call stack, e.g. "TraderModel.step;
+# schedule.step;Trader.step;Trader.move", with its count, total and
+# exclusive time in integer nanoseconds and a log2 histogram of durations.
+class Profiler:
+    # Define the profiler's initial state
+    def __init__(self):
+        self.stats = {}
+        self.stack = []
+        self.patched = []
+        self.models = {}
+
+    # Wrap a function so that every call is timed under the current call stack
+    def timed(self, name, function):
+        stats = self.stats
+        stack = self.stack
+        clock = time.perf_counter_ns
+
+        def timed_function(*args, **kwargs):
+            frame = [stack[-1][0] + (name,) if stack else (name,), 0]
+            stack.append(frame)
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                stack.pop()
+                if stack:
+                    stack[-1][1] += elapsed
+                record = stats.get(frame[0])
+                if record is None:
+                    record = stats[frame[0]] = [0, 0, 0, [0] * NUM_BUCKETS]
+                record[0] += 1
+                record[1] += elapsed
+                record[2] += elapsed - frame[1]
+                record[3][min(elapsed.bit_length(), NUM_BUCKETS - 1)] += 1
+        return timed_function
+
+    # Time a method of one object by shadowing it with an instance attribute
+    def patch_object(self, obj, attribute, name):
+        setattr(obj, attribute, self.timed(name, getattr(obj, attribute)))
+        self.patched.append((obj, attribute, None))
+
+    # Time a method of the instances of a class that belong to an attached model
+    def patch_class(self, cls, attribute, name):
+        if any(owner is cls and patched == attribute for owner, patched, _ in self.patched):
+            return
+        original = cls.__dict__.get(attribute)
+        function = getattr(cls, attribute)
+        timed_function = self.timed(name, function)
+        models = self.models
+
+        def agent_method(agent, *args, **kwargs):
+            if id(agent.model) in models:
+                return timed_function(agent, *args, **kwargs)
+            return function(agent, *args, **kwargs)
+        setattr(cls, attribute, agent_method)
+        self.patched.append((cls, attribute, original))
+
+    # Instrument a model's step, phases and agent methods
+    def attach(self, model):
+        self.models[id(model)] = model
+        self.patch_object(model, "step", type(model).__name__ + ".step")
+        for phase in getattr(model, "profile_phases", ()):
+            owner = model
+            *path, attribute = phase.split(".")
+            for part in path:
+                owner = getattr(owner, part)
+            self.patch_object(owner, attribute, phase)
+
+        agent_classes = {type(agent) for agent in model.schedule.agents}
+        for cls in sorted(agent_classes, key=lambda c: c.__name__):
+            for method in getattr(model, "profile_agent_methods", ()):
+                if hasattr(cls, method):
+                    self.patch_class(cls, method, cls.__name__ + "." + method)
+        return model
+
+    # Remove every wrapper, newest first
+    def detach(self):
+        for owner, attribute, original in reversed(self.patched):
+            if isinstance(owner, type) and original is not None:
+                setattr(owner, attribute, original)
+            else:
+                delattr(owner, attribute)
+        self.patched = []
+        self.models.clear()
+
+    # Use the profiler in a with block, detaching at its end
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.detach()
+
+    # Forget everything recorded so far
+    def reset(self):
+        self.stats.clear()
+
+    # Get the recorded stacks as a list of dicts, times in seconds
+    def summary(self):
+        rows = []
+        for stack, (count, total, exclusive, histogram) in sorted(self.stats.items()):
+            rows.append({
+                "stack": ";".join(stack),
+                "count": count,
+                "total_s": total / 1e9,
+                "self_s": exclusive / 1e9,
+                "mean_us": total / count / 1e3,
+                "p50_us": histogram_quantile(histogram, 0.5) / 1e3,
+                "p99_us": histogram_quantile(histogram, 0.99) / 1e3,
+                "histogram_ns": {str(1 << k): n for k, n in enumerate(histogram) if n},
+            })
+        return rows
+
+    # Write the summary as JSON
+    def to_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=1)
+
+    # Write the exclusive times in microseconds as collapsed stacks, the input of flamegraph.pl and speedscope
+    def write_collapsed(self, path):
+        with open(path, "w") as f:
+            for stack, record in sorted(self.stats.items()):
+                f.write("%s %d\n" % (";".join(stack), record[2] // 1000))
+
+    # Format the summary as a table
+    def report(self):
+        lines = ["%-60s %10s %10s %10s %10s %10s" % ("stack", "count", "total s", "self s", "mean us", "p99 us")]
+        for row in self.summary():
+            depth = row["stack"].count(";")
+            name = "  " * depth + row["stack"].rsplit(";", 1)[-1]
+            lines.append("%-60s %10d %10.3f %10.3f %10.2f %10.1f" % (name, row["count"], row["total_s"],
+                                                                    row["self_s"], row["mean_us"], row["p99_us"]))
+        return "\n".join(lines)
+
+# Get the upper bound in ns of the bucket that holds the given quantile of a histogram
+def histogram_quantile(histogram, quantile):
+    target = quantile * sum(histogram)
+    seen = 0
+    for k, n in enumerate(histogram):
+        seen += n
+        if n and seen >= target:
+            return 1 << k
+    return 0
@@ -0,0 +1,103 @@
+import numpy as np
+
+# Stream ids of the draws the models take from a RandomStreams
+MOVE = 0
+
+# Random doubles a BufferedStream draws at a time
+BUFFER_SIZE = 4096
+
+# Define a source of independent, reproducible random streams
+#
+# Every stream is a Philox generator, which is counter based: its output is a
+# function of a key and a counter only, with no state carried from one draw to
+# the next. The key of a stream is hashed from the seed and the stream's ids,
+# such as (MOVE,) for a model's moves, an agent's unique id or (step, tile),
+# so the same ids always give the same stream, whichever process asks for it,
+# in whatever order and however many other streams were made. A run that
+# splits its work over any number of workers thus draws the same numbers as a
+# run on one, as long as each piece of work takes the stream of its own ids.
+class RandomStreams:
+    # Define the streams' initial state
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        self.seed = seed
+
+    # Get the Philox key of the stream with the given integer ids
+    def key(self, *ids):
+        return np.random.SeedSequence([self.seed, *ids]).generate_state(2, dtype=np.uint64)
+
+    # Get the stream with the given ids as a NumPy generator, for drawing arrays
+    def generator(self, *ids):
+        return np.random.Generator(np.random.Philox(key=self.key(*ids)))
+
+    # Get the stream with the given ids as a BufferedStream, for drawing one number at a time
+    def stream(self, *ids, size=BUFFER_SIZE):
+        return BufferedStream(self.generator(*ids), size)
+
+# Define a stream that serves single draws from a prefilled buffer
+#
+# The generator fills the buffer with size doubles in one call, and each draw
+# pops one off the end of it, so a draw costs a list pop instead of a call into
+# the generator. It has the methods of random.Random that the models use, so
+# it can stand in wherever they take a random module or random.Random.
+# Integers are drawn by scaling a double, which is biased by at most n / 2**53
+# for a range of n numbers.
+class BufferedStream:
+    # Define the stream's initial state
+    def __init__(self, generator, size=BUFFER_SIZE):
+        self.generator = generator
+        self.size = size
+        self.buffer = []
+
+    # Refill the buffer and pop its first draw
+    def refill(self):
+        self.buffer = self.generator.random(self.size).tolist()
+        return self.buffer.pop()
+
+    # Get a random double in [0, 1)
+    def random(self):
+        try:
+            return self.buffer.pop()
+        except IndexError:
+            return self.refill()
+
+    # Get a random double between a and b
+    def uniform(self, a, b):
+        try:
+            u = self.buffer.pop()
+        except IndexError:
+            u = self.refill()
+        return a + (b - a) * u
+
+    # Get a random integer in range(start, stop), or range(start) without stop
+    def randrange(self, start, stop=None):
+        try:
+            u = self.buffer.pop()
+        except IndexError:
+            u = self.refill()
+        if stop is None:
+            return int(u * start)
+        return start + int(u * (stop - start))
+
+    # Get a random integer between a and b, both included
+    def randint(self, a, b):
+        return self.randrange(a, b + 1)
+
+    # Get a random element of a non-empty sequence
+    def choice(self, seq):
+        try:
+            u = self.buffer.pop()
+        except IndexError:
+            u = self.refill()
+        return seq[int(u * len(seq))]
+
+    # Shuffle a list in place
+    def shuffle(self, x):
+        for i in range(len(x) - 1, 0, -1):
+            j = int(self.random() * (i + 1))
+            x[i], x[j] = x[j], x[i]
+
+    # Get k distinct elements of a sequence
+    def sample(self, population, k):
+        return [population[i] for i in self.generator.choice(len(population), k, replace=False).tolist()]
@@ -0,0 +1,191 @@
+# Launch the browser visualization of a model
+#
+#   python Server.py AgentModel --port 8521
+#
+# The model modules only hold the simulation, so they import quickly in batch
+# workers. Everything that needs mesa.visualization lives here, and even this
+# module only imports it when a server is built.
+import argparse
+
+# Define the server of AgentModel
+def agent_model_server():
+    from mesa.visualization.ModularVisualization import ModularServer
+    from mesa.visualization.UserParam import UserSettableParameter
+    from mesa.visualization.modules import CanvasGrid, ChartModule
+    from AgentModel import TraderModel, trader_portrayal
+
+    # Define a canvas grid for visualizing the trader agents
+    canvas_element = CanvasGrid(trader_portrayal, 10, 10, 500, 500)
+
+    # Define a chart module for visualizing the asset price
+    chart = ChartModule([{"Label": "Average Cash", "Color": "Green"},
+                         {"Label": "Average Inventory", "Color": "Black"}],
+                         data_collector_name='datacollector')
+
+    model_params = {
+        "width": 10,
+        "height": 10,
+        "num_traders": UserSettableParameter('slider', 'Number of Traders', 10, 2, 20, 1),
+        "initial_price": UserSettableParameter('slider', 'Initial Price', 100, 50, 150, 1),
+        "cash_per_trader": UserSettableParameter('slider', 'Initial Cash', 1000, 500, 2000, 50),
+        "inventory_per_trader": UserSettableParameter('slider', 'Initial Inventory', 10, 5, 20, 1),
+        "strategy": UserSettableParameter('choice', 'Trading Strategy', value='Random',
+                                           choices=['Random', 'Buy Low, Sell High', 'Momentum'])
+    }
+    return ModularServer(TraderModel, [canvas_element, chart], "Trader Model", model_params)
+
+# Define the server of SimpleModel
+def simple_model_server():
+    from mesa.visualization.ModularVisualization import ModularServer
+    from mesa.visualization.UserParam import UserSettableParameter
+    from mesa.visualization.modules import CanvasGrid
+    from SimpleModel import TraderModel, agentPortrayal
+
+    # Define a canvas grid for visualizing the trader agents
+    canvas = CanvasGrid(agentPortrayal, 10, 10, 500, 500)
+
+    model_params = {
+        "width": 10,
+        "height": 10,
+        "num_traders": UserSettableParameter('slider', 'Number of Traders', 10, 2, 20, 1),
+        "initial_price": UserSettableParameter('slider', 'Initial Price', 100, 50, 150, 1),
+        "initial_inventory": UserSettableParameter('slider', 'Initial Inventory', 10, 5, 20, 1),
+        "cash_per_trader": UserSettableParameter('slider', 'Initial Cash', 1000, 500, 2000, 50),
+        "inventory_per_trader": UserSettableParameter('slider', 'Initial Inventory', 10, 5, 20, 1),
+    }
+    return ModularServer(TraderModel, [canvas], "Trader Model", model_params)
+
+# Define the server of FinanceModel
+def finance_model_server():
+    from mesa.visualization.ModularVisualization import ModularServer
+    from mesa.visualization.UserParam import UserSettableParameter
+    from mesa.visualization.modules import CanvasGrid, ChartModule
+    from FinanceModel import FinanceModel, agent_portrayal
+
+    grid = CanvasGrid(agent_portrayal, 10, 10, 500, 500)
+
+    chart = ChartModule([{"Label": "Total_Wealth",
+                            "Color": "Black"}],
+                        data_collector_name='datacollector')
+
+    model_params = {
+        "N": UserSettableParameter('slider', "Number of traders", 100, 1, 200),
+        "width": 10,
+        "height": 10
+    }
+    return ModularServer(FinanceModel, [grid, chart], "Finance Model", model_params)
+
+# Define the server of FreshModel
+def fresh_model_server():
+    from mesa.visualization.ModularVisualization import ModularServer
+    from mesa.visualization.UserParam import UserSettableParameter
+    from mesa.visualization.modules import CanvasGrid, ChartModule
+    from FreshModel import FinanceModel, agent_portrayal
+
+    grid = CanvasGrid(agent_portrayal, 10, 10, 500, 500)
+
+    chart = ChartModule([{"Label": "Total_Wealth",
+                            "Color": "Black"},
+                            {"Label": "Total_Transactions",
+                            "Color": "Blue"}],
+                        data_collector_name='datacollector')
+
+    model_params = {
+        "N": UserSettableParameter('slider', "Number of traders", 100, 1, 200),
+        "width": 10,
+        "height": 10,
+        "starting_wealth": UserSettableParameter('slider', "Starting wealth", 100, 1, 1000),
+        "starting_price": UserSettableParameter('slider', "Starting price", 1, 1, 10)
+    }
+    return ModularServer(FinanceModel, [grid, chart], "Finance Model", model_params)
+
+# Define the server of ModifiedModel
+def modified_model_server():
+    from mesa.visualization.ModularVisualization import ModularServer
+    from mesa.visualization.UserParam import UserSettableParameter
+    from mesa.visualization.modules import CanvasGrid, ChartModule
+    from ModifiedModel import FinanceModel, agent_portrayal
+
+    grid = CanvasGrid(agent_portrayal, 10, 10, 500, 500)
+
+    chart = ChartModule([{"Label": "Total_Wealth",
+                            "Color": "Black"},
+                            {"Label": "Total_Transactions",
+                            "Color": "Blue"}],
+                        data_collector_name='datacollector')
+
+    model_params = {
+        "N": UserSettableParameter('slider', "Number of traders", 100, 1, 200),
+        "width": 10,
+        "height": 10
+    }
+    return ModularServer(FinanceModel, [grid, chart], "Finance Model", model_params)
+
+# Define the server of FinanceTraderModel
+def finance_trader_model_server():
+    from mesa.visualization.ModularVisualization import ModularServer
+    from mesa.visualization.UserParam import UserSettableParameter
+    from mesa.visualization.modules import CanvasGrid, ChartModule, TextElement
+    from FinanceTraderModel import FinanceTraderModel, trader_portrayal
+
+    class MarketPriceChart(ChartModule):
+        series = [{"Label": "MarketPrice", "Color": "Black"}]
+
+    class MarketVolumeChart(ChartModule):
+        series = [{"Label": "MarketVolume", "Color": "Red"}]
+
+    class WealthDistributionText(TextElement):
+        def render(self, model):
+            return "Average Wealth: {:.2f}".format(model.total_wealth / model.num_traders)
+
+    trader_canvas = CanvasGrid(trader_portrayal, 10, 10, 500, 500)
+
+    model_params = {"num_traders": UserSettableParameter("slider", "Number of Traders", 20, 1, 100, 1),
+                    "initial_market_price": UserSettableParameter("slider", "Initial Market Price", 10, 1, 100, 1),
+                    "initial_market_volume": UserSettableParameter("slider", "Initial Market Volume", 100, 1, 1000, 1)}
+    return ModularServer(FinanceTraderModel,
+                         [trader_canvas, MarketPriceChart, MarketVolumeChart, WealthDistributionText],
+                         "Finance Trader Model",
+                         model_params)
+
+# Define the server of Investors
+def investors_server():
+    from mesa.visualization.ModularVisualization import ModularServer
+    from mesa.visualization.modules import ChartModule
+    from Investors import StockMarket
+
+    # The market has no grid, so only its series are charted
+    price = ChartModule([{"Label": "Stock Price",
+                          "Color": "black"}],
+                        data_collector_name="datacollector")
+    volume = ChartModule([{"Label": "Volume",
+                           "Color": "blue"}],
+                         data_collector_name="datacollector")
+    return ModularServer(StockMarket, [price, volume], "Stock Market Model",
+                         {"num_investors": 1000, "num_firms": 20})
+
+SERVERS = {
+    "AgentModel": agent_model_server,
+    "SimpleModel": simple_model_server,
+    "FinanceModel": finance_model_server,
+    "FreshModel": fresh_model_server,
+    "ModifiedModel": modified_model_server,
+    "FinanceTraderModel": finance_trader_model_server,
+    "Investors": investors_server,
+}
+
+# Build the server of the named model module and launch it
+def launch(name, port=8521):
+    server = SERVERS[name]()
+    server.port = port
+    server.launch()
+
+def main():
+    parser = argparse.ArgumentParser(description="Launch the visualization server of a model")
+    parser.add_argument("model", choices=sorted(SERVERS))
+    parser.add_argument("--port", type=int, default=8521)
+    args = parser.parse_args()
+    launch(args.model, args.port)
+
+if __name__ == "__main__":
+    main()
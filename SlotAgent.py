@@ -0,0 +1,28 @@
+# Define an agent base class without a per-instance __dict__
+#
+# It has what mesa's Agent has (unique_id, model, pos, step, advance and the
+# random property), which is all that mesa's schedulers and spaces use, but
+# keeps its attributes in __slots__. A subclass that lists its own fields in
+# __slots__ carries no __dict__ at all: each agent is a single fixed-size
+# object with its fields at fixed offsets, rather than an object plus a
+# separately allocated table of values. Assigning an attribute that is not a
+# slot raises AttributeError, so every field must be declared.
+class SlotAgent:
+    __slots__ = ("unique_id", "model", "pos")
+
+    # Define the agent's initial state
+    def __init__(self, unique_id, model):
+        self.unique_id = unique_id
+        self.model = model
+        self.pos = None
+
+    # Define the agent's behavior at each step
+    def step(self):
+        pass
+
+    def advance(self):
+        pass
+
+    @property
+    def random(self):
+        return self.model.random
@@ -0,0 +1,114 @@
+import numpy as np
+
+# Define a uniform-grid spatial hash of points in a continuous space
+#
+# The space is cut into square-ish cells at least radius wide, and the points
+# are sorted by cell, so the points of a cell are one slice of the sorted
+# order. All pairs of points within radius of each other can then only lie in
+# the same or in adjacent cells: pairs() checks those 3 x 3 cells for every
+# point at once, one cell offset at a time, with distances taken across the
+# edges on a torus. Each pair of cells is visited once, which halves the
+# candidate pairs. A rebuild is a sort of the points by cell, O(N log N), and
+# the query is linear in the number of candidate pairs, instead of the O(N^2)
+# of asking the space for the neighbors of every agent in turn.
+class SpatialHash:
+    # Define the hash's initial state
+    def __init__(self, width, height, torus, radius):
+        self.width = width
+        self.height = height
+        self.torus = torus
+        self.radius = radius
+        self.num_x = max(1, int(width // radius))
+        self.num_y = max(1, int(height // radius))
+        self.cell_width = width / self.num_x
+        self.cell_height = height / self.num_y
+        self.points = np.empty((0, 2))
+        self.cell_x = np.empty(0, dtype=np.int64)
+        self.cell_y = np.empty(0, dtype=np.int64)
+        self.order = np.empty(0, dtype=np.int64)
+        self.starts = np.zeros(self.num_x * self.num_y, dtype=np.int64)
+        self.counts = np.zeros(self.num_x * self.num_y, dtype=np.int64)
+
+    # Get the number of hashed points
+    def __len__(self):
+        return len(self.points)
+
+    # Hash the given (N x 2) array of points, replacing the previous ones
+    def rebuild(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        self.points = points
+        self.cell_x = np.minimum((points[:, 0] / self.cell_width).astype(np.int64), self.num_x - 1)
+        self.cell_y = np.minimum((points[:, 1] / self.cell_height).astype(np.int64), self.num_y - 1)
+        cells = self.cell_x * self.num_y + self.cell_y
+        self.order = np.argsort(cells, kind="stable")
+        self.counts = np.bincount(cells, minlength=self.num_x * self.num_y)
+        self.starts = np.cumsum(self.counts) - self.counts
+
+    # Get the cell offsets to pair each cell with. Every pair of cells is visited once: the cell
+    # itself plus the four cells after it. On a torus less than three cells wide, offsets of -1
+    # and +1 land in the same cell, so the full 3 x 3 stencil is used and pairs are deduplicated.
+    def cell_offsets(self):
+        if self.torus and (self.num_x < 3 or self.num_y < 3):
+            xs = sorted({-1 % self.num_x, 0, 1 % self.num_x})
+            ys = sorted({-1 % self.num_y, 0, 1 % self.num_y})
+            return [(dx, dy) for dx in xs for dy in ys], True
+        return [(0, 0), (0, 1), (1, -1), (1, 0), (1, 1)], False
+
+    # Get every pair of points within radius of each other as arrays (i, j, distance), i < j.
+    # Coincident points only count with include_center, as in ContinuousSpace.
+    def pairs(self, include_center=False):
+        n = len(self.points)
+        order = self.order
+        # Work on the points in cell order, so a cell's points are next to each other in memory
+        xs = self.points[order, 0]
+        ys = self.points[order, 1]
+        cell_x = self.cell_x[order]
+        cell_y = self.cell_y[order]
+        index = np.arange(n)
+        offsets, full = self.cell_offsets()
+        found_i, found_j, found_d = [], [], []
+
+        for dx, dy in offsets:
+            target_x = cell_x + dx
+            target_y = cell_y + dy
+            if self.torus:
+                target_x %= self.num_x
+                target_y %= self.num_y
+                target = target_x * self.num_y + target_y
+                counts = self.counts[target]
+            else:
+                inside = (target_x >= 0) & (target_x < self.num_x) & (target_y >= 0) & (target_y < self.num_y)
+                target = np.where(inside, target_x * self.num_y + target_y, 0)
+                counts = np.where(inside, self.counts[target], 0)
+            starts = self.starts[target]
+
+            # Pair every point with every point of its target cell, as positions in cell order
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            i = np.repeat(index, counts)
+            j = np.arange(total) + np.repeat(starts - (np.cumsum(counts) - counts), counts)
+            if full or (dx, dy) == (0, 0):
+                keep = i < j
+                i = i[keep]
+                j = j[keep]
+
+            delta_x = np.abs(xs[i] - xs[j])
+            delta_y = np.abs(ys[i] - ys[j])
+            if self.torus:
+                np.minimum(delta_x, self.width - delta_x, out=delta_x)
+                np.minimum(delta_y, self.height - delta_y, out=delta_y)
+            squared = delta_x * delta_x + delta_y * delta_y
+            close = squared <= self.radius ** 2
+            if not include_center:
+                close &= squared > 0
+            found_i.append(i[close])
+            found_j.append(j[close])
+            found_d.append(np.sqrt(squared[close]))
+
+        if not found_i:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+        # Map back to the original point indices, smaller index first
+        i = order[np.concatenate(found_i)]
+        j = order[np.concatenate(found_j)]
+        return np.minimum(i, j), np.maximum(i, j), np.concatenate(found_d)
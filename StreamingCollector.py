@@ -0,0 +1,208 @@
+import glob
+import os
+import queue
+import threading
+import time
+from collections import deque
+from operator import attrgetter
+
+import numpy as np
+
+# Backpressure policies: wait for the writer, or record fewer steps
+BLOCK = "block"
+DOWNSAMPLE = "downsample"
+
+# Define a collector that streams its rows to disk instead of keeping them
+#
+# It takes the same reporters as ArrayCollector. Every collect() appends one
+# model row, and one agent row per agent, to the current chunk; once a chunk
+# holds chunk_steps steps it is handed through a queue of at most max_chunks
+# chunks to a writer thread, which compresses it into one .npz file, so the
+# simulation keeps stepping while the disk is written. Agent rows are stored
+# long, as (Step, AgentID) columns plus one column per reporter, like mesa's
+# agent dataframe; read_stream() reads a directory of chunks back.
+#
+# Memory is bounded by the current chunk and the queue, however long the run.
+# When the writer falls behind and the queue is full, the BLOCK policy makes
+# collect() wait until there is room. The DOWNSAMPLE policy waits too, but
+# also doubles the stride, so that only every stride-th collect() records a
+# row; the stride halves again each time a chunk finds the queue empty. The
+# steps of the recorded rows show where rows were left out. model_vars keeps
+# the last window values of each model reporter, for ChartModule.
+class StreamingCollector:
+    # Define the collector's initial state
+    def __init__(self, path, model_reporters=None, agent_reporters=None, chunk_steps=256, max_chunks=4,
+                 policy=BLOCK, window=1000):
+        if policy not in (BLOCK, DOWNSAMPLE):
+            raise ValueError("Unknown backpressure policy %r" % (policy,))
+        self.path = path
+        self.chunk_steps = chunk_steps
+        self.max_chunks = max_chunks
+        self.policy = policy
+        self.window = window
+        self.model_reporters = {}
+        self.model_vars = {}
+        self.agent_reporters = {}
+
+        for name, reporter in (model_reporters or {}).items():
+            if isinstance(reporter, str):
+                reporter = attrgetter(reporter)
+            self.model_reporters[name] = reporter
+            self.model_vars[name] = deque(maxlen=window)
+
+        for name, reporter in (agent_reporters or {}).items():
+            if isinstance(reporter, str):
+                reporter = attrgetter(reporter)
+            self.agent_reporters[name] = reporter
+
+        # Counters: collect() calls, chunks handed to the writer, and time spent waiting for it
+        self.calls = 0
+        self.num_chunks = 0
+        self.stride = 1
+        self.blocked = 0
+        self.wait_seconds = 0.0
+
+        os.makedirs(path, exist_ok=True)
+        self.new_chunk()
+        self.start()
+
+    # Build a collector with the reporters of an ArrayCollector, e.g. to replace a model's datacollector
+    @classmethod
+    def like(cls, collector, path, **kwargs):
+        return cls(path, collector.model_reporters, collector.agent_reporters, **kwargs)
+
+    # Start the writer thread
+    def start(self):
+        self.queue = queue.Queue(self.max_chunks)
+        self.error = None
+        self.writer = threading.Thread(target=self.write_loop, name="StreamingCollector writer", daemon=True)
+        self.writer.start()
+
+    # Pickle the counters and the pending rows, not the queue and the thread; the queue is drained first
+    def __getstate__(self):
+        self.queue.join()
+        self.check_writer()
+        state = self.__dict__.copy()
+        for name in ("queue", "writer", "error"):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.start()
+
+    # Start an empty chunk
+    def new_chunk(self):
+        self.model_steps = []
+        self.model_rows = {name: [] for name in self.model_reporters}
+        self.agent_steps = []
+        self.agent_ids = []
+        self.agent_rows = {name: [] for name in self.agent_reporters}
+
+    # Collect all the data for the given model
+    def collect(self, model):
+        call = self.calls
+        self.calls += 1
+        if call % self.stride:
+            return
+
+        step = model.schedule.steps
+        self.model_steps.append(step)
+        for name, reporter in self.model_reporters.items():
+            value = reporter(model)
+            self.model_rows[name].append(value)
+            self.model_vars[name].append(value)
+
+        if self.agent_reporters:
+            agents = model.schedule.agents
+            ids = np.fromiter(map(attrgetter("unique_id"), agents), dtype=np.int64, count=len(agents))
+            self.agent_steps.append(np.full(len(ids), step, dtype=np.int64))
+            self.agent_ids.append(ids)
+            for name, reporter in self.agent_reporters.items():
+                self.agent_rows[name].append(np.fromiter(map(reporter, agents), dtype=np.float64, count=len(agents)))
+
+        if len(self.model_steps) >= self.chunk_steps:
+            self.flush()
+
+    # Hand the current chunk to the writer, applying the backpressure policy if its queue is full
+    def flush(self):
+        self.check_writer()
+        if not self.model_steps:
+            return
+        arrays = {"model:Step": np.array(self.model_steps, dtype=np.int64)}
+        for name, values in self.model_rows.items():
+            arrays["model:" + name] = np.array(values)
+        if self.agent_reporters:
+            arrays["agent:Step"] = np.concatenate(self.agent_steps)
+            arrays["agent:AgentID"] = np.concatenate(self.agent_ids)
+            for name, values in self.agent_rows.items():
+                arrays["agent:" + name] = np.concatenate(values)
+        self.new_chunk()
+
+        item = (self.num_chunks, arrays)
+        self.num_chunks += 1
+        if self.queue.empty() and self.policy == DOWNSAMPLE:
+            self.stride = max(1, self.stride // 2)
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.blocked += 1
+            if self.policy == DOWNSAMPLE:
+                self.stride *= 2
+            start = time.perf_counter()
+            self.queue.put(item)
+            self.wait_seconds += time.perf_counter() - start
+
+    # Write the chunks handed over until None comes
+    def write_loop(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                if self.error is None:
+                    self.write_chunk(*item)
+            except BaseException as error:
+                self.error = error
+            finally:
+                self.queue.task_done()
+
+    # Write one chunk to its compressed file
+    def write_chunk(self, index, arrays):
+        np.savez_compressed(os.path.join(self.path, "chunk-%06d.npz" % index), **arrays)
+
+    # Raise the writer's error in the simulation's thread, if it had one
+    def check_writer(self):
+        if self.error is not None:
+            raise RuntimeError("StreamingCollector writer failed") from self.error
+
+    # Write the last rows and stop the writer; call once the run is over
+    def close(self):
+        self.flush()
+        self.queue.put(None)
+        self.writer.join()
+        self.check_writer()
+
+    # Get the bytes held in memory by the rows not yet written, queued chunks included
+    def nbytes(self):
+        total = sum(values.nbytes for rows in [self.agent_steps, self.agent_ids, *self.agent_rows.values()]
+                    for values in rows)
+        total += 8 * len(self.model_steps) * (1 + len(self.model_rows))
+        with self.queue.mutex:
+            chunks = list(self.queue.queue)
+        for item in chunks:
+            if item is not None:
+                total += sum(values.nbytes for values in item[1].values())
+        return total
+
+# Read the chunks a StreamingCollector wrote to a directory, as (model columns, agent columns)
+def read_stream(path):
+    model = {}
+    agent = {}
+    for filename in sorted(glob.glob(os.path.join(path, "chunk-*.npz"))):
+        with np.load(filename) as chunk:
+            for key in chunk.files:
+                kind, name = key.split(":", 1)
+                (model if kind == "model" else agent).setdefault(name, []).append(chunk[key])
+    return ({name: np.concatenate(values) for name, values in model.items()},
+            {name: np.concatenate(values) for name, values in agent.items()})
@@ -0,0 +1,379 @@
+import numpy as np
+
+from TiledScheduler import SharedArrays, TiledScheduler
+from VectorizedModel import MOORE_OFFSETS, VectorizedTraderModel
+
+# Moore neighbourhood offsets as plain tuples, for the per-agent loop
+NEIGHBOR_OFFSETS = [(int(dx), int(dy)) for dx, dy in MOORE_OFFSETS]
+
+# Execute a buy order of one trader
+def _buy(cash, inventory, i, amount, price):
+    cost = amount * price
+    if cost <= cash[i]:
+        cash[i] -= cost
+        inventory[i] += amount
+
+# Execute a sell order of one trader
+def _sell(cash, inventory, i, amount, price):
+    if amount <= inventory[i]:
+        cash[i] += amount * price
+        inventory[i] -= amount
+
+# Move one agent from its cell's linked list to the front of another cell's list
+def _relink(cell_head, next_agent, a, cell, new_cell):
+    if cell_head[cell] == a:
+        cell_head[cell] = next_agent[a]
+    else:
+        b = cell_head[cell]
+        while next_agent[b] != a:
+            b = next_agent[b]
+        next_agent[b] = next_agent[a]
+    if new_cell >= 0:
+        next_agent[a] = cell_head[new_cell]
+        cell_head[new_cell] = a
+
+# Get the agents in the cells of a tile that have not stepped yet this step
+def _tile_agents(cell_head, next_agent, stepped, tile, height):
+    _, x0, x1, y0, y1 = tile
+    agents = []
+    for x in range(x0, x1):
+        for y in range(y0, y1):
+            a = cell_head[x * height + y]
+            while a >= 0:
+                if not stepped[a]:
+                    agents.append(a)
+                a = next_agent[a]
+    return agents
+
+# Link the agents of each cell into a list: cell_head gives the first agent of a cell, next_agent the one after each
+def link_cells(position, width, height):
+    cells = position[:, 0] * height + position[:, 1]
+    by_cell = np.argsort(cells, kind="stable")
+    next_agent = np.full(len(cells), -1, dtype=np.int64)
+    same_cell = cells[by_cell[1:]] == cells[by_cell[:-1]]
+    next_agent[by_cell[:-1][same_cell]] = by_cell[1:][same_cell]
+    cell_head = np.full(width * height, -1, dtype=np.int64)
+    first = np.r_[True, ~same_cell] if len(cells) else np.zeros(0, dtype=bool)
+    cell_head[cells[by_cell[first]]] = by_cell[first]
+    return cell_head, next_agent
+
+# Step the traders of one tile in random order, following AgentModel.Trader.step
+#
+# Runs in a worker process on typed memoryviews of the shared arrays. Each cell
+# holds a linked list of its traders: cell_head gives the first trader of a
+# cell and next_trader the one after each trader, -1 ending the list.
+def step_tile(views, params, tile, rng):
+    width, height, price = params
+    cash = views["cash"]
+    inventory = views["inventory"]
+    last_price = views["last_price"]
+    position = views["position"]
+    occupancy = views["occupancy"]
+    cell_head = views["cell_head"]
+    next_trader = views["next_trader"]
+    stepped = views["stepped"]
+
+    # Gather the traders in the tile that have not stepped yet this step
+    traders = _tile_agents(cell_head, next_trader, stepped, tile, height)
+    if not traders:
+        return
+    order = rng.permutation(len(traders)).tolist()
+    draws = rng.random(len(traders)).tolist()
+
+    for k, index in enumerate(order):
+        a = traders[index]
+        stepped[a] = 1
+
+        # Update the last price and execute the buy and sell orders
+        last_price[a] = price
+        if price < last_price[a]:
+            _buy(cash, inventory, a, int((cash[a] * 0.9) / price), price)
+        if price > last_price[a]:
+            _sell(cash, inventory, a, inventory[a] // 2, price)
+
+        # Move to a random empty adjacent cell, if there is one
+        x = position[2 * a]
+        y = position[2 * a + 1]
+        empty = []
+        for dx, dy in NEIGHBOR_OFFSETS:
+            nx = x + dx
+            ny = y + dy
+            if 0 <= nx < width and 0 <= ny < height and occupancy[nx * height + ny] == 0:
+                empty.append((nx, ny))
+        if empty:
+            nx, ny = empty[int(draws[k] * len(empty))]
+
+            # Unlink the trader from its cell and push it onto the new one
+            cell = x * height + y
+            new_cell = nx * height + ny
+            _relink(cell_head, next_trader, a, cell, new_cell)
+            occupancy[cell] -= 1
+            occupancy[new_cell] += 1
+            position[2 * a] = x = nx
+            position[2 * a + 1] = y = ny
+
+        # Trade with the traders in the adjacent cells
+        for dx, dy in NEIGHBOR_OFFSETS:
+            nx = x + dx
+            ny = y + dy
+            if not (0 <= nx < width and 0 <= ny < height):
+                continue
+            b = cell_head[nx * height + ny]
+            while b >= 0:
+                quote = last_price[b]
+                # If the neighbor has more inventory than the trader, buy from the neighbor
+                if inventory[b] > inventory[a]:
+                    amount = int((cash[a] * 0.9) / quote) if quote < last_price[a] else 0
+                    _buy(cash, inventory, a, amount, quote)
+                    _sell(cash, inventory, b, amount, quote)
+                # If the neighbor has less inventory than the trader, sell to the neighbor
+                elif inventory[b] < inventory[a]:
+                    amount = inventory[a] // 2 if quote > last_price[a] else 0
+                    _sell(cash, inventory, a, amount, quote)
+                    _buy(cash, inventory, b, amount, quote)
+                b = next_trader[b]
+
+# AgentModel's rules on shared-memory arrays, stepped tile by tile in parallel
+#
+# The model-wide parts of the step (price update, trend rule, data collection)
+# are the vectorized ones of VectorizedTraderModel. The traders themselves are
+# stepped by a TiledScheduler: random activation order within each tile, and
+# tiles of the same colour on a pool of worker processes. Results depend on
+# the seed and tile size but not on the number of workers. close() stops the
+# workers and frees the shared memory.
+class TiledTraderModel(VectorizedTraderModel):
+    # Define the model's initial state
+    def __init__(self, num_traders, width, height, initial_price, cash_per_trader, inventory_per_trader, strategy,
+                 seed=None, tile_size=16, workers=1):
+        super().__init__(num_traders, width, height, initial_price, cash_per_trader, inventory_per_trader, strategy, seed)
+
+        # Move the agent arrays to shared memory
+        self.shared = SharedArrays()
+        for name in ("cash", "inventory", "last_price", "position", "occupancy"):
+            setattr(self, name, self.shared.put(name, getattr(self, name)))
+
+        # Link the traders of each cell into a list
+        cell_head, next_trader = link_cells(self.position, width, height)
+        self.cell_head = self.shared.put("cell_head", cell_head)
+        self.next_trader = self.shared.put("next_trader", next_trader)
+        self.stepped = self.shared.put("stepped", np.zeros(num_traders, dtype=np.int8))
+
+        self.scheduler = TiledScheduler(width, height, tile_size, workers, seed=int(self.rng.integers(2**63)))
+        self.scheduler.start(self.shared)
+
+    # Step all the traders, tile by tile
+    def step_traders(self):
+        self.stepped[:] = 0
+        params = (self.width, self.height, float(self.current_price))
+        self.scheduler.step(step_tile, params, self.shared, self.steps)
+
+    # Stop the workers and free the shared memory
+    def close(self):
+        self.scheduler.close()
+        self.shared.close()
+
+# Step the agents of one tile in random order, following FreshModel.Trader.step
+#
+# Each agent trades with the cellmates it has when it steps, at its own price,
+# and then moves to a random neighbouring cell, wrapping around the edges.
+# Agents no longer in any cell list have been removed and are never stepped.
+def step_finance_tile(views, params, tile, rng):
+    width, height = params
+    wealth = views["wealth"]
+    price = views["price"]
+    position = views["position"]
+    cell_head = views["cell_head"]
+    next_agent = views["next_agent"]
+    stepped = views["stepped"]
+
+    # Gather the agents in the tile that have not stepped yet this step
+    agents = _tile_agents(cell_head, next_agent, stepped, tile, height)
+    if not agents:
+        return
+    order = rng.permutation(len(agents)).tolist()
+    draws = rng.random(len(agents)).tolist()
+
+    transactions = 0
+    for k, index in enumerate(order):
+        a = agents[index]
+        stepped[a] = 1
+        x = position[2 * a]
+        y = position[2 * a + 1]
+        cell = x * height + y
+
+        # Buy from dearer cellmates and sell to cheaper ones, at the agent's own price
+        p = price[a]
+        b = cell_head[cell]
+        while b >= 0:
+            if p < price[b]:
+                wealth[a] -= p
+                wealth[b] += p
+                transactions += 1
+            elif p > price[b]:
+                wealth[a] += p
+                wealth[b] -= p
+                transactions += 1
+            b = next_agent[b]
+
+        # Move to a random neighbouring cell
+        dx, dy = NEIGHBOR_OFFSETS[int(draws[k] * len(NEIGHBOR_OFFSETS))]
+        nx = (x + dx) % width
+        ny = (y + dy) % height
+        _relink(cell_head, next_agent, a, cell, nx * height + ny)
+        position[2 * a] = nx
+        position[2 * a + 1] = ny
+    views["transactions"][tile[0]] += transactions
+
+# FreshModel's rules on shared-memory arrays, stepped tile by tile in parallel
+#
+# Agents are rows of the wealth, price and position arrays on a torus, as in
+# FreshModel.FinanceModel with its default sequential rule. Data collection and
+# the removal of broke agents are model-wide; the agents themselves are
+# stepped by a TiledScheduler, in random order within each tile, so results
+# depend on the seed and tile size but not on the number of workers. A removed
+# agent keeps its rows but leaves the cell lists and alive. close() stops the
+# workers and frees the shared memory.
+class TiledFinanceModel:
+    # Define the model's initial state
+    def __init__(self, N, width, height, starting_wealth, starting_price, seed=None, tile_size=16, workers=1):
+        self.width = width
+        self.height = height
+        self.rng = np.random.default_rng(seed)
+        self.steps = 0
+
+        # Define the agent arrays, with the types of the starting values
+        dtype = np.result_type(starting_wealth, starting_price)
+        position = np.empty((N, 2), dtype=np.int64)
+        position[:, 0] = self.rng.integers(width, size=N)
+        position[:, 1] = self.rng.integers(height, size=N)
+        cell_head, next_agent = link_cells(position, width, height)
+        self.alive = np.ones(N, dtype=np.bool_)
+
+        # Move the agent arrays to shared memory
+        self.scheduler = TiledScheduler(width, height, tile_size, workers, seed=int(self.rng.integers(2**63)),
+                                        torus=True)
+        self.shared = SharedArrays()
+        self.wealth = self.shared.put("wealth", np.full(N, starting_wealth, dtype=dtype))
+        self.price = self.shared.put("price", np.full(N, starting_price, dtype=dtype))
+        self.position = self.shared.put("position", position)
+        self.cell_head = self.shared.put("cell_head", cell_head)
+        self.next_agent = self.shared.put("next_agent", next_agent)
+        self.stepped = self.shared.put("stepped", np.zeros(N, dtype=np.int8))
+        self.transactions = self.shared.put("transactions", np.zeros(self.scheduler.num_tiles, dtype=np.int64))
+        self.scheduler.start(self.shared)
+
+        # Define the aggregate statistics collected every step
+        self.model_vars = {"Total_Wealth": []}
+
+    # Get the number of agents not removed yet
+    @property
+    def num_agents(self):
+        return int(self.alive.sum())
+
+    # Get the number of trades so far
+    @property
+    def total_transactions(self):
+        return int(self.transactions.sum())
+
+    # Collect the aggregate statistics
+    def collect(self):
+        self.model_vars["Total_Wealth"].append(self.wealth[self.alive].sum().item())
+
+    def step(self):
+        self.collect()
+        self.stepped[:] = 0
+        self.scheduler.step(step_finance_tile, (self.width, self.height), self.shared, self.steps)
+        self.remove_broke_agents()
+        self.steps += 1
+
+    # Remove the agents with no wealth from their cells
+    def remove_broke_agents(self):
+        broke = np.flatnonzero(self.alive & (self.wealth <= 0))
+        for a in broke.tolist():
+            x, y = self.position[a].tolist()
+            _relink(self.cell_head, self.next_agent, a, x * self.height + y, -1)
+        self.alive[broke] = False
+
+    # Stop the workers and free the shared memory
+    def close(self):
+        self.scheduler.close()
+        self.shared.close()
+
+# Step the agents of one tile in random order, following ModifiedModel.Trader.step
+#
+# Each agent sells at its own price to one agent picked at random among those
+# in the eight neighbouring cells whose price is at least its own, and then
+# moves to a random neighbouring cell, wrapping around the edges. It reaches
+# one cell from where it started, well within a tile.
+def step_modified_tile(views, params, tile, rng):
+    width, height = params
+    wealth = views["wealth"]
+    price = views["price"]
+    position = views["position"]
+    cell_head = views["cell_head"]
+    next_agent = views["next_agent"]
+    stepped = views["stepped"]
+
+    # Gather the agents in the tile that have not stepped yet this step
+    agents = _tile_agents(cell_head, next_agent, stepped, tile, height)
+    if not agents:
+        return
+    order = rng.permutation(len(agents)).tolist()
+    draws = rng.random((len(agents), 2)).tolist()
+
+    transactions = 0
+    buyers = []
+    for k, index in enumerate(order):
+        a = agents[index]
+        stepped[a] = 1
+        x = position[2 * a]
+        y = position[2 * a + 1]
+        buyer_draw, move_draw = draws[k]
+
+        # Look for buyers in the neighbouring cells and sell to one of them
+        p = price[a]
+        buyers.clear()
+        for dx, dy in NEIGHBOR_OFFSETS:
+            b = cell_head[(x + dx) % width * height + (y + dy) % height]
+            while b >= 0:
+                if price[b] >= p:
+                    buyers.append(b)
+                b = next_agent[b]
+        if buyers:
+            b = buyers[int(buyer_draw * len(buyers))]
+            wealth[b] -= p
+            wealth[a] += p
+            transactions += 1
+
+        # Move to a random neighbouring cell
+        dx, dy = NEIGHBOR_OFFSETS[int(move_draw * len(NEIGHBOR_OFFSETS))]
+        nx = (x + dx) % width
+        ny = (y + dy) % height
+        _relink(cell_head, next_agent, a, x * height + y, nx * height + ny)
+        position[2 * a] = nx
+        position[2 * a + 1] = ny
+    views["transactions"][tile[0]] += transactions
+
+# ModifiedModel's rules on shared-memory arrays, stepped tile by tile in parallel
+#
+# The arrays and the scheduler are those of TiledFinanceModel: every agent
+# starts with a wealth of 100 and a random price from 1 to 9, as in
+# ModifiedModel.FinanceModel. No agent is ever removed, and the statistics are
+# collected at the end of the step.
+class TiledModifiedModel(TiledFinanceModel):
+    # Define the model's initial state
+    def __init__(self, N, width, height, seed=None, tile_size=16, workers=1):
+        super().__init__(N, width, height, 100, 1, seed, tile_size, workers)
+        self.price[:] = self.rng.integers(1, 10, size=N)
+        self.model_vars["Total_Transactions"] = []
+
+    # Collect the aggregate statistics
+    def collect(self):
+        super().collect()
+        self.model_vars["Total_Transactions"].append(self.total_transactions)
+
+    def step(self):
+        self.stepped[:] = 0
+        self.scheduler.step(step_modified_tile, (self.width, self.height), self.shared, self.steps)
+        self.collect()
+        self.steps += 1
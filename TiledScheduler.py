@@ -0,0 +1,157 @@
+import multiprocessing
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from RandomStreams import RandomStreams
+
+# Define a set of NumPy arrays in shared memory
+#
+# Forked worker processes inherit the shared mappings, so every process reads
+# and writes the same memory and nothing is copied between steps. views() gives
+# flat typed memoryviews of the arrays, which read and write plain Python
+# ints and floats much faster than indexing the arrays one element at a time.
+class SharedArrays:
+    # Define the set's initial state
+    def __init__(self):
+        self.blocks = {}
+        self.arrays = {}
+        self.finalizer = weakref.finalize(self, SharedArrays.release, self.blocks)
+
+    # Copy an array into shared memory and get the shared copy
+    def put(self, name, values):
+        values = np.ascontiguousarray(values)
+        block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        array = np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)
+        array[...] = values
+        self.blocks[name] = block
+        self.arrays[name] = array
+        return array
+
+    # Get flat typed memoryviews of the arrays
+    def views(self):
+        return {name: memoryview(array).cast("B").cast(array.dtype.char) for name, array in self.arrays.items()}
+
+    # Free the shared memory
+    def close(self):
+        self.arrays.clear()
+        self.finalizer()
+
+    @staticmethod
+    def release(blocks):
+        for block in blocks.values():
+            # Arrays still pointing into the block keep it mapped until they are dropped
+            try:
+                block.close()
+            except BufferError:
+                pass
+            block.unlink()
+        blocks.clear()
+
+# Views of the shared arrays in worker processes; forked workers inherit them
+_worker_views = {}
+
+# Step a list of tiles in a worker process
+def _run_tiles(task):
+    kernel, params, tiles, step, seed = task
+    for tile in tiles:
+        kernel(_worker_views, params, tile, tile_rng(seed, step, tile[0]))
+
+# Get the random generator of one tile in one step, whichever process steps it
+def tile_rng(seed, step, tile_id):
+    return RandomStreams(seed).generator(step, tile_id)
+
+# Get the (start, end) bounds of the tiles along an axis
+#
+# The last tile is cut short at the edge of the grid, except on a torus, where
+# a short tile would sit between two tiles of the same colour: there the last
+# tile runs on to the edge instead, so that every tile is at least tile_size
+# cells wide.
+def axis_tiles(length, tile_size, torus):
+    starts = list(range(0, length, tile_size))
+    if torus and len(starts) > 1 and length % tile_size:
+        starts.pop()
+    return list(zip(starts, starts[1:] + [length]))
+
+# Get the colour of the tile at the given index along an axis of count tiles
+def tile_color(index, count, torus):
+    if torus and count % 2 and count > 1 and index == count - 1:
+        return 2
+    return index % 2
+
+# Define a scheduler that steps a grid tile by tile, colour by colour
+#
+# The grid is cut into square tiles that are coloured like a 2 x 2
+# checkerboard, so any two tiles of the same colour are at least one tile
+# apart. An agent that steps moves one cell and then trades with the Moore
+# neighbours of its new cell, so it touches cells up to two cells from where
+# it started: with tiles at least four cells wide, agents in tiles of the same
+# colour can never touch the same cell or agent. The tiles of one colour are
+# therefore stepped concurrently, and the colours one after another in a
+# fixed order. Each tile draws from its own generator, seeded by the run seed,
+# the step and the tile, so results only depend on the seed, not on the number
+# of workers or on which worker steps which tile.
+#
+# On a torus the first and last tiles along an axis are neighbours across the
+# edge; with an odd number of tiles they would have the same colour, so the
+# last tile along that axis gets a colour of its own. See axis_tiles() for the
+# width of the last tile.
+class TiledScheduler:
+    # Minimum tile width that keeps tiles of the same colour independent
+    MIN_TILE_SIZE = 4
+
+    # Define the scheduler's initial state
+    def __init__(self, width, height, tile_size=16, workers=1, seed=0, torus=False):
+        if tile_size < self.MIN_TILE_SIZE:
+            raise ValueError("tiles must be at least %d cells wide" % self.MIN_TILE_SIZE)
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.workers = workers
+        self.seed = seed
+        self.pool = None
+
+        # Each tile is (tile id, x0, x1, y0, y1), listed by colour
+        columns = axis_tiles(width, tile_size, torus)
+        rows = axis_tiles(height, tile_size, torus)
+        self.colors = [[] for i in range(9)]
+        tile_id = 0
+        for tx, (x0, x1) in enumerate(columns):
+            for ty, (y0, y1) in enumerate(rows):
+                tile = (tile_id, x0, x1, y0, y1)
+                color = tile_color(tx, len(columns), torus) * 3 + tile_color(ty, len(rows), torus)
+                self.colors[color].append(tile)
+                tile_id += 1
+        self.num_tiles = tile_id
+
+    # Start the worker processes, which inherit views of the given shared arrays
+    def start(self, shared):
+        global _worker_views
+        if self.workers > 1 and self.pool is None:
+            _worker_views = shared.views()
+            self.pool = multiprocessing.get_context("fork").Pool(self.workers)
+            _worker_views = {}
+
+    # Step every tile once; kernel(views, params, tile, rng) steps the agents of one tile
+    def step(self, kernel, params, shared, step):
+        views = None
+        for tiles in self.colors:
+            if not tiles:
+                continue
+            if self.pool is None:
+                views = views or shared.views()
+                for tile in tiles:
+                    kernel(views, params, tile, tile_rng(self.seed, step, tile[0]))
+            else:
+                # One task per worker and colour, keeping the per-task overhead low
+                chunks = [tiles[i::self.workers] for i in range(self.workers)]
+                tasks = [(kernel, params, chunk, step, self.seed) for chunk in chunks if chunk]
+                self.pool.map(_run_tiles, tasks)
+
+    # Stop the worker processes
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
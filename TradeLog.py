@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+
+# Event kinds besides OrderBook.BUY and OrderBook.SELL
+REMOVE = 2
+INTERACT = 3
+
+# Columns of a trade log record
+COLUMNS = [("step", np.int64), ("kind", np.int8), ("buyer", np.int64), ("seller", np.int64),
+           ("quantity", np.float64), ("price", np.float64)]
+
+# Define a recorder for trade events
+#
+# Records go into preallocated column buffers and are written out a whole
+# buffer at a time, one .npy file per column per chunk, so the log on disk is
+# columnar. Without a path the chunks are kept in memory. Models hold None
+# instead of a TradeLog when logging is off, so a disabled log costs a single
+# "is not None" check.
+class TradeLog:
+    # Define the log's initial state
+    def __init__(self, path=None, capacity=65536):
+        self.path = path
+        self.capacity = capacity
+        self.buffers = {name: np.empty(capacity, dtype=dtype) for name, dtype in COLUMNS}
+        self.size = 0
+        self.chunks = []
+        self.num_chunks = 0
+        self.num_flushed = 0
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    # Get the number of records written so far
+    def __len__(self):
+        return self.num_flushed + self.size
+
+    # Append one record to the buffers
+    def record(self, step, kind, buyer, seller, quantity, price):
+        i = self.size
+        buffers = self.buffers
+        buffers["step"][i] = step
+        buffers["kind"][i] = kind
+        buffers["buyer"][i] = buyer
+        buffers["seller"][i] = seller
+        buffers["quantity"][i] = quantity
+        buffers["price"][i] = price
+        self.size = i + 1
+        if self.size == self.capacity:
+            self.flush()
+
+    # Append one record per element of the given arrays; scalars apply to every record
+    def record_many(self, step, kind, buyers, sellers, quantities, prices):
+        buyers = np.asarray(buyers)
+        n = len(buyers)
+        columns = {"step": step, "kind": kind, "buyer": buyers, "seller": sellers,
+                   "quantity": quantities, "price": prices}
+        columns = {name: np.broadcast_to(np.asarray(values), n) for name, values in columns.items()}
+        start = 0
+        while start < n:
+            count = min(n - start, self.capacity - self.size)
+            for name, values in columns.items():
+                self.buffers[name][self.size:self.size + count] = values[start:start + count]
+            self.size += count
+            start += count
+            if self.size == self.capacity:
+                self.flush()
+
+    # Write the buffered records out as one chunk
+    def flush(self):
+        if self.size == 0:
+            return
+        if self.path is None:
+            self.chunks.append({name: buffer[:self.size].copy() for name, buffer in self.buffers.items()})
+        else:
+            for name, buffer in self.buffers.items():
+                np.save(os.path.join(self.path, "%s-%05d.npy" % (name, self.num_chunks)), buffer[:self.size])
+        self.num_chunks += 1
+        self.num_flushed += self.size
+        self.size = 0
+
+    # Flush what is left in the buffers
+    def close(self):
+        self.flush()
+
+    # Get every record as a dict of column arrays
+    def columns(self):
+        self.flush()
+        if self.path is None:
+            chunks = self.chunks
+        else:
+            chunks = [read_chunk(self.path, i) for i in range(self.num_chunks)]
+        return {name: np.concatenate([chunk[name] for chunk in chunks] or [np.empty(0, dtype)])
+                for name, dtype in COLUMNS}
+
+# Read one chunk of a trade log directory, memory-mapped
+def read_chunk(path, chunk):
+    return {name: np.load(os.path.join(path, "%s-%05d.npy" % (name, chunk)), mmap_mode="r")
+            for name, dtype in COLUMNS}
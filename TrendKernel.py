@@ -0,0 +1,182 @@
+import types
+
+import numpy as np
+
+from OrderBook import BUY, SELL
+
+# Side of a trader that neither buys nor sells this step
+HOLD = -1
+
+# Settle one order per trader at the given price, as AgentModel.Trader does
+#
+# side holds BUY, SELL or HOLD per trader. A buyer buys
+# Trader.calculate_buy_amount(price) and a seller sells
+# Trader.calculate_sell_amount(price), with the checks of Trader.buy() and
+# Trader.sell(); cash and inventory are updated in place. touched is set for
+# the traders whose order went through, even for an amount of 0, as buy() and
+# sell() still rewrite their cash then.
+#
+# This is plain Python over arrays, so that numba can compile it as is;
+# run uncompiled it is the reference the other kernels are checked against.
+def settle_loop(price, cash, inventory, last_price, side, touched):
+    for i in range(len(side)):
+        touched[i] = False
+        if side[i] == BUY:
+            amount = int((cash[i] * 0.9) / price) if price < last_price[i] else 0
+            cost = amount * price
+            if cost <= cash[i]:
+                cash[i] -= cost
+                inventory[i] += amount
+                touched[i] = True
+        elif side[i] == SELL:
+            amount = inventory[i] // 2 if price > last_price[i] else 0
+            if amount <= inventory[i]:
+                cash[i] += amount * price
+                inventory[i] -= amount
+                touched[i] = True
+
+# Apply the trend following rule of AgentModel.TraderModel.step to arrays of traders
+#
+# The average inventory is computed in the same call, before any trader acts,
+# as TraderModel.average_inventory does, and returned. A trader buys if the
+# price is above its last price and its inventory at least the average, and
+# sells if the price is below and its inventory at most the average; the
+# orders are settled by settle_loop. As TraderModel.step states the rule, a
+# buyer's amount is only non-zero below its last price and a seller's only
+# above it, so the rule trades nothing: every order is for 0, and its only
+# effect is that the buyers' and sellers' cash becomes a float in the object
+# model. The settle kernels are checked on their own with sides that trade.
+def trend_rule_loop(price, cash, inventory, last_price, touched):
+    n = len(inventory)
+    if n == 0:
+        return 0.0
+    total = 0
+    for i in range(n):
+        total += inventory[i]
+    avg_inventory = total / n
+
+    side = np.empty(n, dtype=np.int8)
+    for i in range(n):
+        if price > last_price[i] and inventory[i] >= avg_inventory:
+            side[i] = BUY
+        elif price < last_price[i] and inventory[i] <= avg_inventory:
+            side[i] = SELL
+        else:
+            side[i] = HOLD
+    settle_loop(price, cash, inventory, last_price, side, touched)
+    return avg_inventory
+
+# Settle one order per trader with whole-array NumPy operations, for when numba is not installed
+def settle_numpy(price, cash, inventory, last_price, side, touched):
+    buying = side == BUY
+    selling = side == SELL
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        amount = np.where(buying & (price < last_price), (cash * 0.9) / price, 0).astype(np.int64)
+    cost = amount * price
+    bought = buying & (cost <= cash)
+    cash -= np.where(bought, cost, 0.0)
+    inventory += np.where(bought, amount, 0)
+
+    amount = np.where(selling & (price > last_price), inventory // 2, 0)
+    sold = selling & (amount <= inventory)
+    cash += np.where(sold, amount * price, 0.0)
+    inventory -= np.where(sold, amount, 0)
+
+    touched[:] = bought | sold
+
+# Apply the trend following rule with whole-array NumPy operations
+def trend_rule_numpy(price, cash, inventory, last_price, touched):
+    n = len(inventory)
+    if n == 0:
+        return 0.0
+    avg_inventory = inventory.sum() / n
+    rising = (price > last_price) & (inventory >= avg_inventory)
+    falling = ~rising & (price < last_price) & (inventory <= avg_inventory)
+    side = np.where(rising, BUY, np.where(falling, SELL, HOLD)).astype(np.int8)
+    settle_numpy(price, cash, inventory, last_price, side, touched)
+    return avg_inventory
+
+# Compile a kernel with numba, with some of the functions it calls replaced by their compiled versions
+#
+# numba takes longer to import than the models themselves, so it is only
+# imported here, the first time a kernel is needed.
+def compile_kernel(function, **compiled):
+    import numba
+    scope = dict(function.__globals__, **compiled)
+    return numba.njit(cache=True)(types.FunctionType(function.__code__, scope, function.__name__))
+
+# The kernels in use, chosen by load_kernels()
+KERNEL = None
+_settle = None
+_trend_rule = None
+
+# Choose the kernels in use: the loops compiled by numba if it is installed, else the NumPy versions
+def load_kernels():
+    global KERNEL, _settle, _trend_rule
+    if KERNEL is None:
+        try:
+            _settle = compile_kernel(settle_loop)
+        except ImportError:
+            _settle = settle_numpy
+            _trend_rule = trend_rule_numpy
+            KERNEL = "numpy"
+        else:
+            _trend_rule = compile_kernel(trend_rule_loop, settle_loop=_settle)
+            KERNEL = "numba"
+    return KERNEL
+
+# Settle one order per trader with the kernel in use
+def settle(price, cash, inventory, last_price, side, touched):
+    if KERNEL is None:
+        load_kernels()
+    _settle(price, cash, inventory, last_price, side, touched)
+
+# Apply the trend following rule with the kernel in use
+def trend_rule(price, cash, inventory, last_price, touched):
+    if KERNEL is None:
+        load_kernels()
+    return _trend_rule(price, cash, inventory, last_price, touched)
+
+# Draw random trader arrays for the checks: cash, inventory and last price around the given price
+def draw_traders(rng, n, price):
+    cash = rng.uniform(-100, 2000, size=n)
+    inventory = rng.integers(0, 20, size=n)
+    last_price = price + rng.integers(-2, 3, size=n) * rng.uniform(0, 1, size=n)
+    return cash, inventory, last_price
+
+# Check that the NumPy kernels, and the compiled ones if numba is installed, match the loops run as plain Python
+#
+# Each case draws seeded random traders and, for settle, random sides, runs
+# every kernel on copies of them and requires the same cash, inventory,
+# touched traders and average as the loop. Raises AssertionError on the first
+# mismatch. Running this module runs the check:
+#
+#   python TrendKernel.py
+def check_kernels(seed=0, cases=100):
+    kernels = [("numpy", settle_numpy, trend_rule_numpy)]
+    if load_kernels() == "numba":
+        kernels.append(("numba", _settle, _trend_rule))
+    rng = np.random.default_rng(seed)
+    sides = np.array([HOLD, BUY, SELL], dtype=np.int8)
+    for case in range(cases):
+        price = rng.uniform(1, 200)
+        cash, inventory, last_price = draw_traders(rng, int(rng.integers(1, 500)), price)
+        side = rng.choice(sides, size=len(cash))
+        runs = [("loop", settle_loop, trend_rule_loop)] + kernels
+        results = []
+        for name, settle_kernel, rule_kernel in runs:
+            settled = [cash.copy(), inventory.copy(), np.zeros(len(cash), dtype=np.bool_)]
+            settle_kernel(price, settled[0], settled[1], last_price, side, settled[2])
+            ruled = [cash.copy(), inventory.copy(), np.zeros(len(cash), dtype=np.bool_)]
+            average = rule_kernel(price, ruled[0], ruled[1], last_price, ruled[2])
+            results.append((name, settled + ruled, average))
+        expected = results[0]
+        for name, arrays, average in results[1:]:
+            if average != expected[2] or not all(map(np.array_equal, arrays, expected[1])):
+                raise AssertionError("kernel %s differs from the python loop in case %d of seed %d"
+                                     % (name, case, seed))
+
+if __name__ == "__main__":
+    check_kernels()
+    print("%s kernels match the python loops" % load_kernels())
@@ -0,0 +1,244 @@
+import numpy as np
+
+from TrendKernel import trend_rule
+
+# Moore neighbourhood offsets, in the order mesa's get_neighborhood returns them
+MOORE_OFFSETS = np.array([(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)])
+
+# Struct-of-arrays version of AgentModel.TraderModel
+#
+# Every trader is a row in the cash, inventory, last_price and position arrays,
+# and every rule of AgentModel.Trader is applied to all traders at once.
+# Traders are still activated in a random order each step: the order is kept
+# as a rank array, so "has this neighbour already stepped" becomes a comparison
+# of ranks. Moves are resolved in rank order (the earliest trader wins a
+# contested cell) and neighbour trades are settled in waves in which every
+# trader takes part at most once, so each trade sees the same state the
+# per-agent rules would check.
+#
+# This is not the per-agent model step for step: there each trader moves and
+# then trades before the next one moves, while here every trader moves first
+# and all the trades are settled afterwards, around the new positions. A
+# trader therefore trades with the neighbours it has once everyone has moved,
+# not with those it had at its turn, and a neighbour may already have left or
+# not yet arrived. On a grid where no trader can move the two are the same;
+# bench_vectorized checks that on a full grid, step by step. With movement
+# only the aggregates are comparable.
+class VectorizedTraderModel:
+    # Define the model's initial state
+    def __init__(self, num_traders, width, height, initial_price, cash_per_trader, inventory_per_trader, strategy, seed=None):
+        self.num_traders = num_traders
+        self.width = width
+        self.height = height
+        self.current_price = initial_price
+        self.strategy = strategy
+        self.rng = np.random.default_rng(seed)
+        self.steps = 0
+
+        # Define the agent arrays
+        self.cash = np.full(num_traders, cash_per_trader, dtype=np.float64)
+        self.inventory = np.full(num_traders, inventory_per_trader, dtype=np.int64)
+        self.inventory_limit = self.inventory.copy()
+        self.last_price = np.full(num_traders, initial_price, dtype=np.float64)
+
+        # Traders whose trend rule order went through on the last step, reused every step
+        self.touched = np.zeros(num_traders, dtype=np.bool_)
+
+        # Add every agent to a random grid cell
+        self.position = np.empty((num_traders, 2), dtype=np.int64)
+        self.position[:, 0] = self.rng.integers(width, size=num_traders)
+        self.position[:, 1] = self.rng.integers(height, size=num_traders)
+        self.occupancy = np.zeros((width, height), dtype=np.int32)
+        np.add.at(self.occupancy, (self.position[:, 0], self.position[:, 1]), 1)
+
+        # Define the aggregate statistics collected every step
+        self.model_vars = {"Price": [], "Average Cash": [], "Average Inventory": []}
+
+    # Build a vectorized model with the same state as an AgentModel.TraderModel
+    @classmethod
+    def from_model(cls, model, seed=None):
+        traders = model.schedule.agents
+        vectorized = cls(0, model.grid.width, model.grid.height, model.current_price, 0, 0, None, seed)
+        vectorized.num_traders = len(traders)
+        vectorized.strategy = traders[0].strategy if traders else None
+        vectorized.cash = np.array([t.cash for t in traders], dtype=np.float64)
+        vectorized.inventory = np.array([t.inventory for t in traders], dtype=np.int64)
+        vectorized.inventory_limit = np.array([t.inventory_limit for t in traders], dtype=np.int64)
+        vectorized.last_price = np.array([t.last_price for t in traders], dtype=np.float64)
+        vectorized.touched = np.zeros(len(traders), dtype=np.bool_)
+        vectorized.position = np.array([t.pos for t in traders], dtype=np.int64).reshape(-1, 2)
+        np.add.at(vectorized.occupancy, (vectorized.position[:, 0], vectorized.position[:, 1]), 1)
+        return vectorized
+
+    # Calculate the amount each trader in idx buys at the given price
+    def calculate_buy_amount(self, idx, price):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            amount = (self.cash[idx] * 0.9) / price
+        return np.where(price < self.last_price[idx], amount, 0).astype(np.int64)
+
+    # Calculate the amount each trader in idx sells at the given price
+    def calculate_sell_amount(self, idx, price):
+        return np.where(price > self.last_price[idx], self.inventory[idx] // 2, 0)
+
+    # Execute buy orders; idx must not contain duplicates
+    def buy(self, idx, amount, price):
+        cost = amount * price
+        ok = cost <= self.cash[idx]
+        self.cash[idx] -= np.where(ok, cost, 0.0)
+        self.inventory[idx] += np.where(ok, amount, 0)
+
+    # Execute sell orders; idx must not contain duplicates
+    def sell(self, idx, amount, price):
+        proceeds = amount * price
+        ok = amount <= self.inventory[idx]
+        self.cash[idx] += np.where(ok, proceeds, 0.0)
+        self.inventory[idx] -= np.where(ok, amount, 0)
+
+    # Apply the trend following rule of TraderModel.step to every trader, with TrendKernel's kernel
+    def apply_trend_rule(self):
+        trend_rule(float(self.current_price), self.cash, self.inventory, self.last_price, self.touched)
+
+    # Collect the aggregate statistics
+    def collect(self):
+        self.model_vars["Price"].append(self.current_price)
+        self.model_vars["Average Cash"].append(float(self.cash.mean()) if self.num_traders else 0.0)
+        self.model_vars["Average Inventory"].append(float(self.inventory.mean()) if self.num_traders else 0.0)
+
+    # Move every trader to a random empty adjacent cell
+    def move(self, rank):
+        x = self.position[:, 0]
+        y = self.position[:, 1]
+
+        # Find the adjacent cells that are inside the grid and empty
+        valid = np.zeros((self.num_traders, len(MOORE_OFFSETS)), dtype=bool)
+        for k, (dx, dy) in enumerate(MOORE_OFFSETS):
+            nx = x + dx
+            ny = y + dy
+            inside = np.flatnonzero((nx >= 0) & (nx < self.width) & (ny >= 0) & (ny < self.height))
+            valid[inside, k] = self.occupancy[nx[inside], ny[inside]] == 0
+
+        # Select a random cell from the possible cells of each trader
+        count = valid.sum(axis=1)
+        movers = np.flatnonzero(count > 0)
+        if len(movers) == 0:
+            return
+        choice = (self.rng.random(len(movers)) * count[movers]).astype(np.int64)
+        slot = np.argmax(np.cumsum(valid[movers], axis=1) > choice[:, None], axis=1)
+        target = self.position[movers] + MOORE_OFFSETS[slot]
+
+        # Resolve contested cells in activation order
+        target_cell = target[:, 0] * self.height + target[:, 1]
+        order = np.lexsort((rank[movers], target_cell))
+        winners = order[np.r_[True, target_cell[order][1:] != target_cell[order][:-1]]]
+        movers = movers[winners]
+        target = target[winners]
+
+        # Move the winning traders
+        np.subtract.at(self.occupancy, (x[movers], y[movers]), 1)
+        self.position[movers] = target
+        np.add.at(self.occupancy, (target[:, 0], target[:, 1]), 1)
+
+    # Build the (trader, neighbour) pairs of the Moore neighbourhood
+    def neighbor_pairs(self):
+        x = self.position[:, 0]
+        y = self.position[:, 1]
+        cell = x * self.height + y
+        by_cell = np.argsort(cell, kind="stable")
+        counts = np.bincount(cell, minlength=self.width * self.height)
+        starts = np.cumsum(counts) - counts
+
+        pairs_i = []
+        pairs_j = []
+        for dx, dy in MOORE_OFFSETS:
+            nx = x + dx
+            ny = y + dy
+            src = np.flatnonzero((nx >= 0) & (nx < self.width) & (ny >= 0) & (ny < self.height))
+            neighbor_cell = nx[src] * self.height + ny[src]
+            k = counts[neighbor_cell]
+            total = k.sum()
+            within = np.arange(total) - np.repeat(np.cumsum(k) - k, k)
+            pairs_i.append(np.repeat(src, k))
+            pairs_j.append(by_cell[np.repeat(starts[neighbor_cell], k) + within])
+        return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+    # Trade with neighbours, one wave of disjoint pairs at a time
+    def trade(self, rank, previous_price):
+        pairs_i, pairs_j = self.neighbor_pairs()
+
+        # A neighbour that has not stepped yet still quotes its previous price;
+        # pairs quoting the current price can never trade
+        neighbor_price = np.where(rank[pairs_j] < rank[pairs_i], self.current_price, previous_price[pairs_j])
+        tradable = neighbor_price != self.last_price[pairs_i]
+        pairs_i = pairs_i[tradable]
+        pairs_j = pairs_j[tradable]
+        neighbor_price = neighbor_price[tradable]
+
+        # Settle the pairs in activation order
+        order = np.argsort(rank[pairs_i], kind="stable")
+        pairs_i = pairs_i[order]
+        pairs_j = pairs_j[order]
+        neighbor_price = neighbor_price[order]
+
+        while len(pairs_i):
+            # Take every pair whose traders do not appear in an earlier pair
+            index = np.arange(len(pairs_i))
+            first = np.full(self.num_traders, len(pairs_i))
+            np.minimum.at(first, pairs_i, index)
+            np.minimum.at(first, pairs_j, index)
+            wave = (first[pairs_i] == index) & (first[pairs_j] == index)
+            i = pairs_i[wave]
+            j = pairs_j[wave]
+            price = neighbor_price[wave]
+
+            buying = self.inventory[j] > self.inventory[i]
+            selling = self.inventory[j] < self.inventory[i]
+
+            # If the neighbour has more inventory than the trader, buy from the neighbour
+            amount = np.where(buying, self.calculate_buy_amount(i, price), 0)
+            self.buy(i, amount, price)
+            self.sell(j, amount, price)
+
+            # If the neighbour has less inventory than the trader, sell to the neighbour
+            amount = np.where(selling, self.calculate_sell_amount(i, price), 0)
+            self.sell(i, amount, price)
+            self.buy(j, amount, price)
+
+            pairs_i = pairs_i[~wave]
+            pairs_j = pairs_j[~wave]
+            neighbor_price = neighbor_price[~wave]
+
+    # Step all the traders, the equivalent of Trader.step for every agent; see the class comment for the order
+    #
+    # rank, the activation order of each trader, is drawn at random unless
+    # given, e.g. to follow the order of an AgentModel.TraderModel step.
+    def step_traders(self, rank=None):
+        if rank is None:
+            rank = np.empty(self.num_traders, dtype=np.int64)
+            rank[self.rng.permutation(self.num_traders)] = np.arange(self.num_traders)
+        previous_price = self.last_price.copy()
+
+        # Update the last price and execute the buy and sell orders
+        self.last_price[:] = self.current_price
+        everyone = np.arange(self.num_traders)
+        buy_amount = self.calculate_buy_amount(everyone, self.last_price)
+        sell_amount = self.calculate_sell_amount(everyone, self.last_price)
+        self.buy(everyone, buy_amount, self.last_price)
+        self.sell(everyone, sell_amount, self.last_price)
+
+        # Move the traders, then trade with neighbours
+        self.move(rank)
+        self.trade(rank, previous_price)
+
+    def step(self):
+        # Update the current price based on market dynamics
+        self.current_price = self.current_price + self.rng.uniform(-1, 1)
+
+        # Implement the trend following strategy for every trader
+        self.apply_trend_rule()
+
+        # Collect data at the end of the step
+        self.collect()
+
+        # Move and trade all the traders
+        self.step_traders()
+        self.steps += 1
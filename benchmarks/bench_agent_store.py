@@ -0,0 +1,81 @@
+# Compare FreshModel's removal of broke agents before and after the AgentStore
+#
+# Both sides build the same FreshModel, mark a random fraction of the agents
+# broke before every step and time the removal pass. The old pass is the one
+# FreshModel used on mesa's RandomActivation: a scan of schedule.agents, then
+# schedule.remove and mesa's MultiGrid._remove_agent per agent. Both must leave
+# the same agents, in the same order and on the same cells.
+#
+#   python benchmarks/bench_agent_store.py
+#   python benchmarks/bench_agent_store.py --agents 1000000 --churn 0.05
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mesa.space import MultiGrid
+from mesa.time import RandomActivation
+
+import FreshModel
+from BatchRun import create_model
+
+# FreshModel's removal pass before the AgentStore
+def old_remove_broke_agents(model):
+    agents_to_remove = [agent for agent in model.schedule.agents if agent.wealth <= 0]
+    for agent in agents_to_remove:
+        model.schedule.remove(agent)
+        MultiGrid._remove_agent(model.grid, agent.pos, agent)
+
+def build(agents, seed, old):
+    side = math.ceil(math.sqrt(agents))
+    model = create_model(FreshModel.FinanceModel, dict(N=agents, width=side, height=side, starting_wealth=100,
+                                                       starting_price=1), seed)
+    if old:
+        schedule = RandomActivation(model)
+        for agent in model.schedule.agents:
+            schedule.add(agent)
+        model.schedule = schedule
+    return model
+
+# Time the removal passes of a model whose agents go broke at the given rate
+def run(agents, churn, rounds, seed, old):
+    model = build(agents, seed, old)
+    rng = np.random.default_rng(seed)
+    elapsed = 0.0
+    for i in range(rounds):
+        living = model.schedule.agents
+        for k in rng.choice(len(living), int(len(living) * churn), replace=False).tolist():
+            living[k].wealth = 0
+        start = time.perf_counter()
+        if old:
+            old_remove_broke_agents(model)
+        else:
+            model.remove_broke_agents()
+        elapsed += time.perf_counter() - start
+    state = [(agent.unique_id, agent.pos) for agent in model.schedule.agents]
+    state.append([[len(cell) for cell in column] for column in model.grid.grid])
+    return elapsed / rounds, state
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the removal of broke agents in FreshModel")
+    parser.add_argument("--agents", type=int, default=200000)
+    parser.add_argument("--churn", type=float, default=0.02, help="fraction of the agents that go broke per round")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    old, expected = run(args.agents, args.churn, args.rounds, args.seed, old=True)
+    new, state = run(args.agents, args.churn, args.rounds, args.seed, old=False)
+    print("%d agents, %.0f%% going broke per round" % (args.agents, args.churn * 100))
+    print("%-22s %12s" % ("removal pass", "ms per round"))
+    print("%-22s %12.2f" % ("mesa RandomActivation", old * 1e3))
+    print("%-22s %12.2f" % ("AgentStore", new * 1e3))
+    print("speedup %.2fx, same agents and cells: %s" % (old / new, "yes" if state == expected else "NO"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# Measure batch-run throughput from 1 to N worker processes
+#
+#   python benchmarks/bench_batch_run.py
+#   python benchmarks/bench_batch_run.py --max-workers 32 --jobs 256
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BatchRun import batch_run
+
+PARAMETERS = {"num_traders": 100, "width": 20, "height": 20, "initial_price": 100,
+              "cash_per_trader": 1000, "inventory_per_trader": 10, "strategy": "Random"}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batch-run scaling")
+    parser.add_argument("--model", default="AgentModel.TraderModel")
+    parser.add_argument("--jobs", type=int, default=64)
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    workers = [1]
+    while workers[-1] * 2 <= args.max_workers:
+        workers.append(workers[-1] * 2)
+    if workers[-1] != args.max_workers:
+        workers.append(args.max_workers)
+
+    print("%d jobs of %d steps, %d cores available" % (args.jobs, args.steps, os.cpu_count()))
+    print("%8s %10s %10s %10s" % ("workers", "runs/s", "speedup", "efficiency"))
+    baseline = None
+    for n in workers:
+        with tempfile.TemporaryDirectory() as out_dir:
+            start = time.perf_counter()
+            batch_run(args.model, PARAMETERS, args.steps, args.jobs, workers=n, out_dir=out_dir)
+            throughput = args.jobs / (time.perf_counter() - start)
+        baseline = baseline or throughput
+        print("%8d %10.2f %9.2fx %9.0f%%" % (n, throughput, throughput / baseline, throughput / baseline / n * 100))
+
+if __name__ == "__main__":
+    main()
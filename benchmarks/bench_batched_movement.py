@@ -0,0 +1,59 @@
+# Compare MyModel steps with per-agent and batched movement
+#
+# Agents are spread over a torus at one agent per unit area. The per-agent
+# mode calls move_agent once per agent and is only run up to --object-max
+# agents.
+#
+#   python benchmarks/bench_batched_movement.py
+#   python benchmarks/bench_batched_movement.py --agents 10000 1000000 --steps 10
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from MyModel import MyModel
+
+# Time the movement and the interactions of a model's steps separately
+def time_steps(model, steps):
+    move = interact = 0
+    for i in range(steps):
+        start = time.perf_counter()
+        if model.batched:
+            model.move_all()
+        else:
+            for agent in model.agents:
+                agent.move()
+        middle = time.perf_counter()
+        model.interact()
+        model.steps += 1
+        move += middle - start
+        interact += time.perf_counter() - middle
+    return move / steps, interact / steps
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-agent and batched movement in MyModel")
+    parser.add_argument("--agents", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--steps", type=int, default=5)
+    parser.add_argument("--object-max", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("%10s %-10s %10s %12s %10s" % ("agents", "mode", "move s", "interact s", "steps/s"))
+    for n in args.agents:
+        side = float(np.sqrt(n))
+        for batched in (False, True):
+            if not batched and n > args.object_max:
+                continue
+            model = MyModel(num_agents=n, width=side, height=side, seed=args.seed, batched=batched)
+            move, interact = time_steps(model, args.steps)
+            if batched:
+                assert ((model.positions >= 0) & (model.positions < model.size)).all()
+            print("%10d %-10s %10.3f %12.3f %10.2f" % (n, "batched" if batched else "per-agent",
+                                                       move, interact, 1 / (move + interact)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# Compare FreshModel's sequential cellmate trading with the bucketed pass
+#
+# Agents get random prices, so that cellmates trade, on a crowded torus. The
+# check runs the bucketed model against a reference that settles the same
+# synchronous trades with the agents' own trade() method: every agent trades
+# with its start-of-step cellmates before anyone moves. Integer prices must
+# match exactly, float prices to rounding.
+#
+#   python benchmarks/bench_bucketed_trading.py
+#   python benchmarks/bench_bucketed_trading.py --agents 100000 --side 30
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import FreshModel
+from BatchRun import create_model
+
+# Define a bucketed model that settles its trades one agent at a time with Trader.trade
+class ReferenceModel(FreshModel.FinanceModel):
+    def trade_cells(self):
+        for agent in self.schedule.agents:
+            agent.trade()
+
+def build(model_class, agents, side, bucketed, seed, float_prices=False):
+    model = create_model(model_class, dict(N=agents, width=side, height=side, starting_wealth=1000,
+                                           starting_price=1, bucketed=bucketed), seed)
+    rng = np.random.default_rng(seed)
+    prices = rng.uniform(1, 10, agents) if float_prices else rng.integers(1, 10, agents)
+    for agent, price in zip(model.schedule.agents, prices.tolist()):
+        agent.price = price
+    return model
+
+def state(model):
+    agents = model.schedule.agents
+    return ([agent.unique_id for agent in agents], [agent.pos for agent in agents],
+            np.array([agent.wealth for agent in agents]), model.total_transactions)
+
+def check(agents, side, steps, seed):
+    for float_prices in (False, True):
+        bucketed = build(FreshModel.FinanceModel, agents, side, True, seed, float_prices)
+        for i in range(steps):
+            bucketed.step()
+        # Mesa keeps the RNG on the model class, so take this before the next model replaces it
+        expected = state(bucketed)
+
+        reference = build(ReferenceModel, agents, side, True, seed, float_prices)
+        for i in range(steps):
+            reference.step()
+        got = state(reference)
+        if float_prices:
+            same = got[:2] == expected[:2] and np.allclose(got[2], expected[2]) and got[3] == expected[3]
+        else:
+            same = got[:2] == expected[:2] and np.array_equal(got[2], expected[2]) and got[3] == expected[3]
+        print("%-14s prices: bucketed pass matches Trader.trade: %s" % ("float" if float_prices else "integer",
+                                                                        "yes" if same else "NO"))
+
+def time_steps(agents, side, bucketed, steps, seed):
+    model = build(FreshModel.FinanceModel, agents, side, bucketed, seed)
+    start = time.perf_counter()
+    for i in range(steps):
+        model.step()
+    return (time.perf_counter() - start) / steps
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bucketed cellmate trading in FreshModel")
+    parser.add_argument("--agents", type=int, default=20000)
+    parser.add_argument("--side", type=int, default=20, help="width and height of the torus")
+    parser.add_argument("--steps", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    check(min(args.agents, 5000), max(2, args.side // 2), 5, args.seed)
+    print()
+    print("%d agents on a %d x %d torus, %.0f per cell" % (args.agents, args.side, args.side,
+                                                           args.agents / args.side ** 2))
+    sequential = time_steps(args.agents, args.side, False, args.steps, args.seed)
+    bucketed = time_steps(args.agents, args.side, True, args.steps, args.seed)
+    print("%-12s %12s" % ("trading", "s per step"))
+    print("%-12s %12.3f" % ("sequential", sequential))
+    print("%-12s %12.3f" % ("bucketed", bucketed))
+    print("speedup %.1fx" % (sequential / bucketed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Compare ModifiedModel's buffered buyer selection with a list-building one
+#
+# ListTrader.sell is the selection the old code meant to do, which crashed:
+# the neighbors from get_neighbors, filtered into a new list, and
+# random.choice. Both versions make the same draw, so runs from one seed must
+# end in the same state. Allocation is measured with tracemalloc as the peak
+# of memory allocated by each sell() call, summed over a sample of calls.
+#
+#   python benchmarks/bench_buyer_selection.py
+#   python benchmarks/bench_buyer_selection.py --agents 100000 --steps 5
+import argparse
+import math
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ModifiedModel
+from BatchRun import create_model
+
+# Define a Trader that selects its buyer by building lists
+class ListTrader(ModifiedModel.Trader):
+    __slots__ = ()
+
+    def sell(self):
+        neighbors = self.model.grid.get_neighbors(self.pos, include_center=False, moore=True)
+        buyers = [agent for agent in neighbors if isinstance(agent, ModifiedModel.Trader) and agent.price >= self.price]
+        if buyers:
+            buyer = self.random.choice(buyers)
+            buyer.wealth -= self.price
+            self.wealth += self.price
+            self.model.total_transactions += 1
+
+def build(agents, seed, lists):
+    side = math.ceil(math.sqrt(agents))
+    model = create_model(ModifiedModel.FinanceModel, dict(N=agents, width=side, height=side), seed)
+    if lists:
+        for agent in model.schedule.agents:
+            agent.__class__ = ListTrader
+    return model
+
+def run(agents, steps, seed, lists):
+    model = build(agents, seed, lists)
+    start = time.perf_counter()
+    for i in range(steps):
+        model.step()
+    rate = steps / (time.perf_counter() - start)
+    state = [(agent.unique_id, agent.pos, agent.wealth) for agent in model.schedule.agents]
+    return rate, state + [model.total_transactions]
+
+# Get the bytes allocated per sell() call, as the mean of the per-call tracemalloc peaks
+def allocation(agents, calls, seed, lists):
+    model = build(agents, seed, lists)
+    sample = model.schedule.agents[:calls]
+    # Warm up the buffer and the neighborhood tables outside the measurement
+    for agent in sample:
+        agent.sell()
+    tracemalloc.start()
+    total = 0
+    for agent in sample:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        agent.sell()
+        total += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return total / len(sample)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark buyer selection in ModifiedModel")
+    parser.add_argument("--agents", type=int, default=100000)
+    parser.add_argument("--steps", type=int, default=3)
+    parser.add_argument("--calls", type=int, default=10000, help="sell() calls measured with tracemalloc")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    list_rate, expected = run(args.agents, args.steps, args.seed, lists=True)
+    buffer_rate, state = run(args.agents, args.steps, args.seed, lists=False)
+    list_bytes = allocation(args.agents, args.calls, args.seed, lists=True)
+    buffer_bytes = allocation(args.agents, args.calls, args.seed, lists=False)
+
+    print("%d agents, one trader per cell on average" % args.agents)
+    print("%-10s %10s %16s" % ("selection", "steps/s", "bytes per sell"))
+    print("%-10s %10.3f %16.1f" % ("lists", list_rate, list_bytes))
+    print("%-10s %10.3f %16.1f" % ("buffer", buffer_rate, buffer_bytes))
+    print("speedup %.2fx, same result: %s" % (buffer_rate / list_rate, "yes" if state == expected else "NO"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# Measure checkpoint write and read time, and check that resumed runs match
+#
+# The timing run builds an AgentModel.TraderModel with --agents traders (1M by
+# default, on a grid twice that size), steps it once and writes and reads a
+# checkpoint. The check runs each model for --steps steps straight, and again
+# with a checkpoint written and loaded half way, and compares the final states.
+#
+#   python benchmarks/bench_checkpoint.py
+#   python benchmarks/bench_checkpoint.py --agents 100000 --skip-check
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AgentModel
+import FinanceModel
+import FinanceTraderModel
+import FreshModel
+import Investors
+import MyModel
+import SimpleModel
+import VectorizedModel
+from BatchRun import create_model
+from Checkpoint import agent_attributes, load_checkpoint, model_agents, save_checkpoint
+
+TRADER_PARAMS = {"initial_price": 100, "cash_per_trader": 1000, "inventory_per_trader": 10, "strategy": "Random"}
+
+MODELS = {
+    "AgentModel": (AgentModel.TraderModel, dict(num_traders=200, width=20, height=20, **TRADER_PARAMS)),
+    "AgentModel (book)": (AgentModel.TraderModel, dict(num_traders=200, width=20, height=20, order_book=True,
+                                                       **TRADER_PARAMS)),
+    "SimpleModel": (SimpleModel.TraderModel, dict(num_traders=200, width=20, height=20, initial_price=100,
+                                                  initial_inventory=10, cash_per_trader=1000,
+                                                  inventory_per_trader=10)),
+    "FinanceModel": (FinanceModel.FinanceModel, dict(N=200, width=10, height=10)),
+    "FreshModel": (FreshModel.FinanceModel, dict(N=200, width=10, height=10, starting_wealth=100,
+                                                 starting_price=1)),
+    "FinanceTraderModel": (FinanceTraderModel.FinanceTraderModel, dict(num_traders=200, initial_market_price=10,
+                                                                       initial_market_volume=100)),
+    "Investors": (Investors.StockMarket, dict(num_investors=20, num_firms=5)),
+    "MyModel": (MyModel.MyModel, dict(num_agents=500, width=20, height=20, batched=True)),
+    "VectorizedModel": (VectorizedModel.VectorizedTraderModel, dict(num_traders=200, width=20, height=20,
+                                                                    initial_price=100, cash_per_trader=1000,
+                                                                    inventory_per_trader=10, strategy="Random")),
+}
+
+# Reduce a model's state to plain values that can be compared
+def fingerprint(model):
+    state = []
+    for agent in model_agents(model):
+        state.append((type(agent).__name__, sorted((k, v) for k, v in agent_attributes(agent).items()
+                                                   if isinstance(v, (int, float, str, tuple)))))
+    for name, value in sorted(vars(model).items()):
+        if isinstance(value, np.ndarray):
+            state.append((name, value.tobytes()))
+        elif isinstance(value, (int, float, str)):
+            state.append((name, value))
+    collector = getattr(model, "datacollector", None)
+    if collector is not None:
+        state.append(sorted(collector.model_vars.items()))
+        state.extend((name, collector.get_agent_var(name).tobytes()) for name in sorted(collector.agent_vars))
+    if hasattr(model, "random"):
+        state.append(model.random.getstate())
+    state.append(random.getstate())
+    return state
+
+def check(steps, seed):
+    print("%-20s %s" % ("model", "resumed run"))
+    for name, (model_class, params) in MODELS.items():
+        straight = create_model(model_class, params, seed)
+        for i in range(steps):
+            straight.step()
+        # Mesa keeps the RNG on the model class, so take this before the next model replaces it
+        expected = fingerprint(straight)
+
+        model = create_model(model_class, params, seed)
+        for i in range(steps // 2):
+            model.step()
+        with tempfile.TemporaryDirectory() as directory:
+            save_checkpoint(model, os.path.join(directory, "checkpoint"))
+            del model
+            resumed = load_checkpoint(os.path.join(directory, "checkpoint"))
+            for i in range(steps - steps // 2):
+                resumed.step()
+            same = fingerprint(resumed) == expected
+        print("%-20s %s" % (name, "identical" if same else "DIFFERENT"))
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark checkpoint write and read")
+    parser.add_argument("--agents", type=int, default=1000000)
+    parser.add_argument("--steps", type=int, default=20, help="steps of the resume check")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-check", action="store_true")
+    args = parser.parse_args()
+
+    if not args.skip_check:
+        check(args.steps, args.seed)
+        print()
+
+    side = math.ceil(math.sqrt(2 * args.agents))
+    start = time.perf_counter()
+    params = dict(num_traders=args.agents, width=side, height=side, **TRADER_PARAMS)
+    model = create_model(AgentModel.TraderModel, params, args.seed)
+    model.step()
+    print("AgentModel with %d traders on a %d x %d grid, built and stepped once in %.1f s"
+          % (args.agents, side, side, time.perf_counter() - start))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "checkpoint")
+        start = time.perf_counter()
+        save_checkpoint(model, path)
+        write = time.perf_counter() - start
+        del model
+
+        start = time.perf_counter()
+        model = load_checkpoint(path, mmap=True)
+        read = time.perf_counter() - start
+        start = time.perf_counter()
+        model.step()
+        first_step = time.perf_counter() - start
+
+        print("%-12s %10s %10s %14s %10s" % ("write s", "read s", "size MB", "first step s", "agents"))
+        print("%-12.2f %10.2f %10.1f %14.2f %10d" % (write, read, directory_size(path) / 2**20, first_step,
+                                                    len(model_agents(model))))
+
+if __name__ == "__main__":
+    main()
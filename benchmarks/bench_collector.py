@@ -0,0 +1,83 @@
+# Compare collection time and memory of mesa's DataCollector and ArrayCollector
+#
+# Both collectors record one model variable and two agent variables for every
+# agent. Memory is measured with tracemalloc in a second run, so it does not
+# slow the timed run.
+#
+#   python benchmarks/bench_collector.py
+#   python benchmarks/bench_collector.py --agents 10000 --steps 10000 --skip-mesa
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mesa import Agent, Model
+from mesa.datacollection import DataCollector
+from mesa.time import BaseScheduler
+
+from ArrayCollector import ArrayCollector
+
+# Define a model with nothing but agents to collect from
+class CollectModel(Model):
+    def __init__(self, num_agents):
+        self.schedule = BaseScheduler(self)
+        self.total = 0
+        for i in range(num_agents):
+            a = Agent(i, self)
+            a.wealth = float(i)
+            a.price = i % 10
+            self.schedule.add(a)
+
+def collectors(spill_dir):
+    model_reporters = {"Total": "total"}
+    agent_reporters = {"Wealth": "wealth", "Price": "price"}
+    return {
+        "DataCollector": lambda: DataCollector(model_reporters, agent_reporters),
+        "ArrayCollector": lambda: ArrayCollector(model_reporters, agent_reporters),
+        "ArrayCollector+spill": lambda: ArrayCollector(model_reporters, agent_reporters,
+                                                        spill_dir=spill_dir, spill_steps=256),
+    }
+
+# Collect for a number of steps, returning seconds and the collector
+def run(model, make_collector, steps):
+    collector = make_collector()
+    elapsed = 0.0
+    for step in range(steps):
+        model.schedule.steps = step
+        start = time.perf_counter()
+        collector.collect(model)
+        elapsed += time.perf_counter() - start
+    return elapsed, collector
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark agent data collection")
+    parser.add_argument("--agents", type=int, default=10000)
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--skip-mesa", action="store_true", help="do not run mesa's DataCollector")
+    args = parser.parse_args()
+
+    model = CollectModel(args.agents)
+    print("%d agents x %d steps" % (args.agents, args.steps))
+    print("%-22s %12s %14s %14s" % ("collector", "ms/collect", "total s", "memory MB"))
+    with tempfile.TemporaryDirectory() as spill_dir:
+        for name, make_collector in collectors(spill_dir).items():
+            if args.skip_mesa and name == "DataCollector":
+                continue
+            elapsed, collector = run(model, make_collector, args.steps)
+            del collector
+
+            tracemalloc.start()
+            collector = run(model, make_collector, args.steps)[1]
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del collector
+
+            print("%-22s %12.3f %14.2f %14.1f" % (
+                name, elapsed / args.steps * 1e3, elapsed, memory / 2 ** 20))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# Measure the cold import time of every model module with python -X importtime
+#
+# Each import runs in a fresh interpreter, as it would in a new batch worker.
+# The "with viz" column imports mesa.visualization next to the model, which is
+# what every model module used to do at import time; the difference is the
+# start-up each worker now saves.
+#
+#   python benchmarks/bench_import_time.py
+#   python benchmarks/bench_import_time.py --repeats 20 AgentModel FreshModel
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ["AgentModel", "SimpleModel", "FinanceModel", "FreshModel", "ModifiedModel",
+           "FinanceTraderModel", "Investors", "MyModel", "VectorizedModel", "BatchRun"]
+
+VIZ = "mesa.visualization.ModularVisualization"
+
+# Import the given modules in a fresh interpreter and get the cumulative import time in seconds
+def import_time(modules):
+    code = "; ".join("import " + module for module in modules)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Only top-level imports, whose cumulative time already covers their children
+        if not name[1:].startswith(" "):
+            total += int(cumulative_us)
+    return total / 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold import times of the model modules")
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    print("median of %d cold imports" % args.repeats)
+    print("%-20s %10s %11s %8s" % ("module", "core ms", "with viz ms", "saved"))
+    for module in args.modules:
+        core = statistics.median(import_time([module]) for i in range(args.repeats))
+        viz = statistics.median(import_time([module, VIZ]) for i in range(args.repeats))
+        print("%-20s %10.1f %11.1f %7.0f%%" % (module, core * 1e3, viz * 1e3, (1 - core / viz) * 100))
+
+if __name__ == "__main__":
+    main()
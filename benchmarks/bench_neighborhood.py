@@ -0,0 +1,54 @@
+# Compare per-step neighborhood lookups of mesa's MultiGrid and Neighborhood.TableMultiGrid
+#
+# One step moves every agent to a random Moore neighbor cell and then collects
+# its neighbors, which is what the traders of FreshModel and ModifiedModel do.
+#
+#   python benchmarks/bench_neighborhood.py
+#   python benchmarks/bench_neighborhood.py --side 100 --agents 10000
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mesa import Agent
+from mesa.space import MultiGrid
+
+from Neighborhood import TableMultiGrid
+
+# Move and trade every agent once, returning the seconds taken
+def step(grid, agents, rng):
+    start = time.perf_counter()
+    for agent in agents:
+        possible_steps = grid.get_neighborhood(agent.pos, moore=True, include_center=False)
+        grid.move_agent(agent, rng.choice(possible_steps))
+        grid.get_neighbors(agent.pos, moore=True, include_center=False)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark precomputed neighborhood tables")
+    parser.add_argument("--side", type=int, default=1000)
+    parser.add_argument("--agents", type=int, default=1000000)
+    parser.add_argument("--steps", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("%d x %d grid, %d agents" % (args.side, args.side, args.agents))
+    print("%-8s %-16s %12s %12s" % ("torus", "grid", "first step s", "later step s"))
+    for torus in (True, False):
+        for grid_class in (MultiGrid, TableMultiGrid):
+            rng = random.Random(args.seed)
+            grid = grid_class(args.side, args.side, torus)
+            agents = [Agent(i, None) for i in range(args.agents)]
+            for agent in agents:
+                grid.place_agent(agent, (rng.randrange(args.side), rng.randrange(args.side)))
+
+            # The first step fills mesa's lazy cache and builds the tables
+            first = step(grid, agents, rng)
+            later = sum(step(grid, agents, rng) for i in range(args.steps - 1)) / max(1, args.steps - 1)
+            print("%-8s %-16s %12.2f %12.2f" % (torus, grid_class.__name__, first, later))
+
+if __name__ == "__main__":
+    main()
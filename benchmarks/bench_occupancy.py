@@ -0,0 +1,84 @@
+# Compare empty-cell lookups of mesa's MultiGrid and Occupancy.IndexedMultiGrid
+#
+#   python benchmarks/bench_occupancy.py
+#   python benchmarks/bench_occupancy.py --side 200 --occupancy 0.5 0.99
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mesa import Agent
+from mesa.space import MultiGrid
+
+from Occupancy import IndexedMultiGrid
+
+# Place agents the way SimpleModel used to, retrying until a cell is empty
+def place_by_rejection(grid, agents, rng):
+    for agent in agents:
+        x = rng.randrange(grid.width)
+        y = rng.randrange(grid.height)
+        while not grid.is_cell_empty((x, y)):
+            x = rng.randrange(grid.width)
+            y = rng.randrange(grid.height)
+        grid.place_agent(agent, (x, y))
+
+# Place agents on distinct empty cells sampled without replacement
+def place_by_sampling(grid, agents, rng):
+    for agent, cell in zip(agents, grid.sample_empty_cells(len(agents), rng)):
+        grid.place_agent(agent, cell)
+
+# Pick a random empty neighbor the way Trader.move used to
+def scan_empty_neighbor(grid, pos, rng):
+    cells = [cell for cell in grid.get_neighborhood(pos, moore=True, include_center=False) if grid.is_cell_empty(cell)]
+    return rng.choice(cells) if cells else None
+
+# Time a function over a number of calls and return microseconds per call
+def per_call(function, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        function(i)
+    return (time.perf_counter() - start) / calls * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the occupancy index")
+    parser.add_argument("--side", type=int, default=100)
+    parser.add_argument("--occupancy", type=float, nargs="+", default=[0.5, 0.9, 0.99])
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    side = args.side
+    print("%6s | %-24s | %-24s | %-24s" % ("", "place all (ms)", "empty neighbor (us)", "empty cell (us)"))
+    print("%6s | %11s %12s | %11s %12s | %11s %12s" % (
+        "full", "rejection", "sampling", "scan", "index", "sorted set", "index"))
+    for fraction in args.occupancy:
+        rng = random.Random(args.seed)
+        agents = [Agent(i, None) for i in range(int(side * side * fraction))]
+
+        # Initialise the grid both ways
+        grid = MultiGrid(side, side, False)
+        start = time.perf_counter()
+        place_by_rejection(grid, agents, rng)
+        rejection = (time.perf_counter() - start) * 1e3
+
+        indexed = IndexedMultiGrid(side, side, False)
+        start = time.perf_counter()
+        place_by_sampling(indexed, agents, rng)
+        sampling = (time.perf_counter() - start) * 1e3
+
+        # Look up empty cells around random agents, and anywhere on the grid
+        positions = [agents[rng.randrange(len(agents))].pos for i in range(args.calls)]
+        scan = per_call(lambda i: scan_empty_neighbor(indexed, positions[i], rng), args.calls)
+        index = per_call(lambda i: indexed.random_empty_neighbor(positions[i], True, rng), args.calls)
+        calls = max(1, args.calls // 100)
+        sorted_set = per_call(lambda i: rng.choice(sorted(indexed.empties)), calls)
+        free_list = per_call(lambda i: indexed.random_empty_cell(rng), args.calls)
+
+        print("%5.0f%% | %11.1f %12.1f | %11.2f %12.2f | %11.2f %12.2f" % (
+            fraction * 100, rejection, sampling, scan, index, sorted_set, free_list))
+
+if __name__ == "__main__":
+    main()
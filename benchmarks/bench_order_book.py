@@ -0,0 +1,65 @@
+# Measure orders/sec of OrderBook at several batch sizes
+#
+# The orders of each batch come from --traders traders, so some of a trader's
+# bids cross its own asks; the check requires that none of the fills is a
+# trade of a trader with itself.
+#
+#   python benchmarks/bench_order_book.py
+#   python benchmarks/bench_order_book.py --sizes 1000 100000
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from OrderBook import OrderBook, BUY, SELL
+
+# Generate a batch of orders around a mid price of 100
+def random_orders(n, seed, traders):
+    rng = random.Random(seed)
+    orders = []
+    for i in range(n):
+        side = BUY if rng.random() < 0.5 else SELL
+        # Bids sit a little below the mid price and asks a little above, so the book half crosses
+        offset = -0.5 if side == BUY else 0.5
+        price = round(100 + offset + rng.gauss(0, 1), 2)
+        orders.append((rng.randrange(traders), side, rng.randint(1, 10), price))
+    return orders
+
+# Time submitting one batch and clearing it
+def run(n, seed, traders, batched):
+    orders = random_orders(n, seed, traders)
+    book = OrderBook()
+    start = time.perf_counter()
+    if batched:
+        book.submit_many(*zip(*orders))
+    else:
+        for order in orders:
+            book.submit(*order)
+    submitted = time.perf_counter()
+    fills = book.clear()
+    cleared = time.perf_counter()
+    if any(buyer == seller for buyer, seller, quantity, price in fills):
+        sys.exit("check failed: a trader traded with itself")
+    return submitted - start, cleared - submitted, len(fills), book
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the limit order book")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--traders", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("%10s %8s %14s %14s %14s %10s %10s %10s" % (
+        "orders", "mode", "submit ord/s", "clear ord/s", "total ord/s", "fills", "cancelled", "price"))
+    for n in args.sizes:
+        for batched in (False, True):
+            submit, clear, fills, book = run(n, args.seed, args.traders, batched)
+            print("%10d %8s %14.0f %14.0f %14.0f %10d %10d %10.3f" % (
+                n, "batch" if batched else "single", n / submit, n / clear, n / (submit + clear),
+                fills, book.cancelled, book.clearing_price))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Compare the step time of FinanceModel with and without its price index
+#
+# The scan variant finds counterparties the way FinanceModel used to, by
+# scanning every agent; doubling N should roughly quadruple its step time,
+# while the indexed model's step time only grows as N log N.
+#
+#   python benchmarks/bench_price_index.py
+#   python benchmarks/bench_price_index.py --sizes 1000 2000 4000 8000 16000
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from FinanceModel import FinanceModel, Trader
+
+# Define a trader that scans all agents for counterparties
+class ScanTrader(Trader):
+    __slots__ = ()
+
+    def buy(self):
+        sellers = [agent for agent in self.model.schedule.agents if agent.price < self.price]
+        if not sellers:
+            return
+        seller = self.random.choice(sellers)
+        transfer_amount = min(self.wealth - self.price, seller.price - seller.wealth)
+        seller.wealth += transfer_amount
+
+    def sell(self):
+        buyers = [agent for agent in self.model.schedule.agents if agent.price > self.price]
+        if not buyers:
+            return
+        buyer = self.random.choice(buyers)
+        transfer_amount = min(buyer.wealth - buyer.price, self.price - self.wealth)
+        buyer.wealth -= transfer_amount
+
+# Time the average step of a model
+def step_time(n, scan, steps, seed):
+    model = FinanceModel(N=n, width=100, height=100)
+    model.random.seed(seed)
+    if scan:
+        for agent in model.schedule.agents:
+            agent.__class__ = ScanTrader
+    start = time.perf_counter()
+    for i in range(steps):
+        model.step()
+    return (time.perf_counter() - start) / steps
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FinanceModel counterparty search")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 4000, 8000])
+    parser.add_argument("--steps", type=int, default=3)
+    parser.add_argument("--scan-max", type=int, default=16000,
+                        help="largest N to run the scanning variant at")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("%8s %12s %8s %12s %8s" % ("N", "scan s/step", "growth", "index s/step", "growth"))
+    previous = None
+    for n in args.sizes:
+        scan = step_time(n, True, args.steps, args.seed) if n <= args.scan_max else None
+        index = step_time(n, False, args.steps, args.seed)
+
+        # Report each time's growth as the exponent k in time ~ N^k
+        if previous is None:
+            growth = ("", "")
+        else:
+            ratio = math.log(n / previous[0])
+            growth = tuple("%.2f" % (math.log(t / p) / ratio) if t and p else "" for t, p in zip((scan, index), previous[1:]))
+        print("%8d %12s %8s %12.4f %8s" % (n, "%.4f" % scan if scan else "-", growth[0], index, growth[1]))
+        previous = (n, scan, index)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Profile the steps of the instrumented models and measure the profiler's overhead
+#
+# Each model runs once without and once with a Profiler attached, from the
+# same seed. The profiled run must end in the same state; its report is
+# printed and, with --out, written as JSON and as collapsed stacks for
+# flamegraph.pl or speedscope. The isolation check attaches two models of
+# each kind and steps a third, unprofiled one: only the attached models may
+# be timed, no agent method may be wrapped twice, and the agent classes must
+# get their methods back at the end of the with block.
+#
+#   python benchmarks/bench_profiler.py
+#   python benchmarks/bench_profiler.py --agents 10000 --steps 20 --out profiles
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AgentModel
+import FinanceTraderModel
+import FreshModel
+from BatchRun import create_model
+from Checkpoint import agent_attributes
+from Profiler import Profiler
+
+def models(agents):
+    side = int((2 * agents) ** 0.5) + 1
+    return {
+        "AgentModel": (AgentModel.TraderModel, dict(num_traders=agents, width=side, height=side, initial_price=100,
+                                                    cash_per_trader=1000, inventory_per_trader=10,
+                                                    strategy="Random")),
+        "FinanceTraderModel": (FinanceTraderModel.FinanceTraderModel, dict(num_traders=agents,
+                                                                           initial_market_price=10,
+                                                                           initial_market_volume=100)),
+        "FreshModel": (FreshModel.FinanceModel, dict(N=agents, width=side // 4, height=side // 4,
+                                                     starting_wealth=100, starting_price=1)),
+    }
+
+# Run a model and get its seconds per step and the final state of its agents
+def run(model_class, params, steps, seed, profiler=None):
+    model = create_model(model_class, dict(params, profiler=profiler), seed)
+    start = time.perf_counter()
+    for i in range(steps):
+        model.step()
+    seconds = (time.perf_counter() - start) / steps
+    state = [sorted((k, v) for k, v in agent_attributes(agent).items() if k != "model")
+             for agent in model.schedule.agents]
+    return seconds, repr(state)
+
+# Get the methods the profiler wraps on the agent classes of a model
+def agent_methods(model):
+    return {(cls, method): cls.__dict__.get(method) for cls in {type(agent) for agent in model.schedule.agents}
+            for method in getattr(model, "profile_agent_methods", ())}
+
+def check_isolation(model_class, params, seed):
+    plain = create_model(model_class, params, seed)
+    methods = agent_methods(plain)
+    with Profiler() as profiler:
+        profiled = create_model(model_class, dict(params, profiler=profiler), seed)
+        create_model(model_class, dict(params, profiler=profiler), seed)
+        plain.step()
+        isolated = not profiler.stats
+        profiled.step()
+        once = all(a != b for stack in profiler.stats for a, b in zip(stack, stack[1:]))
+    return isolated and once and agent_methods(plain) == methods
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile model steps and measure the profiler overhead")
+    parser.add_argument("--agents", type=int, default=2000)
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="directory for the JSON and collapsed-stack profiles")
+    args = parser.parse_args()
+
+    for name, (model_class, params) in models(args.agents).items():
+        plain, expected = run(model_class, params, args.steps, args.seed)
+        if not check_isolation(model_class, params, args.seed):
+            sys.exit("check failed: the profiler leaks into other models of %s" % name)
+        with Profiler() as profiler:
+            profiled, state = run(model_class, params, args.steps, args.seed, profiler)
+
+        print("%s, %d agents: %.4f s per step, %.4f s profiled (%+.0f%%), same result: %s"
+              % (name, args.agents, plain, profiled, (profiled / plain - 1) * 100, "yes" if state == expected else "NO"))
+        print(profiler.report())
+        print()
+        if args.out:
+            os.makedirs(args.out, exist_ok=True)
+            profiler.to_json(os.path.join(args.out, name + ".json"))
+            profiler.write_collapsed(os.path.join(args.out, name + ".collapsed"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# Measure the cost of draws from RandomStreams and check that its streams are reproducible
+#
+# The per-draw table times the single draws the models' move() methods make,
+# choice of a neighbouring cell and uniform offsets, from the random module, a
+# random.Random, a NumPy generator called once per draw and a BufferedStream.
+# The move table times one move() of every agent of each model that has one,
+# with its usual source of moves and with a RandomStreams stream. The check
+# draws the streams of many ids in order, in reverse and spread over worker
+# processes: each id must get the same numbers every time.
+#
+#   python benchmarks/bench_random_streams.py
+#   python benchmarks/bench_random_streams.py --draws 1000000 --agents 100000
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+from itertools import repeat
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AgentModel
+import FreshModel
+import ModifiedModel
+import SimpleModel
+from BatchRun import create_model
+from MyModel import MyModel
+from RandomStreams import RandomStreams
+
+CELLS = [(x, y) for x in range(3) for y in range(3) if (x, y) != (1, 1)]
+
+# Get the mean time of a draw in ns
+def per_draw(draw, args, count):
+    start = time.perf_counter()
+    for i in repeat(None, count):
+        draw(*args)
+    return (time.perf_counter() - start) / count * 1e9
+
+# Draw from the streams of some ids; run in worker processes too
+def draw_streams(task):
+    seed, ids = task
+    streams = RandomStreams(seed)
+    return {i: streams.generator(i).random(4).tolist() + [streams.stream(i).random()] for i in ids}
+
+def check(seed, count, workers):
+    ids = list(range(count))
+    in_order = draw_streams((seed, ids))
+    reversed_order = draw_streams((seed, ids[::-1]))
+    with multiprocessing.Pool(workers) as pool:
+        spread = {}
+        for part in pool.map(draw_streams, [(seed, ids[k::workers]) for k in range(workers)]):
+            spread.update(part)
+    return in_order == reversed_order == spread
+
+# Each model with the parameters of a grid of about agents traders
+def models(agents):
+    side = math.ceil(math.sqrt(agents))
+    trader = dict(num_traders=agents, width=side, height=side, initial_price=100, cash_per_trader=1000,
+                  inventory_per_trader=10)
+    return {
+        "AgentModel": (AgentModel.TraderModel, dict(strategy="Random", **trader)),
+        "SimpleModel": (SimpleModel.TraderModel, dict(initial_inventory=10, **trader)),
+        "FreshModel": (FreshModel.FinanceModel, dict(N=agents, width=side, height=side, starting_wealth=3,
+                                                     starting_price=1)),
+        "ModifiedModel": (ModifiedModel.FinanceModel, dict(N=agents, width=side, height=side)),
+        "MyModel": (MyModel, dict(num_agents=agents, width=side, height=side)),
+    }
+
+# Time one move() of every agent, after an untimed one, in ns per agent
+def time_moves(model_class, params, seed, streams):
+    model = create_model(model_class, dict(params, streams=RandomStreams(seed) if streams else None), seed)
+    agents = list(model.schedule.agents) if hasattr(model, "schedule") else model.agents
+    for agent in agents:
+        agent.move()
+    start = time.perf_counter()
+    for agent in agents:
+        agent.move()
+    return (time.perf_counter() - start) / len(agents) * 1e9
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the draws of RandomStreams")
+    parser.add_argument("--draws", type=int, default=1000000)
+    parser.add_argument("--agents", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("streams of 1000 ids reproducible in any order and over %d workers: %s"
+          % (args.workers, "yes" if check(args.seed, 1000, args.workers) else "NO"))
+    print()
+
+    random.seed(args.seed)
+    generator = np.random.default_rng(args.seed)
+    stream = RandomStreams(args.seed).stream(0)
+    sources = [
+        ("random module", random.choice, random.uniform),
+        ("random.Random", random.Random(args.seed).choice, random.Random(args.seed).uniform),
+        ("numpy generator", lambda seq: seq[generator.integers(len(seq))], generator.uniform),
+        ("BufferedStream", stream.choice, stream.uniform),
+    ]
+    print("%-16s %12s %12s" % ("source", "choice ns", "uniform ns"))
+    for name, choice, uniform in sources:
+        print("%-16s %12.1f %12.1f" % (name, per_draw(choice, (CELLS,), args.draws),
+                                       per_draw(uniform, (-1, 1), args.draws)))
+    print()
+
+    print("%d agents" % args.agents)
+    print("%-14s %14s %14s %8s" % ("model", "default ns", "streams ns", "change"))
+    for name, (model_class, params) in models(args.agents).items():
+        default = time_moves(model_class, params, args.seed, False)
+        streams = time_moves(model_class, params, args.seed, True)
+        print("%-14s %14.1f %14.1f %7.0f%%" % (name, default, streams, (streams / default - 1) * 100))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# Measure the memory and access time of the slotted Trader classes
+#
+# For each model's Trader, --agents traders are built directly (with a stand-in
+# for the model), then copied twice while tracemalloc counts the bytes per
+# agent: into the slotted class itself, and into a plain mesa Agent holding the
+# same fields in a __dict__, which is how the traders were stored before. The
+# copies share the field values, so only the layouts are compared. Access time is a pass that
+# reads one numeric field of every agent and one that updates it, both in a
+# shuffled order like RandomActivation's: smaller agents put more of them in
+# each cache line and page, which shows up as shorter passes.
+#
+#   python benchmarks/bench_slot_agents.py
+#   python benchmarks/bench_slot_agents.py --agents 100000
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from operator import attrgetter
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mesa import Agent
+
+import AgentModel
+import FinanceModel
+import FinanceTraderModel
+import FreshModel
+import ModifiedModel
+import SimpleModel
+from Checkpoint import _slot_names
+
+# Each Trader class with a function that builds one, and the numeric field the passes use
+TRADERS = {
+    "AgentModel": (AgentModel.Trader, lambda i, model: AgentModel.Trader(i, model, 1000, 10, "Random"), "cash"),
+    "SimpleModel": (SimpleModel.Trader, lambda i, model: SimpleModel.Trader(i, model, 1000, 10, False), "cash"),
+    "FinanceModel": (FinanceModel.Trader, lambda i, model: FinanceModel.Trader(i, model, 100.5, i % 10), "wealth"),
+    "FreshModel": (FreshModel.Trader, lambda i, model: FreshModel.Trader(i, model, 100.5, i % 10), "wealth"),
+    "ModifiedModel": (ModifiedModel.Trader, lambda i, model: ModifiedModel.Trader(i, model, 100.5, i % 10), "wealth"),
+    "FinanceTraderModel": (FinanceTraderModel.Trader, lambda i, model: FinanceTraderModel.Trader(i, model), "wealth"),
+}
+
+# Copy an agent's fields into a new agent of a class
+#
+# Each trader class gets its own plain Agent subclass, as it had before, so that
+# its instances share their dict keys only with each other.
+def copy_agent(cls, agent, names):
+    copy = cls.__new__(cls)
+    for name in names:
+        setattr(copy, name, getattr(agent, name))
+    return copy
+
+# Build agents under tracemalloc and get them with the bytes allocated per agent
+def measure(build, count):
+    gc.collect()
+    tracemalloc.start()
+    agents = [build(i) for i in range(count)]
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return agents, (allocated - sys.getsizeof(agents)) / count
+
+# Time a read pass and an update pass over the agents in a shuffled order, in ns per agent
+def passes(agents, field, seed):
+    order = agents[:]
+    random.Random(seed).shuffle(order)
+    start = time.perf_counter()
+    sum(map(attrgetter(field), order))
+    read = time.perf_counter() - start
+    start = time.perf_counter()
+    for agent in order:
+        setattr(agent, field, getattr(agent, field) + 1)
+    update = time.perf_counter() - start
+    return read / len(agents) * 1e9, update / len(agents) * 1e9
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the memory and access time of slotted Trader classes")
+    parser.add_argument("--agents", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    model = SimpleNamespace(current_price=100, market_price=10, random=random.Random(args.seed))
+    print("%d agents per class" % args.agents)
+    print("%-20s %-6s %10s %10s %10s" % ("trader", "layout", "bytes", "read ns", "update ns"))
+    for name, (cls, make, field) in TRADERS.items():
+        random.seed(args.seed)
+        agents = [make(i, model) for i in range(args.agents)]
+        names = ["unique_id", "model", "pos"] + [n for n in _slot_names(cls) if n not in ("unique_id", "model", "pos")]
+        plain_class = type("Dict" + cls.__name__, (Agent,), {})
+        slotted, slotted_bytes = measure(lambda i: copy_agent(cls, agents[i], names), args.agents)
+        plain, plain_bytes = measure(lambda i: copy_agent(plain_class, agents[i], names), args.agents)
+        del agents
+        plain_read, plain_update = passes(plain, field, args.seed)
+        del plain
+        slotted_read, slotted_update = passes(slotted, field, args.seed)
+        del slotted
+        print("%-20s %-6s %10.0f %10.1f %10.1f" % (name, "dict", plain_bytes, plain_read, plain_update))
+        print("%-20s %-6s %10.0f %10.1f %10.1f" % ("", "slots", slotted_bytes, slotted_read, slotted_update))
+        print("%-20s %-6s %9.0f%% %9.0f%% %9.0f%%" % ("", "change", (slotted_bytes / plain_bytes - 1) * 100,
+                                                     (slotted_read / plain_read - 1) * 100,
+                                                     (slotted_update / plain_update - 1) * 100))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# Compare the memory and speed of sparse and dense holdings stores
+#
+# Each size is a market of INVESTORSxFIRMS in which every investor holds about
+# --positions firms. The same positions go into a SparseHoldings and, when its
+# matrix fits under --dense-limit, a DenseHoldings store; where both are built
+# their results must agree. The timings are a mark-to-market of every
+# portfolio against a price vector, the holders of every firm in turn, and a
+# batch of updates like a clearing's: sales from held positions and purchases
+# of firms the buyers do not hold yet.
+#
+#   python benchmarks/bench_sparse_holdings.py
+#   python benchmarks/bench_sparse_holdings.py --sizes 1000000x5000 --positions 10 --dense-limit 8
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Holdings import DenseHoldings, SparseHoldings
+
+def parse_size(size):
+    investors, firms = size.lower().split("x")
+    return int(investors), int(firms)
+
+# Draw distinct (investor, firm) positions, about positions per investor, with 1 to 100 shares each
+def draw_positions(rng, investors, firms, positions):
+    keys = np.unique(rng.integers(investors * firms, size=investors * positions, dtype=np.int64))
+    shares = rng.integers(1, 101, size=len(keys))
+    return keys % investors, keys // investors, shares
+
+# Draw a batch of updates: sales of part of held positions and purchases of new ones
+def draw_updates(rng, store, investors, firms, count):
+    held = np.flatnonzero(store.shares)[rng.integers(np.count_nonzero(store.shares), size=count)]
+    held = np.unique(held)
+    sell_investor, sell_firm = store.investor[held].astype(np.int64), store.firm(held)
+    sell = -rng.integers(1, store.shares[held].astype(np.int64) + 1)
+    keys = np.setdiff1d(np.unique(rng.integers(investors * firms, size=count, dtype=np.int64)), store.keys)
+    buy = rng.integers(1, 101, size=len(keys))
+    return (np.concatenate((sell_investor, keys % investors)), np.concatenate((sell_firm, keys // investors)),
+            np.concatenate((sell, buy)))
+
+# Run each operation of a store and get the times and results
+def measure(store, prices, updates):
+    start = time.perf_counter()
+    values = store.mark_to_market(prices)
+    mark = time.perf_counter() - start
+
+    start = time.perf_counter()
+    holders = [store.holders(firm) for firm in range(store.num_firms)]
+    lookup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    store.add(*updates)
+    update = time.perf_counter() - start
+    after = store.mark_to_market(prices)
+    return (mark, lookup, update), (values, holders, after)
+
+def same(expected, result):
+    values, holders, after = expected
+    other_values, other_holders, other_after = result
+    return (np.allclose(values, other_values) and np.allclose(after, other_after)
+            and all(np.array_equal(a[0], b[0]) and np.array_equal(a[1], b[1]) for a, b in zip(holders, other_holders)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sparse against dense holdings")
+    parser.add_argument("--sizes", nargs="+", default=["100000x1000", "1000000x100", "1000000x5000"],
+                        help="markets as INVESTORSxFIRMS")
+    parser.add_argument("--positions", type=int, default=5, help="firms held per investor on average")
+    parser.add_argument("--updates", type=int, default=50000, help="positions changed in the update batch")
+    parser.add_argument("--dense-limit", type=float, default=2, help="largest dense matrix built, in GB")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("%12s %8s %10s %12s %12s %10s %8s" % ("size", "store", "MB", "mark ms", "holders ms", "update ms",
+                                                "same"))
+    for size in args.sizes:
+        investors, firms = parse_size(size)
+        rng = np.random.default_rng(args.seed)
+        investor, firm, shares = draw_positions(rng, investors, firms, args.positions)
+        prices = rng.uniform(1, 100, size=firms)
+
+        sparse = SparseHoldings(investors, firms)
+        sparse.load(investor, firm, shares)
+        updates = draw_updates(rng, sparse, investors, firms, args.updates)
+        times, expected = measure(sparse, prices, updates)
+        print("%12s %8s %10.1f %12.1f %12.1f %10.1f %8s" % (size, "sparse", sparse.nbytes() / 1e6,
+                                                            times[0] * 1e3, times[1] * 1e3, times[2] * 1e3, ""))
+        del sparse
+
+        dense_bytes = investors * firms * np.dtype(np.int32).itemsize
+        if dense_bytes > args.dense_limit * 1e9:
+            print("%12s %8s %10.1f %12s %12s %10s %8s" % ("", "dense", dense_bytes / 1e6, "-", "-", "-",
+                                                          "not built"))
+            continue
+        dense = DenseHoldings(investors, firms)
+        dense.load(investor, firm, shares)
+        times, result = measure(dense, prices, updates)
+        print("%12s %8s %10.1f %12.1f %12.1f %10.1f %8s" % ("", "dense", dense.nbytes() / 1e6, times[0] * 1e3,
+                                                            times[1] * 1e3, times[2] * 1e3,
+                                                            "yes" if same(expected, result) else "NO"))
+        del dense
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Compare finding all neighbor pairs with ContinuousSpace.get_neighbors and SpatialHash
+#
+# Agents are spread uniformly over a torus at one agent per unit area, so the
+# number of neighbors per agent stays the same at every size. The per-agent
+# get_neighbors baseline is O(N^2) and only runs up to --mesa-max agents, where
+# both pair sets are also checked to be the same.
+#
+#   python benchmarks/bench_spatial_hash.py
+#   python benchmarks/bench_spatial_hash.py --agents 10000 100000 1000000 --mesa-max 20000
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mesa import Agent
+from mesa.space import ContinuousSpace
+
+from SpatialHash import SpatialHash
+
+# Find all pairs the way MyAgent.interact used to: one get_neighbors per agent
+def mesa_pairs(space, agents, radius):
+    pairs = set()
+    for agent in agents:
+        for neighbor in space.get_neighbors(agent.pos, radius, include_center=False):
+            if agent.unique_id < neighbor.unique_id:
+                pairs.add((agent.unique_id, neighbor.unique_id))
+    return pairs
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark all-pairs neighbor queries in continuous space")
+    parser.add_argument("--agents", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--radius", type=float, default=1.0)
+    parser.add_argument("--mesa-max", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print("%10s %10s %12s %10s %10s %10s" % ("agents", "pairs", "mesa s", "rebuild s", "pairs s", "speedup"))
+    for n in args.agents:
+        side = float(np.sqrt(n))
+        points = rng.uniform(0, side, size=(n, 2))
+
+        index = SpatialHash(side, side, True, args.radius)
+        start = time.perf_counter()
+        index.rebuild(points)
+        rebuild = time.perf_counter() - start
+        start = time.perf_counter()
+        i, j, distance = index.pairs()
+        query = time.perf_counter() - start
+
+        if n <= args.mesa_max:
+            space = ContinuousSpace(side, side, torus=True)
+            agents = [Agent(k, None) for k in range(n)]
+            for agent, point in zip(agents, points):
+                space.place_agent(agent, tuple(point))
+            start = time.perf_counter()
+            expected = mesa_pairs(space, agents, args.radius)
+            mesa_time = time.perf_counter() - start
+            assert expected == set(zip(i.tolist(), j.tolist())), "pair sets differ"
+            assert np.allclose(distance, [space.get_distance(points[a], points[b]) for a, b in zip(i, j)])
+            baseline = "%12.2f" % mesa_time, "%9.0fx" % (mesa_time / (rebuild + query))
+        else:
+            baseline = "%12s" % "-", "%10s" % "-"
+        print("%10d %10d %s %10.3f %10.3f %s" % (n, len(i), baseline[0], rebuild, query, baseline[1]))
+
+if __name__ == "__main__":
+    main()
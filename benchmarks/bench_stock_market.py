@@ -0,0 +1,103 @@
+# Measure the batched auction of Investors.StockMarket and check it against a per-firm one
+#
+# The check draws the orders of several steps of a small market and clears
+# them twice: with StockMarket.clear, and with reference_clear, which walks
+# every firm and every candidate price with plain loops. Prices, cash and
+# holdings must come out the same. The timing runs markets of increasing size.
+#
+#   python benchmarks/bench_stock_market.py
+#   python benchmarks/bench_stock_market.py --sizes 1000000x100 100000x1000 --steps 20
+#   python benchmarks/bench_stock_market.py --sizes 1000000x5000 --sparse --holders 1000
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BatchRun import create_model
+from Investors import TICK, StockMarket
+
+# Clear one step's orders firm by firm, following the rules of StockMarket.clear
+def reference_clear(prices, cash, holdings, investor, firm, side, ticks, quantity):
+    orders = list(zip(investor.tolist(), firm.tolist(), side.tolist(), ticks.tolist(), quantity.tolist()))
+    for f in sorted(set(firm.tolist())):
+        mine = [(k, order) for k, order in enumerate(orders) if order[1] == f]
+        last = round(prices[f] / TICK)
+        best = None
+        for p in sorted({order[3] for k, order in mine}):
+            supply = sum(order[4] for k, order in mine if order[2] < 0 and order[3] <= p)
+            demand = sum(order[4] for k, order in mine if order[2] > 0 and order[3] >= p)
+            key = (-min(supply, demand), abs(demand - supply), abs(p - last))
+            if best is None or key < best[0]:
+                best = (key, p)
+        volume = -best[0][0]
+        price = best[1]
+        if volume == 0:
+            continue
+
+        # Best prices first, then the order the orders were drawn in
+        buys = sorted((k, order) for k, order in mine if order[2] > 0 and order[3] >= price)
+        buys.sort(key=lambda item: -item[1][3])
+        sells = sorted((k, order) for k, order in mine if order[2] < 0 and order[3] <= price)
+        sells.sort(key=lambda item: item[1][3])
+        for book, sign in ((buys, 1), (sells, -1)):
+            left = volume
+            for k, (i, f, s, t, q) in book:
+                fill = min(q, left)
+                left -= fill
+                holdings[i, f] += sign * fill
+                cash[i] -= sign * fill * (price * TICK)
+        prices[f] = price * TICK
+
+def check(seed, steps, sparse):
+    market = create_model(StockMarket, dict(num_investors=2000, num_firms=20, activity=0.3, sparse=sparse), seed)
+    for step in range(steps):
+        market.update_values()
+        orders = market.submit_orders()
+        prices, cash, holdings = market.prices.copy(), market.cash.copy(), market.holdings.toarray()
+        reference_clear(prices, cash, holdings, *orders)
+        market.clear(*orders)
+        if not (np.array_equal(prices, market.prices) and np.allclose(cash, market.cash)
+                and np.array_equal(holdings, market.holdings.toarray())):
+            return False
+    return True
+
+def parse_size(size):
+    investors, firms = size.lower().split("x")
+    return int(investors), int(firms)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the batched multi-asset auction")
+    parser.add_argument("--sizes", nargs="+", default=["10000x100", "100000x1000", "1000000x100"],
+                        help="markets as INVESTORSxFIRMS")
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--sparse", action="store_true", help="keep the holdings in a SparseHoldings store")
+    parser.add_argument("--holders", type=int, default=None, help="investors each firm's shares start with")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for sparse in (False, True):
+        print("batched auction with %s holdings matches the per-firm reference: %s"
+              % ("sparse" if sparse else "dense", "yes" if check(args.seed, 10, sparse) else "NO"))
+    print()
+    print("%10s %8s %10s %10s %10s %12s" % ("investors", "firms", "build s", "steps/s", "orders", "volume"))
+    for size in args.sizes:
+        investors, firms = parse_size(size)
+        start = time.perf_counter()
+        market = create_model(StockMarket, dict(num_investors=investors, num_firms=firms, initial_holders=args.holders,
+                                                  sparse=args.sparse), args.seed)
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        for i in range(args.steps):
+            market.step()
+        rate = args.steps / (time.perf_counter() - start)
+        model_vars = market.datacollector.model_vars
+        print("%10d %8d %10.2f %10.2f %10.0f %12.0f" % (investors, firms, build, rate, np.mean(model_vars["Orders"]),
+                                                        np.mean(model_vars["Volume"])))
+        del market
+
+if __name__ == "__main__":
+    main()
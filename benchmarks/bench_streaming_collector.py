@@ -0,0 +1,120 @@
+# Compare StreamingCollector with ArrayCollector on long runs
+#
+# The check steps AgentModel.TraderModel from one seed twice, once with its
+# ArrayCollector and once with a StreamingCollector built like it, and reads
+# the streamed chunks back: model and agent rows must be the same. The memory
+# table then collects from one model --steps times, counting steps without
+# stepping the traders, so only the collector's cost is measured; it prints
+# the bytes each collector holds as the run goes on. The backpressure table
+# collects with a writer slowed down by --write-delay seconds per chunk, with
+# each policy: BLOCK keeps every row and waits, DOWNSAMPLE keeps fewer rows.
+#
+#   python benchmarks/bench_streaming_collector.py
+#   python benchmarks/bench_streaming_collector.py --agents 10000 --steps 20000 --write-delay 0.5
+import argparse
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from AgentModel import TraderModel
+from BatchRun import create_model
+from StreamingCollector import BLOCK, DOWNSAMPLE, StreamingCollector, read_stream
+
+# Define a StreamingCollector whose writer takes at least delay seconds per chunk
+class SlowCollector(StreamingCollector):
+    delay = 0.0
+
+    def write_chunk(self, index, arrays):
+        time.sleep(self.delay)
+        super().write_chunk(index, arrays)
+
+def build(agents, seed):
+    side = math.ceil(math.sqrt(agents))
+    return create_model(TraderModel, dict(num_traders=agents, width=side, height=side, initial_price=100,
+                                          cash_per_trader=1000, inventory_per_trader=10, strategy="Random"), seed)
+
+def check(seed, agents, steps, path):
+    model = build(agents, seed)
+    for i in range(steps):
+        model.step()
+    collector = model.datacollector
+
+    model = build(agents, seed)
+    model.datacollector = StreamingCollector.like(model.datacollector, path, chunk_steps=7)
+    for i in range(steps):
+        model.step()
+    model.datacollector.close()
+    model_columns, agent_columns = read_stream(path)
+
+    same = np.array_equal(model_columns["Step"], collector.steps)
+    same &= all(np.array_equal(model_columns[name], values) for name, values in collector.model_vars.items())
+    step_index = np.searchsorted(collector.steps, agent_columns["Step"])
+    for name in collector.agent_vars:
+        same &= np.array_equal(agent_columns[name], collector.get_agent_var(name)[step_index, agent_columns["AgentID"]])
+    return bool(same)
+
+# Collect from a model the given number of times, calling back every so often with the collector's bytes
+def collect_run(model, collector, steps, report):
+    start = time.perf_counter()
+    for i in range(steps):
+        model.schedule.steps += 1
+        collector.collect(model)
+        if (i + 1) % report == 0:
+            yield i + 1, collector.nbytes(), time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark StreamingCollector against ArrayCollector")
+    parser.add_argument("--agents", type=int, default=1000)
+    parser.add_argument("--steps", type=int, default=8000)
+    parser.add_argument("--chunk-steps", type=int, default=256)
+    parser.add_argument("--write-delay", type=float, default=0.2, help="extra seconds per chunk of the slow writer")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp(prefix="bench_streaming_")
+    try:
+        print("streamed rows match ArrayCollector's: %s"
+              % ("yes" if check(args.seed, 200, 30, os.path.join(path, "check")) else "NO"))
+        print()
+
+        model = build(args.agents, args.seed)
+        report = args.steps // 4
+        streaming = StreamingCollector.like(model.datacollector, os.path.join(path, "memory"),
+                                            chunk_steps=args.chunk_steps)
+        streaming_run = list(collect_run(model, streaming, args.steps, report))
+        streaming.close()
+        array_run = list(collect_run(model, model.datacollector, args.steps, report))
+        print("%d agents" % args.agents)
+        print("%8s %16s %16s" % ("steps", "ArrayCollector MB", "Streaming MB"))
+        for (steps, array_bytes, array_time), (_, streaming_bytes, streaming_time) in zip(array_run, streaming_run):
+            print("%8d %16.1f %16.1f" % (steps, array_bytes / 1e6, streaming_bytes / 1e6))
+        print("collects/s: ArrayCollector %.0f, StreamingCollector %.0f"
+              % (args.steps / array_time, args.steps / streaming_time))
+        print()
+
+        print("writer slowed by %.2f s per chunk" % args.write_delay)
+        print("%-12s %10s %12s %10s %10s" % ("policy", "rows kept", "collects/s", "blocked", "wait s"))
+        for policy in (BLOCK, DOWNSAMPLE):
+            collector = SlowCollector.like(model.datacollector, os.path.join(path, policy),
+                                           chunk_steps=args.chunk_steps, policy=policy)
+            collector.delay = args.write_delay
+            start = time.perf_counter()
+            for i in range(args.steps):
+                model.schedule.steps += 1
+                collector.collect(model)
+            rate = args.steps / (time.perf_counter() - start)
+            collector.close()
+            rows = len(read_stream(collector.path)[0]["Step"])
+            print("%-12s %10d %12.0f %10d %10.2f" % (policy, rows, rate, collector.blocked, collector.wait_seconds))
+    finally:
+        shutil.rmtree(path)
+
+if __name__ == "__main__":
+    main()
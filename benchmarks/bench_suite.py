@@ -0,0 +1,234 @@
+# Benchmark every model at several scales and keep a history of the results
+#
+# Each (model, agents) case runs in its own process, from a fixed seed, so that
+# its peak RSS is its own and a crash or timeout only loses that case. A case
+# builds the model, then steps it --steps times or until --max-seconds have
+# passed, whichever comes first (always at least one step), and records steps
+# per second of the median step, build time, peak RSS and the memory held by
+# the data collector.
+#
+# Every run appends one JSON line per case to the history file, tagged with the
+# run's time, git commit and host. --compare compares the last run in the
+# history with an earlier one (the run before it by default, or the last run of
+# a given commit) and flags every case that got slower, or used more memory, by
+# more than --threshold; the exit status is 1 if anything regressed.
+#
+#   python benchmarks/bench_suite.py
+#   python benchmarks/bench_suite.py --models AgentModel FreshModel --agents 100 10000
+#   python benchmarks/bench_suite.py --compare
+#   python benchmarks/bench_suite.py --compare --baseline 6db2fa9 --threshold 0.05
+import argparse
+import json
+import math
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+AGENTS = [100, 10000, 1000000]
+
+TRADER_PARAMS = {"initial_price": 100, "cash_per_trader": 1000, "inventory_per_trader": 10}
+
+# Get the model class and its parameters for a number of agents
+#
+# Grid models run at about the density of their demos: the single-occupancy
+# trader grids are twice as large as the number of traders, the finance models
+# hold one trader per cell on average and MyModel one agent per unit of area.
+def model_case(name, agents):
+    side = math.ceil(math.sqrt(agents))
+    trader_side = math.ceil(math.sqrt(2 * agents))
+    if name == "AgentModel":
+        import AgentModel
+        return AgentModel.TraderModel, dict(num_traders=agents, width=trader_side, height=trader_side,
+                                            strategy="Random", **TRADER_PARAMS)
+    if name == "SimpleModel":
+        import SimpleModel
+        return SimpleModel.TraderModel, dict(num_traders=agents, width=trader_side, height=trader_side,
+                                             initial_inventory=10, **TRADER_PARAMS)
+    if name == "FinanceModel":
+        import FinanceModel
+        return FinanceModel.FinanceModel, dict(N=agents, width=side, height=side)
+    if name in ("FreshModel", "FreshModel (bucketed)"):
+        import FreshModel
+        return FreshModel.FinanceModel, dict(N=agents, width=side, height=side, starting_wealth=100,
+                                             starting_price=1, bucketed=name != "FreshModel")
+    if name == "ModifiedModel":
+        import ModifiedModel
+        return ModifiedModel.FinanceModel, dict(N=agents, width=side, height=side)
+    if name == "FinanceTraderModel":
+        import FinanceTraderModel
+        return FinanceTraderModel.FinanceTraderModel, dict(num_traders=agents, initial_market_price=10,
+                                                           initial_market_volume=100)
+    if name in ("MyModel", "MyModel (batched)"):
+        import MyModel
+        return MyModel.MyModel, dict(num_agents=agents, width=side, height=side, batched=name != "MyModel")
+    raise ValueError("unknown model %r" % name)
+
+MODELS = ["AgentModel", "SimpleModel", "FinanceModel", "FreshModel", "FreshModel (bucketed)", "ModifiedModel",
+          "FinanceTraderModel", "MyModel", "MyModel (batched)"]
+
+# Run one case in this process and get its record
+def run_case(name, agents, seed, steps, max_seconds):
+    from BatchRun import create_model
+
+    start = time.perf_counter()
+    model_class, params = model_case(name, agents)
+    model = create_model(model_class, params, seed)
+    build = time.perf_counter() - start
+
+    times = []
+    while len(times) < steps and sum(times) <= max_seconds:
+        start = time.perf_counter()
+        model.step()
+        times.append(time.perf_counter() - start)
+
+    # The median step is much less sensitive to a noisy machine than the mean
+    collector = getattr(model, "datacollector", None)
+    return {"steps": len(times), "seconds": sum(times), "steps_per_s": 1 / statistics.median(times),
+            "build_s": build,
+            # ru_maxrss is in kilobytes on Linux
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "collector_mb": collector.nbytes() / 2**20 if hasattr(collector, "nbytes") else None}
+
+# Run one case in a fresh process and get its record, or its error
+def run_case_process(name, agents, args):
+    command = [sys.executable, os.path.abspath(__file__), "--case", name, str(agents), "--seed", str(args.seed),
+               "--steps", str(args.steps), "--max-seconds", str(args.max_seconds)]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=args.timeout)
+    except subprocess.TimeoutExpired:
+        return {"status": "timeout"}
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines() or ["exit status %d" % result.returncode]
+        return {"status": "error", "error": lines[-1]}
+    return dict(json.loads(result.stdout.strip().splitlines()[-1]), status="ok")
+
+# Get the current commit, marked when the working tree has changes
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + "+dirty" if dirty else commit
+
+def read_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+# Get the records of each run in the history, oldest run first
+def history_runs(records):
+    runs = {}
+    for record in records:
+        runs.setdefault(record["run"], []).append(record)
+    return list(runs.values())
+
+def format_value(value, pattern):
+    return pattern % value if value is not None else "-"
+
+# Run the selected cases and append them to the history
+def run_suite(args):
+    run = {"run": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": git_commit(), "host": platform.node(),
+           "python": platform.python_version(), "seed": args.seed}
+    os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+    print("run %s, commit %s" % (run["run"], run["commit"]))
+    print("%-20s %9s %10s %10s %10s %12s %10s" % ("model", "agents", "steps/s", "steps", "build s",
+                                                  "peak RSS MB", "collector MB"))
+    for name in args.models:
+        for agents in args.agents:
+            record = dict(run, model=name, agents=agents)
+            record.update(run_case_process(name, agents, args))
+            with open(args.history, "a") as f:
+                f.write(json.dumps(record) + "\n")
+            if record["status"] != "ok":
+                print("%-20s %9d %s %s" % (name, agents, record["status"], record.get("error", "")))
+                continue
+            print("%-20s %9d %10.3f %10d %10.2f %12.1f %10s" % (name, agents, record["steps_per_s"], record["steps"],
+                                                               record["build_s"], record["peak_rss_mb"],
+                                                               format_value(record["collector_mb"], "%.1f")))
+
+# Compare the last run in the history with a baseline run; return True if nothing regressed
+def compare(args):
+    runs = history_runs(read_history(args.history))
+    if len(runs) < 2:
+        print("need at least two runs in %s to compare" % args.history)
+        return True
+    current = runs[-1]
+    if args.baseline:
+        matching = [records for records in runs[:-1] if (records[0]["commit"] or "").startswith(args.baseline)
+                    or records[0]["run"] == args.baseline]
+        if not matching:
+            print("no run of %s in %s" % (args.baseline, args.history))
+            return False
+        baseline = matching[-1]
+    else:
+        baseline = runs[-2]
+    before = {(r["model"], r["agents"]): r for r in baseline if r["status"] == "ok"}
+
+    print("run %s (%s) against %s (%s), threshold %.0f%%" % (current[0]["run"], current[0]["commit"],
+                                                            baseline[0]["run"], baseline[0]["commit"],
+                                                            args.threshold * 100))
+    print("%-20s %9s %10s %10s %10s %10s  %s" % ("model", "agents", "steps/s", "change", "peak RSS", "collector",
+                                                 "verdict"))
+    regressed = False
+    for record in current:
+        old = before.get((record["model"], record["agents"]))
+        if old is None or record["status"] != "ok":
+            verdict = record["status"] if record["status"] != "ok" else "new"
+            regressed |= old is not None
+            print("%-20s %9d %10s %10s %10s %10s  %s" % (record["model"], record["agents"], "-", "-", "-", "-",
+                                                         verdict.upper() if old is not None else verdict))
+            continue
+        speed = record["steps_per_s"] / old["steps_per_s"] - 1
+        rss = record["peak_rss_mb"] / old["peak_rss_mb"] - 1
+        collector = (record["collector_mb"] / old["collector_mb"] - 1) if old["collector_mb"] else None
+        problems = []
+        if speed < -args.threshold:
+            problems.append("slower")
+        if rss > args.threshold:
+            problems.append("more RSS")
+        if collector is not None and collector > args.threshold:
+            problems.append("more collector memory")
+        regressed |= bool(problems)
+        print("%-20s %9d %10.3f %+9.1f%% %+9.1f%% %10s  %s" % (record["model"], record["agents"],
+                                                               record["steps_per_s"], speed * 100, rss * 100,
+                                                               format_value(collector and collector * 100, "%+.1f%%"),
+                                                               "REGRESSION: " + ", ".join(problems) if problems
+                                                               else "ok"))
+    return not regressed
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every model at several scales")
+    parser.add_argument("--models", nargs="+", default=MODELS, choices=MODELS)
+    parser.add_argument("--agents", nargs="+", type=int, default=AGENTS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--steps", type=int, default=10, help="steps per case, unless --max-seconds runs out first")
+    parser.add_argument("--max-seconds", type=float, default=30.0, help="stepping time per case")
+    parser.add_argument("--timeout", type=float, default=1800.0, help="seconds before a case is abandoned")
+    parser.add_argument("--history", default=os.path.join(ROOT, "results", "bench_history.jsonl"))
+    parser.add_argument("--compare", action="store_true", help="compare the last run with a baseline, do not run")
+    parser.add_argument("--baseline", default=None, help="commit or run time of the baseline; the previous run by default")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change that counts as a regression")
+    parser.add_argument("--case", nargs=2, metavar=("MODEL", "AGENTS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        name, agents = args.case
+        print(json.dumps(run_case(name, int(agents), args.seed, args.steps, args.max_seconds)))
+    elif args.compare:
+        sys.exit(0 if compare(args) else 1)
+    else:
+        run_suite(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Measure strong and weak scaling of the tiled models from 1 to N worker processes
+#
+# Strong scaling steps the same model with more and more workers; weak scaling
+# grows the model with the number of workers, keeping the agents per worker
+# fixed. Every strong scaling run must end in exactly the same state as the
+# single-worker run, which is checked too. --model picks TiledTraderModel
+# (AgentModel), TiledFinanceModel (FreshModel) or TiledModifiedModel
+# (ModifiedModel).
+#
+#   python benchmarks/bench_tiled_scaling.py
+#   python benchmarks/bench_tiled_scaling.py --max-workers 32 --agents 1000000
+#   python benchmarks/bench_tiled_scaling.py --model finance
+#   python benchmarks/bench_tiled_scaling.py --model modified
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from TiledModel import TiledFinanceModel, TiledModifiedModel, TiledTraderModel
+
+# Build a model at half grid occupancy, run it and get its steps per second and final state
+def run(model_name, agents, workers, steps, tile_size, seed):
+    side = math.ceil(math.sqrt(2 * agents))
+    if model_name == "trader":
+        model = TiledTraderModel(agents, side, side, 100, 1000, 10, "Random", seed=seed, tile_size=tile_size,
+                                 workers=workers)
+        # Spread the inventories so that neighbours trade
+        model.inventory[:] = np.random.default_rng(seed).integers(0, 20, agents)
+    elif model_name == "modified":
+        model = TiledModifiedModel(agents, side, side, seed=seed, tile_size=tile_size, workers=workers)
+    else:
+        model = TiledFinanceModel(agents, side, side, 100, 1, seed=seed, tile_size=tile_size, workers=workers)
+        # Spread the prices so that cellmates trade
+        model.price[:] = np.random.default_rng(seed).integers(1, 4, agents)
+    start = time.perf_counter()
+    for i in range(steps):
+        model.step()
+    rate = steps / (time.perf_counter() - start)
+    if model_name == "trader":
+        state = (model.cash.copy(), model.inventory.copy(), model.position.copy())
+    else:
+        state = (model.wealth.copy(), model.alive.copy(), model.position.copy())
+    model.close()
+    return rate, state
+
+def worker_counts(max_workers):
+    counts = [1]
+    while counts[-1] * 2 <= max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != max_workers:
+        counts.append(max_workers)
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark strong and weak scaling of the tiled scheduler")
+    parser.add_argument("--model", choices=["trader", "finance", "modified"], default="trader")
+    parser.add_argument("--agents", type=int, default=200000, help="agents of the strong scaling runs")
+    parser.add_argument("--agents-per-worker", type=int, default=50000, help="agents per worker of the weak scaling runs")
+    parser.add_argument("--steps", type=int, default=5)
+    parser.add_argument("--tile-size", type=int, default=32)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    counts = worker_counts(args.max_workers)
+
+    print("%d cores available" % os.cpu_count())
+    print("strong scaling, %d agents" % args.agents)
+    print("%8s %10s %10s %10s %10s" % ("workers", "steps/s", "speedup", "efficiency", "same"))
+    baseline = expected = None
+    for workers in counts:
+        rate, state = run(args.model, args.agents, workers, args.steps, args.tile_size, args.seed)
+        if baseline is None:
+            baseline, expected = rate, state
+        same = all(np.array_equal(a, b) for a, b in zip(state, expected))
+        print("%8d %10.2f %9.2fx %9.0f%% %10s" % (workers, rate, rate / baseline, rate / baseline / workers * 100,
+                                                 "yes" if same else "NO"))
+
+    print()
+    print("weak scaling, %d agents per worker" % args.agents_per_worker)
+    print("%8s %10s %10s %10s" % ("workers", "agents", "steps/s", "efficiency"))
+    baseline = None
+    for workers in counts:
+        rate, state = run(args.model, args.agents_per_worker * workers, workers, args.steps, args.tile_size, args.seed)
+        baseline = baseline or rate
+        print("%8d %10d %10.2f %9.0f%%" % (workers, args.agents_per_worker * workers, rate, rate / baseline * 100))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+# Check and time the trend following kernels of TrendKernel
+#
+# The trend rule as TraderModel.step states it trades nothing, so the settle
+# kernels are checked on their own first: on random trader arrays with random
+# sides, every settle kernel must leave each trader with the cash and
+# inventory of AgentModel.Trader's calculate_*_amount() and buy()/sell(), and
+# the same touched traders as settle_loop run as plain Python; some of the
+# orders must trade. TrendKernel.check_kernels() then checks every kernel
+# against the loops on seeded random traders. Last, a
+# TraderModel with kernel=True and one without are stepped from one seed, with
+# a VectorizedTraderModel copied from the first before each step: the kernel
+# path, the per-agent rule and the arrays must agree on the average, on every
+# trader's cash and inventory, and on the type of the cash. Any mismatch
+# stops the script with a non-zero exit status.
+#
+# The timings are the rule on arrays with each kernel, the rule phase of
+# TraderModel.step with and without kernel=True, and whole steps of the
+# models.
+#
+#   python benchmarks/bench_trend_kernel.py
+#   python benchmarks/bench_trend_kernel.py --agents 100000 --steps 5
+import argparse
+import math
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import TrendKernel
+from AgentModel import Trader, TraderModel
+from BatchRun import create_model
+from VectorizedModel import VectorizedTraderModel
+
+# The kernels to check and time, with the one in use last; numba, if installed, is imported here
+TrendKernel.load_kernels()
+KERNELS = {"python loop": TrendKernel.trend_rule_loop, "numpy": TrendKernel.trend_rule_numpy,
+           "in use (%s)" % TrendKernel.KERNEL: TrendKernel.trend_rule}
+SETTLE_KERNELS = {"python loop": TrendKernel.settle_loop, "numpy": TrendKernel.settle_numpy,
+                  "in use (%s)" % TrendKernel.KERNEL: TrendKernel.settle}
+
+# Stop with a non-zero exit status if a check fails
+def require(condition, message):
+    if not condition:
+        sys.exit("check failed: " + message)
+
+def run_kernel(kernel, price, cash, inventory, last_price, *side):
+    cash, inventory = cash.copy(), inventory.copy()
+    touched = np.zeros(len(cash), dtype=np.bool_)
+    result = kernel(price, cash, inventory, last_price, *side, touched)
+    return result, cash, inventory, touched
+
+# Settle one order per trader with AgentModel.Trader's methods
+def settle_traders(price, cash, inventory, last_price, side):
+    traders = [SimpleNamespace(cash=c, inventory=i, last_price=p)
+               for c, i, p in zip(cash.tolist(), inventory.tolist(), last_price.tolist())]
+    for trader, s in zip(traders, side.tolist()):
+        if s == TrendKernel.BUY:
+            Trader.buy(trader, Trader.calculate_buy_amount(trader, price), price)
+        elif s == TrendKernel.SELL:
+            Trader.sell(trader, Trader.calculate_sell_amount(trader, price), price)
+    return [t.cash for t in traders], [t.inventory for t in traders]
+
+def check_settle(seed, cases):
+    rng = np.random.default_rng(seed)
+    traded = 0
+    for case in range(cases):
+        price = rng.uniform(1, 200)
+        arrays = TrendKernel.draw_traders(rng, int(rng.integers(1, 500)), price)
+        side = rng.choice(np.array([TrendKernel.HOLD, TrendKernel.BUY, TrendKernel.SELL], dtype=np.int8),
+                          size=len(arrays[0]))
+        cash, inventory = settle_traders(price, *arrays, side)
+        expected = run_kernel(TrendKernel.settle_loop, price, *arrays, side)
+        traded += int(np.count_nonzero(expected[2] != arrays[1]))
+        for name, kernel in SETTLE_KERNELS.items():
+            result = run_kernel(kernel, price, *arrays, side)
+            require(np.array_equal(result[1], cash) and np.array_equal(result[2], inventory),
+                    "settle kernel %s differs from Trader.buy()/sell() in case %d" % (name, case))
+            require(np.array_equal(result[3], expected[3]), "settle kernel %s touched other traders" % name)
+    require(traded > 0, "no settled order traded")
+    return traded
+
+def model_params(agents, **kwargs):
+    side = math.ceil(math.sqrt(agents))
+    return dict(num_traders=agents, width=side, height=side, initial_price=100, cash_per_trader=1000,
+                inventory_per_trader=10, strategy="Random", **kwargs)
+
+# Get the cash, inventory and cash type of every trader of a model
+def trader_state(model):
+    return [(t.cash, t.inventory, type(t.cash)) for t in model.schedule.agents]
+
+def check_model(seed, agents, steps):
+    # Mesa keeps the model RNG on the class, so each run is stepped before the next one is built
+    model = create_model(TraderModel, model_params(agents), seed)
+    per_agent = []
+    for i in range(steps):
+        model.update_price()
+        average = model.average_inventory()
+        model.apply_trend_rule(average)
+        per_agent.append((average, trader_state(model)))
+        model.datacollector.collect(model)
+        model.schedule.step()
+
+    model = create_model(TraderModel, model_params(agents, kernel=True), seed)
+    for i in range(steps):
+        model.update_price()
+        vectorized = VectorizedTraderModel.from_model(model)
+        vectorized.apply_trend_rule()
+        average = model.apply_trend_kernel()
+        state = trader_state(model)
+        require(average == per_agent[i][0], "kernel=True returned another average at step %d" % i)
+        require(state == per_agent[i][1], "kernel=True differs from the per-agent rule at step %d" % i)
+        require(np.array_equal(vectorized.cash, [c for c, _, _ in state])
+                and np.array_equal(vectorized.inventory, [n for _, n, _ in state]),
+                "VectorizedTraderModel differs from the per-agent rule at step %d" % i)
+        model.datacollector.collect(model)
+        model.schedule.step()
+
+# Time a function, in ns per trader
+def per_trader(function, agents, repeats):
+    start = time.perf_counter()
+    for i in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats / agents * 1e9
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the trend following kernels")
+    parser.add_argument("--agents", type=int, default=100000)
+    parser.add_argument("--steps", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("kernel in use: %s" % TrendKernel.KERNEL)
+    traded = check_settle(args.seed, 200)
+    print("settle kernels match Trader.buy()/sell(): yes, %d orders traded" % traded)
+    try:
+        TrendKernel.check_kernels(args.seed, 200)
+    except AssertionError as error:
+        sys.exit("check failed: %s" % error)
+    print("kernels match the python loops: yes")
+    check_model(args.seed, 500, 10)
+    print("kernel=True and VectorizedTraderModel match TraderModel's per-agent rule: yes")
+    print()
+
+    rng = np.random.default_rng(args.seed)
+    arrays = TrendKernel.draw_traders(rng, args.agents, 100.0)
+    touched = np.zeros(args.agents, dtype=np.bool_)
+    print("%d traders" % args.agents)
+    print("%-28s %12s" % ("rule on arrays", "ns/trader"))
+    for name, kernel in KERNELS.items():
+        # The first call compiles a numba kernel, so it is left out of the timing
+        cash, inventory = arrays[0].copy(), arrays[1].copy()
+        kernel(100.0, cash, inventory, arrays[2], touched)
+        repeats = 1 if kernel is TrendKernel.trend_rule_loop else 10
+        print("%-28s %12.1f" % (name, per_trader(lambda: kernel(100.0, cash, inventory, arrays[2], touched),
+                                                 args.agents, repeats)))
+    print()
+
+    model = create_model(TraderModel, model_params(args.agents), args.seed)
+    model.step()
+    rule = per_trader(lambda: model.apply_trend_rule(model.average_inventory()), args.agents, args.steps)
+    print("%-28s %12.1f" % ("per-agent rule of TraderModel", rule))
+    print("%-28s %12.1f" % ("kernel=True of TraderModel", per_trader(model.apply_trend_kernel, args.agents, args.steps)))
+    print()
+
+    print("%-28s %10s" % ("model", "steps/s"))
+    for name, model in (("TraderModel", model), ("VectorizedTraderModel", VectorizedTraderModel.from_model(model))):
+        start = time.perf_counter()
+        for i in range(args.steps):
+            model.step()
+        print("%-28s %10.3f" % (name, args.steps / (time.perf_counter() - start)))
+
+if __name__ == "__main__":
+    main()
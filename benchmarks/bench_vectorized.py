@@ -0,0 +1,150 @@
+# Compare steps/sec of AgentModel.TraderModel and VectorizedModel.VectorizedTraderModel
+#
+# The check runs both engines on a grid with one trader per cell, where no
+# trader can move, with the vectorized engine following the object model's
+# activation order: every trader must end every step with the same cash,
+# inventory and position, or the script exits with a non-zero status. With
+# movement the engines order moves and trades differently (see
+# VectorizedTraderModel), so --compare only compares aggregates.
+#
+#   python benchmarks/bench_vectorized.py
+#   python benchmarks/bench_vectorized.py --sizes 1000 10000 --compare
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from AgentModel import TraderModel
+from VectorizedModel import VectorizedTraderModel
+
+# Define the parameters shared by both engines
+def model_params(num_traders, density):
+    side = max(3, math.ceil(math.sqrt(num_traders / density)))
+    return {"num_traders": num_traders, "width": side, "height": side, "initial_price": 100,
+            "cash_per_trader": 1000, "inventory_per_trader": 10, "strategy": "Random"}
+
+# Build an object-per-agent model with every random source seeded
+def object_model(params, seed):
+    random.seed(seed)
+    model = TraderModel(**params)
+    model.random.seed(seed)
+    return model
+
+# Time the given number of steps and return steps/sec
+def steps_per_sec(model, steps):
+    model.step()
+    start = time.perf_counter()
+    for i in range(steps):
+        model.step()
+    return steps / (time.perf_counter() - start)
+
+# Define the aggregate statistics of a model
+def aggregates(model):
+    if isinstance(model, VectorizedTraderModel):
+        cash = model.cash
+        inventory = model.inventory
+    else:
+        cash = np.array([t.cash for t in model.schedule.agents])
+        inventory = np.array([t.inventory for t in model.schedule.agents])
+    return {"price": model.current_price, "avg_cash": cash.mean(), "avg_inventory": inventory.mean()}
+
+# Check the vectorized engine against the object model step by step on a grid where nobody can move
+def check_full_grid(seed, side, steps):
+    model = object_model(model_params(side * side, 1), seed)
+    traders = model.schedule.agents
+    rng = random.Random(seed)
+    for trader, cell in zip(traders, [(x, y) for x in range(side) for y in range(side)]):
+        model.grid.move_agent(trader, cell)
+        trader.inventory = rng.randint(5, 20)
+    vectorized = VectorizedTraderModel.from_model(model, seed)
+
+    traded = 0
+    for i in range(steps):
+        # RandomActivation shuffles the agent ids with model.random, which nothing else draws from before
+        order = [trader.unique_id for trader in traders]
+        shuffler = random.Random()
+        shuffler.setstate(model.random.getstate())
+        shuffler.shuffle(order)
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+
+        inventory = vectorized.inventory.copy()
+        model.step()
+        vectorized.current_price = model.current_price
+        vectorized.apply_trend_rule()
+        vectorized.collect()
+        vectorized.step_traders(rank)
+        traded += int(np.count_nonzero(vectorized.inventory != inventory))
+
+        if not (np.array_equal(vectorized.cash, [t.cash for t in traders])
+                and np.array_equal(vectorized.inventory, [t.inventory for t in traders])
+                and np.array_equal(vectorized.position, [t.pos for t in traders])):
+            sys.exit("check failed: the engines differ on a full %d x %d grid at step %d" % (side, side, i))
+    if not traded:
+        sys.exit("check failed: no trader traded on the full grid")
+    return traded
+
+# Run both engines from the same initial state and print their aggregates
+def compare(num_traders, density, steps, seeds):
+    rows = []
+    for seed in range(seeds):
+        model = object_model(model_params(num_traders, density), seed)
+
+        # Spread the inventories so that neighbours have something to trade
+        for trader in model.schedule.agents:
+            trader.inventory = random.randint(5, 20)
+        vectorized = VectorizedTraderModel.from_model(model, seed)
+
+        # Drive the vectorized engine with the price path of the object path
+        for i in range(steps):
+            model.step()
+            vectorized.current_price = model.current_price
+            vectorized.apply_trend_rule()
+            vectorized.collect()
+            vectorized.step_traders()
+        rows.append((aggregates(model), aggregates(vectorized)))
+
+    print("aggregates after %d steps, %d traders, mean of %d seeds" % (steps, num_traders, seeds))
+    for key in ("avg_cash", "avg_inventory"):
+        obj = np.mean([r[0][key] for r in rows])
+        vec = np.mean([r[1][key] for r in rows])
+        print("%-14s object %12.3f  vectorized %12.3f" % (key, obj, vec))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the vectorized TraderModel engine")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--density", type=float, default=0.25)
+    parser.add_argument("--object-max", type=int, default=10000,
+                        help="largest size to run the object-per-agent path at")
+    parser.add_argument("--compare", action="store_true",
+                        help="also compare aggregate statistics of both engines")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for seed in range(args.seed, args.seed + 5):
+        traded = check_full_grid(seed, 6, 20)
+    print("engines match step by step on full 6 x 6 grids, 5 seeds: yes, %d inventories changed in the last" % traded)
+    print()
+
+    print("%10s %14s %14s %10s" % ("traders", "object st/s", "vector st/s", "speedup"))
+    for n in args.sizes:
+        params = model_params(n, args.density)
+        vectorized = steps_per_sec(VectorizedTraderModel(seed=args.seed, **params), args.steps)
+        if n <= args.object_max:
+            obj = steps_per_sec(object_model(params, args.seed), args.steps)
+            print("%10d %14.2f %14.2f %9.1fx" % (n, obj, vectorized, vectorized / obj))
+        else:
+            print("%10d %14s %14.2f %10s" % (n, "-", vectorized, "-"))
+
+    if args.compare:
+        compare(100, args.density, 50, 20)
+
+if __name__ == "__main__":
+    main()